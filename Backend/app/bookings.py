@@ -0,0 +1,274 @@
+# app/bookings.py
+import asyncio
+import logging
+import os
+
+import mysql.connector
+from fastapi import HTTPException
+
+from app.database import PoolTimeout, db_unavailable, get_connection
+from app.feed import rides_changed
+from app.matching import matcher
+
+# Unpaid holds give their seats back after this many seconds
+BOOKING_HOLD_SECONDS = int(os.getenv("BOOKING_HOLD_SECONDS", 600))
+# How often expired holds are swept, and how many per pass
+BOOKING_SWEEP_SECONDS = float(os.getenv("BOOKING_SWEEP_SECONDS", 30))
+BOOKING_SWEEP_BATCH = int(os.getenv("BOOKING_SWEEP_BATCH", 500))
+
+log = logging.getLogger(__name__)
+
+_RETRYABLE = (1213, 1205)  # deadlock, lock wait timeout
+_DUPLICATE_KEY = 1062
+
+BOOKING_COLUMNS = "id, ride_id, rider_id, seats, status, idempotency_key, hold_expires_at, created_at"
+
+
+def _format_booking(row):
+    expires = row["hold_expires_at"]
+    created = row["created_at"]
+    return {
+        "id": row["id"],
+        "rideId": row["ride_id"],
+        "riderId": row["rider_id"],
+        "seats": row["seats"],
+        "status": row["status"],
+        "holdExpiresAt": expires.isoformat() if expires else None,
+        "createdAt": created.isoformat() if hasattr(created, "isoformat") else created,
+    }
+
+
+def _with_retry(fn, *args, attempts=3):
+    """
+    Run a transaction, retrying on deadlock / lock wait timeout. An
+    exhausted pool is a 503 with Retry-After, not a 500.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn(*args)
+        except PoolTimeout as e:
+            raise db_unavailable(e)
+        except mysql.connector.Error as e:
+            if e.errno not in _RETRYABLE or attempt == attempts - 1:
+                raise
+
+
+def _find_by_key(cursor, rider_id, key):
+    cursor.execute(
+        f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE rider_id = %s AND idempotency_key = %s",
+        (rider_id, key),
+    )
+    return cursor.fetchone()
+
+
+def _replay(row, ride_id):
+    if row["ride_id"] != ride_id:
+        raise HTTPException(status_code=422, detail="Idempotency key already used for another ride")
+    return {"booking": _format_booking(row), "replayed": True}
+
+
+def _book(ride_id, rider_id, seats, hold, key):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if key:
+            existing = _find_by_key(cursor, rider_id, key)
+            if existing:
+                return _replay(existing, ride_id)
+
+        # The seat check and the decrement are one statement: two bookers can
+        # never both see the last seat, and no row lock is held while reading.
+        cursor.execute(
+            """
+            UPDATE rides SET seats = seats - %s
+            WHERE id = %s AND status = 'scheduled' AND seats >= %s AND driver_id <> %s
+            """,
+            (seats, ride_id, seats, rider_id),
+        )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            cursor.execute("SELECT status, seats, driver_id FROM rides WHERE id = %s", (ride_id,))
+            ride = cursor.fetchone()
+            if not ride:
+                raise HTTPException(status_code=404, detail="Ride not found")
+            if ride["driver_id"] == rider_id:
+                raise HTTPException(status_code=400, detail="You cannot book your own ride")
+            if ride["status"] != "scheduled":
+                raise HTTPException(status_code=409, detail="Ride is no longer open for booking")
+            raise HTTPException(status_code=409, detail="Not enough seats available")
+
+        try:
+            cursor.execute(
+                """
+                INSERT INTO bookings (ride_id, rider_id, seats, status, idempotency_key, hold_expires_at)
+                VALUES (%s, %s, %s, %s, %s,
+                        IF(%s, NOW() + INTERVAL %s SECOND, NULL))
+                """,
+                (ride_id, rider_id, seats, "held" if hold else "confirmed", key, hold, BOOKING_HOLD_SECONDS),
+            )
+        except mysql.connector.IntegrityError as e:
+            # a concurrent retry with the same key won; give its seats back
+            conn.rollback()
+            if e.errno == _DUPLICATE_KEY and key:
+                existing = _find_by_key(cursor, rider_id, key)
+                if existing:
+                    return _replay(existing, ride_id)
+            raise
+        booking_id = cursor.lastrowid
+
+        cursor.execute("SELECT seats FROM rides WHERE id = %s", (ride_id,))
+        seats_left = cursor.fetchone()["seats"]
+        cursor.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE id = %s", (booking_id,))
+        booking = cursor.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    matcher.seats_changed(ride_id, seats_left)
+    rides_changed()
+    return {"booking": _format_booking(booking), "replayed": False, "seatsLeft": seats_left}
+
+
+def book_ride(ride_id: int, rider_id: int, seats: int = 1, hold: bool = False, key: str | None = None):
+    """
+    Reserve `seats` on a ride. With hold=True the booking is 'held' until
+    confirmed or until BOOKING_HOLD_SECONDS pass. Retrying with the same
+    idempotency key returns the original booking instead of booking again.
+    """
+    return _with_retry(_book, ride_id, rider_id, seats, hold, key)
+
+
+def _release(cursor, booking, new_status):
+    """Flip a live booking to new_status and give its seats back. False if it was already settled."""
+    cursor.execute(
+        "UPDATE bookings SET status = %s, hold_expires_at = NULL WHERE id = %s AND status IN ('held', 'confirmed')",
+        (new_status, booking["id"]),
+    )
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute(
+        "UPDATE rides SET seats = seats + %s WHERE id = %s",
+        (booking["seats"], booking["ride_id"]),
+    )
+    return True
+
+
+def _cancel(ride_id, rider_id, booking_id):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE id = %s AND ride_id = %s AND rider_id = %s",
+            (booking_id, ride_id, rider_id),
+        )
+        booking = cursor.fetchone()
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        released = _release(cursor, booking, "cancelled")
+        cursor.execute("SELECT seats, status FROM rides WHERE id = %s", (ride_id,))
+        ride = cursor.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    if released:
+        rides_changed()
+        if ride and ride["status"] == "scheduled":
+            matcher.seats_changed(ride_id, ride["seats"])
+    booking["status"] = "cancelled" if released else booking["status"]
+    booking["hold_expires_at"] = None if released else booking["hold_expires_at"]
+    return {"booking": _format_booking(booking), "released": released}
+
+
+def cancel_booking(ride_id: int, rider_id: int, booking_id: int):
+    """Cancel a held or confirmed booking. Cancelling twice is a no-op."""
+    return _with_retry(_cancel, ride_id, rider_id, booking_id)
+
+
+def _confirm(ride_id, rider_id, booking_id):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            UPDATE bookings SET status = 'confirmed', hold_expires_at = NULL
+            WHERE id = %s AND ride_id = %s AND rider_id = %s
+              AND status = 'held' AND hold_expires_at > NOW()
+            """,
+            (booking_id, ride_id, rider_id),
+        )
+        cursor.execute(
+            f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE id = %s AND ride_id = %s AND rider_id = %s",
+            (booking_id, ride_id, rider_id),
+        )
+        booking = cursor.fetchone()
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if booking["status"] != "confirmed":
+        raise HTTPException(status_code=409, detail=f"Booking is {booking['status']}, hold may have expired")
+    return {"booking": _format_booking(booking)}
+
+
+def confirm_booking(ride_id: int, rider_id: int, booking_id: int):
+    """Turn an unexpired hold into a confirmed booking (e.g. after payment)."""
+    return _with_retry(_confirm, ride_id, rider_id, booking_id)
+
+
+def expire_holds(limit: int = BOOKING_SWEEP_BATCH) -> int:
+    """Release seats of holds past their expiry. Returns how many were expired."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    expired = 0
+    touched = set()
+    try:
+        cursor.execute(
+            """
+            SELECT id, ride_id, seats FROM bookings
+            WHERE status = 'held' AND hold_expires_at <= NOW()
+            ORDER BY hold_expires_at
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        for booking in cursor.fetchall():
+            if _release(cursor, booking, "expired"):
+                expired += 1
+                touched.add(booking["ride_id"])
+            conn.commit()
+
+        for ride_id in touched:
+            cursor.execute("SELECT seats, status FROM rides WHERE id = %s", (ride_id,))
+            ride = cursor.fetchone()
+            if ride and ride["status"] == "scheduled":
+                matcher.seats_changed(ride_id, ride["seats"])
+        if touched:
+            rides_changed(conn)
+        return expired
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def hold_sweeper():
+    """Background loop: expire unpaid holds every BOOKING_SWEEP_SECONDS."""
+    while True:
+        await asyncio.sleep(BOOKING_SWEEP_SECONDS)
+        try:
+            expired = await asyncio.to_thread(expire_holds)
+            while expired == BOOKING_SWEEP_BATCH:
+                expired = await asyncio.to_thread(expire_holds)
+        except Exception:
+            log.exception("Hold sweep failed")
@@ -1,68 +1,196 @@
 # app/chat.py
+import asyncio
+import functools
+import logging
+import time
 import socketio
-from typing import Dict
-from app.database import get_connection
+from typing import Callable, Dict, List, Set
+from app.chat_store import (
+    advance_delivery_cursor,
+    fetch_pending,
+    get_delivery_cursor,
+    latest_message_id,
+    message_writer,
+)
+from app.core.metrics import counter, gauge, histogram
+from app.core.security import decode_access_token
+from app.presence import create_client_manager, create_presence, user_room
+
+log = logging.getLogger(__name__)
 
-# Async Socket.IO server for ASGI (FastAPI)
+# Async Socket.IO server for ASGI (FastAPI).
+# With CHAT_REDIS_URL set, emits to rooms fan out to every worker/host.
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins="*",  # dev only; restrict in production
+    client_manager=create_client_manager(),
 )
 
-# userId -> sid
-user_to_sid: Dict[str, str] = {}
-# sid -> userId
+# Which users are online, on any worker (a user may have several devices)
+presence = create_presence()
+
+# sid -> userId from the socket's access token, for sockets connected to this worker
 sid_to_user: Dict[str, str] = {}
+# sockets still receiving their missed messages; their live acks are held back
+catching_up: Set[str] = set()
 
+# how long a client gets to ack one catch-up batch
+CATCHUP_ACK_TIMEOUT = 15
 
-async def save_message_to_db(sender_id: str, receiver_id: str, message: str) -> None:
-    """Store chat message in MySQL."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            """
-            INSERT INTO chat_messages (sender_id, receiver_id, message)
-            VALUES (%s, %s, %s)
-            """,
-            (sender_id, receiver_id, message),
-        )
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+# callables(sid) run when a socket disconnects, for per-socket state kept elsewhere
+disconnect_hooks: List[Callable[[str], None]] = []
+
+SOCKET_EVENT_SECONDS = histogram("socketio_event_duration_seconds", "Socket.IO handler latency", ("event",))
+SOCKET_EVENT_ERRORS = counter("socketio_event_errors_total", "Socket.IO handlers that raised", ("event",))
+SOCKETS_CONNECTED = gauge("socketio_connected_sockets", "Sockets connected to this worker")
+SOCKETS_CONNECTED.set(0)
+gauge("socketio_registered_sockets", "Connected sockets that have registered a user", fn=lambda: len(sid_to_user))
+gauge("socketio_catching_up_sockets", "Sockets still receiving missed messages", fn=lambda: len(catching_up))
+
+
+def timed_event(handler):
+    """Record the handler's latency in socketio_event_duration_seconds."""
+    event = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        started = time.perf_counter()
+        try:
+            return await handler(*args)
+        except Exception:
+            SOCKET_EVENT_ERRORS.inc(event=event)
+            raise
+        finally:
+            SOCKET_EVENT_SECONDS.observe(time.perf_counter() - started, event=event)
+
+    return wrapper
+
+
+async def save_message_to_db(sender_id: int, receiver_id: int, message: str) -> int:
+    """Store chat message in MySQL (batched, off the event loop). Returns its id."""
+    return await message_writer.save(sender_id, receiver_id, message)
 
 
 # --------------- Socket.IO events -----------------
 
+def _token_user(auth):
+    """User id (str) from the access token in the connect auth payload, else None."""
+    token = auth.get("token") if isinstance(auth, dict) else None
+    if not isinstance(token, str):
+        return None
+    parts = token.split()
+    if len(parts) == 2 and parts[0].lower() == "bearer":
+        token = parts[1]
+    payload = decode_access_token(token)
+    if not payload or "sub" not in payload:
+        return None
+    return str(payload["sub"])
+
+
 @sio.event
 async def connect(sid, environ, auth):
-    print(f"🔌 Client connected: {sid}")
+    """
+    Clients authenticate while connecting:
+      IO.io(url, OptionBuilder()...setAuth({'token': jwt}).build());
+    The socket is bound to the token's user for its whole life; nothing a
+    client emits later can change who it is.
+    """
+    user_id = _token_user(auth)
+    if user_id is None:
+        raise socketio.exceptions.ConnectionRefusedError("authentication failed")
+    SOCKETS_CONNECTED.inc()
+    sid_to_user[sid] = user_id
+    await sio.enter_room(sid, user_room(user_id))
+    await presence.add(user_id, sid)
+    log.debug("User %s connected with socket id %s", user_id, sid)
 
 
 @sio.event
 async def disconnect(sid):
-    print(f"🔌 Client disconnected: {sid}")
-    # Remove from maps
+    SOCKETS_CONNECTED.dec()
+    log.debug("Client disconnected: %s", sid)
+    catching_up.discard(sid)
+    for hook in disconnect_hooks:
+        hook(sid)
     user_id = sid_to_user.pop(sid, None)
     if user_id:
-        user_to_sid.pop(user_id, None)
-        print(f"❌ User {user_id} unregistered (sid={sid})")
+        await presence.remove(user_id, sid)
+        log.debug("User %s unregistered (sid=%s)", user_id, sid)
 
 
 @sio.event
-async def register(sid, user_id):
+@timed_event
+async def register(sid, user_id=None):
     """
-    Called from Flutter after connecting:
+    Called from Flutter once its handlers are in place:
     socket.emit('register', userId);
+    The socket already belongs to its token's user; this only starts the
+    missed-message catch-up, for that user and nobody else.
     """
-    user_id = str(user_id)
-    user_to_sid[user_id] = sid
-    sid_to_user[sid] = user_id
-    print(f"✅ User {user_id} registered with socket id {sid}")
+    authenticated = sid_to_user.get(sid)
+    if authenticated is None:
+        return {"success": False}
+    if user_id is not None and str(user_id) != authenticated:
+        log.warning("Socket %s of user %s tried to register as %s", sid, authenticated, user_id)
+        return {"success": False, "error": "userId must be the connected user"}
+    if sid in catching_up:
+        return {"success": True}
+    log.info("User %s registered with socket id %s", authenticated, sid)
+
+    catching_up.add(sid)
+    sio.start_background_task(deliver_missed_messages, sid, authenticated)
+    return {"success": True}
+
+
+async def deliver_missed_messages(sid, user_id):
+    """
+    Stream messages received while the user was offline, oldest first.
+
+    Each batch is sent with sio.call('missedMessages', [...]) and the next
+    one only goes out after the client acks it, so a big backlog neither
+    floods the socket nor holds the event loop (DB reads run in threads).
+    The delivery cursor advances to the last id of every acked batch.
+    Messages newer than the backlog snapshot arrive live instead.
+    """
+    try:
+        after_id = await asyncio.to_thread(get_delivery_cursor, user_id)
+        up_to_id = await asyncio.to_thread(latest_message_id, user_id)
+        while after_id < up_to_id and sid_to_user.get(sid) == user_id:
+            batch = await asyncio.to_thread(fetch_pending, user_id, after_id, up_to_id)
+            if not batch:
+                break
+            await sio.call("missedMessages", batch, to=sid, timeout=CATCHUP_ACK_TIMEOUT)
+            after_id = batch[-1]["id"]
+            await asyncio.to_thread(advance_delivery_cursor, user_id, after_id)
+        log.debug("Caught up user %s to message %s", user_id, after_id)
+    except socketio.exceptions.TimeoutError:
+        log.warning("User %s did not ack missed messages; will retry on next register", user_id)
+    except Exception:
+        log.exception("Catch-up failed for user %s", user_id)
+    finally:
+        catching_up.discard(sid)
+
+
+@sio.event
+@timed_event
+async def ackMessages(sid, data):
+    """
+    Client confirms it has every message up to an id:
+      socket.emit('ackMessages', {'upToId': lastMessageId});
+    """
+    user_id = sid_to_user.get(sid)
+    if not user_id or sid in catching_up:
+        return {"success": False}
+    try:
+        up_to_id = int(data.get("upToId"))
+    except (TypeError, ValueError, AttributeError):
+        return {"success": False}
+    await asyncio.to_thread(advance_delivery_cursor, user_id, up_to_id)
+    return {"success": True}
 
 
 @sio.event
+@timed_event
 async def sendMessage(sid, data):
     """
     Flutter emits:
@@ -73,42 +201,50 @@ async def sendMessage(sid, data):
       });
     """
 
-    sender_id = str(data.get("senderId"))
-    receiver_id = str(data.get("receiverId"))
-    message = data.get("message")
-
-    if not sender_id or not receiver_id or not message:
-        print("⚠️ Invalid sendMessage payload:", data)
-        return
-
-    print(f"💬 Message from {sender_id} to {receiver_id}: {message}")
-
-    # 1) Save message in DB
-    await save_message_to_db(sender_id, receiver_id, message)
-
-    # 2) Send to receiver if online
-    receiver_sid = user_to_sid.get(receiver_id)
-    if receiver_sid:
-        await sio.emit(
-            "receiveMessage",
-            {
-                "senderId": sender_id,
-                "receiverId": receiver_id,
-                "message": message,
-            },
-            to=receiver_sid,
-        )
-        print(f"📨 Delivered to online user {receiver_id}")
+    try:
+        sender_id = int(data.get("senderId"))
+        receiver_id = int(data.get("receiverId"))
+    except (TypeError, ValueError, AttributeError):
+        sender_id = receiver_id = 0
+    message = data.get("message") if isinstance(data, dict) else None
+
+    if sender_id <= 0 or receiver_id <= 0 or not isinstance(message, str) or not message:
+        # keys and parsed ids only: the payload carries the message text
+        keys = sorted(str(k)[:32] for k in data)[:10] if isinstance(data, dict) else type(data).__name__
+        log.warning("Invalid sendMessage payload: keys=%s senderId=%s receiverId=%s", keys, sender_id, receiver_id)
+        return {"success": False, "error": "senderId, receiverId and message are required"}
+    if str(sender_id) != sid_to_user.get(sid):
+        return {"success": False, "error": "senderId must be the connected user"}
+
+    log.debug("Message from %s to %s", sender_id, receiver_id)
+
+    # 1) Queue message for the DB writer (backpressure if the queue is full)
+    durable = await message_writer.submit(sender_id, receiver_id, message)
+    sender_id, receiver_id = str(sender_id), str(receiver_id)
+
+    # 2) Wait for the batch holding this message to commit. The receiver
+    #    needs the id to ack it, and nobody sees a message we failed to store.
+    try:
+        message_id = await durable
+    except Exception:
+        return {"success": False, "error": "Message could not be saved"}
+
+    payload = {
+        "id": message_id,
+        "senderId": sender_id,
+        "receiverId": receiver_id,
+        "message": message,
+    }
+
+    # 3) Echo back to the sender's devices (for local UI confirmation)
+    await sio.emit("receiveMessage", payload, room=user_room(sender_id))
+
+    # 4) Send to every device of the receiver, on whichever worker it is
+    if await presence.is_online(receiver_id):
+        await sio.emit("receiveMessage", payload, room=user_room(receiver_id))
+        log.debug("Delivered to online user %s", receiver_id)
     else:
-        print(f"📭 User {receiver_id} is offline; message stored only.")
-
-    # 3) Optionally echo back to sender (for local UI confirmation)
-    await sio.emit(
-        "receiveMessage",
-        {
-            "senderId": sender_id,
-            "receiverId": receiver_id,
-            "message": message,
-        },
-        to=sid,
-    )
+        log.debug("User %s is offline; message stored only", receiver_id)
+
+    # 5) Ack to the sender
+    return {"success": True, "id": message_id}
@@ -0,0 +1,310 @@
+# app/chat_store.py
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+from app.core.metrics import gauge
+from app.database import get_connection, insert_ids
+
+CHAT_QUEUE_MAX = int(os.getenv("CHAT_QUEUE_MAX", 10000))        # pending messages before senders wait
+CHAT_BATCH_SIZE = int(os.getenv("CHAT_BATCH_SIZE", 200))        # rows per multi-row INSERT
+CHAT_FLUSH_INTERVAL = float(os.getenv("CHAT_FLUSH_INTERVAL", 0.05))  # seconds to wait for a batch to fill
+
+log = logging.getLogger(__name__)
+
+Row = Tuple[int, int, str]
+
+_STOP = object()
+
+
+def insert_messages(rows: List[Row]) -> List[int]:
+    """
+    Insert a batch of (sender_id, receiver_id, message) rows with a single
+    multi-row INSERT, update the per-conversation summaries, and commit
+    once. Returns the new ids in input order.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+        params = [value for row in rows for value in row]
+        cursor.execute(
+            f"""
+            INSERT INTO chat_messages (sender_id, receiver_id, message)
+            VALUES {placeholders}
+            """,
+            params,
+        )
+        ids = insert_ids(cursor, len(rows))
+
+        _update_conversations(cursor, rows, ids)
+        conn.commit()
+        return ids
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _update_conversations(cursor, rows: List[Row], ids: List[int]) -> None:
+    """
+    Keep chat_conversations (one row per user and peer) in step with a
+    batch: latest message id for both sides, unread count for the receiver.
+    """
+    summary = {}  # (user_id, peer_id) -> [last_message_id, unread]
+    for (sender_id, receiver_id, _), msg_id in zip(rows, ids):
+        try:
+            sender_id, receiver_id = _user_id(sender_id), _user_id(receiver_id)
+        except ValueError:
+            # submit() rejects these; never fail a whole batch over one
+            log.error("Skipping conversation summary for message %s: bad ids", msg_id)
+            continue
+        mine = summary.setdefault((sender_id, receiver_id), [0, 0])
+        mine[0] = max(mine[0], msg_id)
+        theirs = summary.setdefault((receiver_id, sender_id), [0, 0])
+        theirs[0] = max(theirs[0], msg_id)
+        theirs[1] += 1
+    if not summary:
+        return
+
+    # fixed key order so concurrent batches lock rows in the same order
+    keys = sorted(summary)
+    cursor.execute(
+        f"""
+        INSERT INTO chat_conversations (user_id, peer_id, last_message_id, unread_count)
+        VALUES {", ".join(["(%s, %s, %s, %s)"] * len(keys))}
+        ON DUPLICATE KEY UPDATE
+            last_message_id = GREATEST(last_message_id, VALUES(last_message_id)),
+            unread_count = unread_count + VALUES(unread_count)
+        """,
+        [v for key in keys for v in (*key, *summary[key])],
+    )
+
+
+class MessageWriter:
+    """
+    Write-behind queue for chat messages.
+
+    submit() enqueues a message and returns a future that resolves to the
+    message id once the row is committed. A single background task groups
+    queued messages and writes them with insert_messages() in a worker
+    thread, so the event loop never blocks on MySQL.
+
+    The queue is bounded: when it is full, submit() waits (backpressure).
+    A batch is flushed when it reaches `batch_size` or `flush_interval`
+    seconds after its first message, whichever comes first.
+    """
+
+    def __init__(self, insert_batch=insert_messages, max_queue=CHAT_QUEUE_MAX,
+                 batch_size=CHAT_BATCH_SIZE, flush_interval=CHAT_FLUSH_INTERVAL):
+        self._insert_batch = insert_batch
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.stats = {"queued": 0, "written": 0, "failed": 0, "batches": 0}
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, sender_id: int, receiver_id: int, message: str) -> asyncio.Future:
+        """Raises ValueError for ids that aren't positive integers or an empty message."""
+        sender_id, receiver_id = _user_id(sender_id), _user_id(receiver_id)
+        if not message:
+            raise ValueError("Empty chat message")
+        if self._closing:
+            raise RuntimeError("Message writer is shutting down")
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put(((sender_id, receiver_id, message), fut))
+        self.stats["queued"] += 1
+        return fut
+
+    async def save(self, sender_id: int, receiver_id: int, message: str) -> int:
+        """Enqueue and wait until the message is durable. Returns its id."""
+        return await (await self.submit(sender_id, receiver_id, message))
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stop(self):
+        """Stop accepting messages and flush everything already queued."""
+        self._closing = True
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining > 0:
+                        nxt = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        nxt = self._queue.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if nxt is _STOP:
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            await self._flush(batch)
+            if stopping:
+                # drain whatever is still queued, then exit
+                while not self._queue.empty():
+                    rest = []
+                    while not self._queue.empty() and len(rest) < self.batch_size:
+                        rest.append(self._queue.get_nowait())
+                    await self._flush(rest)
+                return
+
+    async def _flush(self, batch):
+        rows = [row for row, _ in batch]
+        started = time.monotonic()
+        try:
+            ids = await asyncio.to_thread(self._insert_batch, rows)
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats["failed"] += 1
+                log.error("Failed to store chat message: %s", e)
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # one bad row (unknown receiver, oversized text) rolls back the
+            # whole INSERT; retry row by row so only that message fails
+            log.warning("Chat batch of %d failed (%s); retrying one by one", len(batch), e)
+            for item in batch:
+                await self._flush([item])
+            return
+
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        for (_, fut), msg_id in zip(batch, ids):
+            if not fut.done():
+                fut.set_result(msg_id)
+
+        elapsed = (time.monotonic() - started) * 1000
+        if elapsed > 500:
+            log.warning("Slow chat batch: %d rows in %.0f ms", len(batch), elapsed)
+
+
+def _user_id(value) -> int:
+    try:
+        user_id = int(value)
+    except (TypeError, ValueError):
+        user_id = 0
+    if user_id <= 0:
+        raise ValueError(f"Invalid user id: {value!r}")
+    return user_id
+
+
+message_writer = MessageWriter()
+gauge("chat_writer_pending", "Chat messages queued for the DB writer", fn=message_writer.pending)
+
+
+# --------------- offline delivery -----------------
+
+CHAT_CATCHUP_BATCH = int(os.getenv("CHAT_CATCHUP_BATCH", 100))  # messages per catch-up emit
+
+
+def get_delivery_cursor(user_id: str) -> int:
+    """Id of the last message the user acknowledged (0 if none)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT last_delivered_id FROM chat_delivery_cursors WHERE user_id = %s",
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def advance_delivery_cursor(user_id: str, message_id: int) -> None:
+    """Move the cursor forward to message_id; never moves it back."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO chat_delivery_cursors (user_id, last_delivered_id)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+                last_delivered_id = GREATEST(last_delivered_id, VALUES(last_delivered_id))
+            """,
+            (user_id, message_id),
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def latest_message_id(user_id: str) -> int:
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(id) FROM chat_messages WHERE receiver_id = %s", (user_id,))
+        row = cursor.fetchone()
+        return row[0] or 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def fetch_pending(user_id: str, after_id: int, up_to_id: int, limit: int = CHAT_CATCHUP_BATCH):
+    """
+    Messages for user_id with after_id < id <= up_to_id, oldest first.
+    A range scan on the (receiver_id, id) index.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT id, sender_id, receiver_id, message, created_at
+            FROM chat_messages
+            WHERE receiver_id = %s AND id > %s AND id <= %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (user_id, after_id, up_to_id, limit),
+        )
+        return [
+            {
+                "id": row[0],
+                "senderId": str(row[1]),
+                "receiverId": str(row[2]),
+                "message": row[3],
+                "createdAt": row[4].isoformat() if row[4] else None,
+            }
+            for row in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
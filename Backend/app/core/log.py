@@ -0,0 +1,104 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from app.core.metrics import counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# At most LOG_RATE_LIMIT records per message template per LOG_RATE_WINDOW seconds
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", 20))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 10))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", 10000))
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+LOG_DROPPED = counter(
+    "log_records_dropped_total", "Log records dropped by the rate limit or a full queue", ("reason",)
+)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per (logger, message template)
+    per `window` seconds. The first record of the next window notes how
+    many were suppressed.
+    """
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._state = {}  # (logger, msg) -> [window_start, passed, suppressed]
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.msg)
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                if len(self._state) > 10000:
+                    self._state = {key: self._state[key]}
+            elif state[1] < self.limit:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                LOG_DROPPED.inc(reason="rate_limit")
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+_listener = None
+
+
+def setup_logging():
+    """
+    Route every `app.*` logger through a bounded queue; a background
+    thread does the actual writes to stderr. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(LOG_QUEUE_MAX)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger("app")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records; call on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
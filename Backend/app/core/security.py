@@ -1,9 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from jose import jwt
+from jose import JWTError, jwt
 from passlib.context import CryptContext
+import asyncio
 import os
+import threading
+import time
 
-PWD_CTX=CryptContext(schemes=['pbkdf2_sha256'],deprecated="auto")
+# pbkdf2 work factor. Existing hashes use 29000; hashes with any other
+# round count are transparently rehashed on the next successful login.
+PWD_ROUNDS = int(os.getenv("PWD_ROUNDS", 29000))
+# Hashing runs in its own processes so it never holds the API worker's GIL.
+# Leave half the cores for the event loop and the DB driver by default.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hash jobs allowed in flight (running + queued in the executor); the rest wait.
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", HASH_WORKERS * 4))
+
+PWD_CTX=CryptContext(
+    schemes=['pbkdf2_sha256'],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PWD_ROUNDS,
+    pbkdf2_sha256__min_rounds=PWD_ROUNDS,
+    pbkdf2_sha256__max_rounds=PWD_ROUNDS,
+)
 SECRET_KEY= os.getenv('SECRET_KEY',"please change this secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
@@ -18,6 +37,105 @@ def verify_password(plain: str, hashed: str) -> bool:
         plain = ""
     return PWD_CTX.verify(plain, hashed)
 
+# --------------- process-pool hashing -----------------
+
+def _hash_job(password: str):
+    started = time.perf_counter()
+    hashed = hash_password(password)
+    return hashed, time.perf_counter() - started
+
+
+def _verify_job(plain: str, hashed: str):
+    started = time.perf_counter()
+    if plain is None:
+        plain = ""
+    ok, new_hash = PWD_CTX.verify_and_update(plain, hashed)
+    return (ok, new_hash), time.perf_counter() - started
+
+
+class HashPool:
+    """
+    Runs password hashing in a ProcessPoolExecutor.
+    At most `max_pending` jobs are handed to the executor at once;
+    queue time (waiting for a slot and for a free process) is tracked
+    separately from the time spent hashing.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending = 0
+        self._jobs = 0
+        self._errors = 0
+        self._queue_time = 0.0
+        self._max_queue_time = 0.0
+        self._run_time = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    async def run(self, fn, *args):
+        started = time.perf_counter()
+        self._pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                result, run_time = await loop.run_in_executor(self._get_executor(), fn, *args)
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        queue_time = max(0.0, time.perf_counter() - started - run_time)
+        self._jobs += 1
+        self._queue_time += queue_time
+        self._max_queue_time = max(self._max_queue_time, queue_time)
+        self._run_time += run_time
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        jobs = self._jobs
+        return {
+            "workers": self.workers,
+            "maxPending": self.max_pending,
+            "pending": self._pending,
+            "jobs": jobs,
+            "errors": self._errors,
+            "queueTimeAvgMs": round(self._queue_time * 1000 / jobs, 3) if jobs else 0.0,
+            "queueTimeMaxMs": round(self._max_queue_time * 1000, 3),
+            "hashTimeAvgMs": round(self._run_time * 1000 / jobs, 3) if jobs else 0.0,
+            "rounds": PWD_ROUNDS,
+        }
+
+
+hash_pool = HashPool()
+
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(_hash_job, password)
+
+
+async def verify_password_async(plain: str, hashed: str):
+    """
+    Returns (ok, new_hash). new_hash is set when the stored hash was made
+    with different parameters and should replace it.
+    """
+    return await hash_pool.run(_verify_job, plain, hashed)
+
+
 def create_access_token(user_id: str) -> str:
     to_encode = {
         "sub": user_id,  # 👈 this must exist
@@ -0,0 +1,141 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
+
+
+def _default(value):
+    """Types orjson/json don't handle natively, encoded the way jsonable_encoder would."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(value) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Returning one directly from a
+    handler also skips FastAPI's jsonable_encoder pass over the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# --------------- cached formatters -----------------
+# Rides share a handful of dates and times, so each distinct value is
+# formatted once instead of calling strftime for every row.
+
+@lru_cache(maxsize=4096)
+def display_date(value) -> str:
+    """date -> "27 Oct 2025"; strings pass through."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%d %b %Y")
+    return value or ""
+
+
+@lru_cache(maxsize=4096)
+def display_time(value) -> str:
+    """TIME (timedelta from MySQL) or time -> "10:30 AM"; strings pass through."""
+    if isinstance(value, timedelta):
+        value = (datetime.min + value).time()
+    if isinstance(value, (time, datetime)):
+        return value.strftime("%I:%M %p")
+    return value or ""
+
+
+@lru_cache(maxsize=4096)
+def iso_date(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+@lru_cache(maxsize=4096)
+def clock_time(value):
+    """TIME (timedelta) -> "18:39", the way the app sends it."""
+    if isinstance(value, timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    return value
+
+
+# --------------- row mappers -----------------
+
+class Const:
+    """Field value that doesn't come from the row."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class RowMapper:
+    """
+    Turns rows from a tuple cursor into response dicts.
+
+    `fields` is a list of (key, column) or (key, column, transform), where
+    a nested RowMapper may stand in for the column to build a sub-object
+    and Const(value) for a fixed value.
+    bind() resolves column names to tuple indexes once per query and
+    compiles a function that builds each dict with a single literal, so
+    the per-row cost is one call and no key lookups.
+    """
+
+    def __init__(self, fields):
+        self.fields = [f if len(f) == 3 else (f[0], f[1], None) for f in fields]
+        self._compiled = {}
+
+    def _expr(self, index, env):
+        parts = []
+        for key, column, transform in self.fields:
+            if isinstance(column, RowMapper):
+                value = column._expr(index, env)
+            elif isinstance(column, Const):
+                value = f"c{len(env)}"
+                env[value] = column.value
+            else:
+                value = f"row[{index[column]}]"
+                if transform is not None:
+                    name = f"f{len(env)}"
+                    env[name] = transform
+                    value = f"{name}({value})"
+            parts.append(f"{key!r}: {value}")
+        return "{" + ", ".join(parts) + "}"
+
+    def bind(self, column_names):
+        """Compiled row -> dict function for a cursor's column_names."""
+        columns = tuple(column_names)
+        fn = self._compiled.get(columns)
+        if fn is None:
+            index = {name: i for i, name in enumerate(columns)}
+            env = {}
+            source = f"def map_row(row):\n    return {self._expr(index, env)}\n"
+            exec(compile(source, "<RowMapper>", "exec"), env)
+            fn = self._compiled[columns] = env["map_row"]
+        return fn
+
+    def map_all(self, cursor, rows):
+        map_row = self.bind(cursor.column_names)
+        return [map_row(row) for row in rows]
@@ -1,5 +1,16 @@
+import asyncio
+import itertools
+import logging
 import mysql.connector
 import os
+import threading
+import time
+from collections import deque
+
+from fastapi import HTTPException
+
+from app.core.cache import TTLCache
+from app.core.metrics import counter, gauge, histogram
 
 DB_HOST = os.getenv("DB_HOST","localhost")
 DB_USER = os.getenv("DB_USER","root")
@@ -7,14 +18,529 @@ DB_PASS = os.getenv("DB_PASS","root")
 DB_NAME = os.getenv("DB_NAME","ridepool")
 DB_PORT = int(os.getenv("DB_PORT",3306))
 
-def get_connection():
-    connection = mysql.connector.connect(
-        host=DB_HOST,
+# Pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))      # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))     # max connection age in seconds
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", 30))  # ping idle connections older than this
+# Seconds clients are told to wait (Retry-After) when no connection is free
+DB_RETRY_AFTER = int(os.getenv("DB_RETRY_AFTER", 1))
+
+# Read replicas as comma separated host[:port], same user/password/database
+# as the primary. Leave unset to send every query to DB_HOST.
+DB_REPLICAS = [r.strip() for r in os.getenv("DB_REPLICAS", "").split(",") if r.strip()]
+DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", DB_POOL_SIZE))
+# Replicas further behind than this (seconds) get no reads until they catch up
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 2))
+DB_REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", 2))
+# After a user writes, their reads stay on the primary this long (seconds)
+DB_READ_YOUR_WRITES_SECONDS = float(
+    os.getenv("DB_READ_YOUR_WRITES_SECONDS", DB_REPLICA_MAX_LAG + DB_REPLICA_CHECK_SECONDS + 1)
+)
+
+# Redis-compatible store shared by all workers for read-your-writes stamps
+# (defaults to the chat one). Unset: each worker only knows its own writes.
+DB_WRITES_REDIS_URL = os.getenv("DB_WRITES_REDIS_URL", os.getenv("CHAT_REDIS_URL"))
+
+# Statements slower than this are logged with their SQL
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+
+log = logging.getLogger(__name__)
+
+DB_QUERY_SECONDS = histogram("db_query_duration_seconds", "Time spent in cursor.execute", ("statement",))
+DB_SLOW_QUERIES = counter("db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_MS", ("statement",))
+DB_READS = counter("db_reads_total", "Read connections by where they were routed", ("target",))
+DB_REPLICA_LAG = gauge("db_replica_lag_seconds", "Last measured replica lag, -1 if unknown", ("replica",))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+def db_unavailable(e: PoolTimeout) -> HTTPException:
+    """The 503 for a request that got no connection, with a Retry-After hint."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(DB_RETRY_AFTER)})
+
+
+def _connect(host=DB_HOST, port=DB_PORT):
+    return mysql.connector.connect(
+        host=host,
         user=DB_USER,
         password=DB_PASS,
         database=DB_NAME,
-        port=DB_PORT,
+        port=port,
         auth_plugin="mysql_native_password",
         autocommit=False
     )
-    return connection
\ No newline at end of file
+
+
+_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "SHOW"}
+
+
+def _statement_kind(sql) -> str:
+    head = sql.lstrip()[:8].upper() if isinstance(sql, str) else ""
+    for kind in _STATEMENTS:
+        if head.startswith(kind):
+            return kind.lower()
+    return "other"
+
+
+class TimedCursor:
+    """
+    Cursor proxy that times execute/executemany into
+    db_query_duration_seconds and logs statements slower than
+    DB_SLOW_QUERY_MS. Buffered cursors fetch during execute, so the
+    time includes reading the rows.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._raw.close()
+
+    def _timed(self, method, sql, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(sql, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            kind = _statement_kind(sql)
+            DB_QUERY_SECONDS.observe(elapsed, statement=kind)
+            if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+                DB_SLOW_QUERIES.inc(statement=kind)
+                log.warning("Slow query (%.0f ms): %s", elapsed * 1000, " ".join(str(sql).split())[:500])
+
+    def execute(self, sql, *args, **kwargs):
+        return self._timed(self._raw.execute, sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._timed(self._raw.executemany, sql, *args, **kwargs)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql connection checked out of a pool.
+    Everything is delegated to the real connection except close(),
+    which hands the connection back to the pool instead of dropping it.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw, self._created_at)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of mysql connections.
+
+    - at most `size` connections exist at any time
+    - checkout blocks up to `timeout` seconds, then raises PoolTimeout
+    - idle connections are pinged before reuse and recycled after `recycle` seconds
+    """
+
+    def __init__(self, connect=_connect, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER, name="primary"):
+        self._connect = connect
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        # (raw connection, created_at, last_used_at)
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._failures = 0
+        self._created = 0
+        self._recycled = 0
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._open < self.size:
+                    raw, created_at, last_used = None, None, None
+                    self._open += 1
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._failures += 1
+                    raise PoolTimeout(f"No DB connection available after {timeout:.1f}s")
+                waited = True
+                self._cond.wait(remaining)
+
+        # Connect / health check outside the lock so other threads aren't blocked
+        try:
+            now = time.monotonic()
+            if raw is not None and not self._is_usable(raw, created_at, last_used, now):
+                self._discard(raw)
+                raw = None
+            if raw is None:
+                raw = self._connect()
+                created_at = time.monotonic()
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._failures += 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time += elapsed
+            self._max_wait = max(self._max_wait, elapsed)
+
+        return PooledConnection(self, raw, created_at)
+
+    def _is_usable(self, raw, created_at, last_used, now):
+        if now - created_at > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - last_used < self.ping_after:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        healthy = True
+        try:
+            # never leak an open transaction to the next borrower
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((raw, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(raw)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "inUse": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "waitTimeTotalMs": round(self._wait_time * 1000, 3),
+                "waitTimeAvgMs": round(self._wait_time * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                "waitTimeMaxMs": round(self._max_wait * 1000, 3),
+                "checkoutFailures": self._failures,
+                "created": self._created,
+                "recycled": self._recycled,
+            }
+
+
+class ReadRouter:
+    """
+    Chooses the pool a read-only query runs on.
+
+    Reads go round-robin to replicas whose last measured lag is within
+    max_lag, and to the primary when none qualifies. Reads by a user who
+    wrote in the last `window` seconds stay on the primary (read your own
+    writes), as do reads that must see a change made that recently
+    (`since`, a time.monotonic() stamp). Lag comes from check_lag(), which
+    replica_monitor() runs in the background; until the first check every
+    read goes to the primary.
+
+    Write stamps live in this worker's memory and, given `shared` (a sync
+    Redis client), in Redis too, so a write handled by one worker keeps
+    the user's reads on the primary on every worker. If Redis can't be
+    reached the read goes to the primary.
+    """
+
+    def __init__(self, primary, replicas, max_lag=DB_REPLICA_MAX_LAG, window=DB_READ_YOUR_WRITES_SECONDS,
+                 shared=None):
+        self.primary = primary
+        self.shared = shared
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.window = window
+        self.lag = {replica.name: None for replica in replicas}
+        self._healthy = []
+        self._next = itertools.count()
+        # user id -> True while their writes may not have reached the replicas
+        self._writers = TTLCache(100000, window)
+
+    @staticmethod
+    def _key(user_id) -> str:
+        return f"db:wrote:{user_id}"
+
+    def wrote(self, user_id) -> None:
+        if not self.replicas:
+            return
+        self._writers.set(user_id, True)
+        if self.shared is not None:
+            try:
+                self.shared.set(self._key(user_id), 1, px=int(self.window * 1000))
+            except Exception as e:
+                log.warning("Could not share write stamp for user %s: %s", user_id, e)
+
+    def _wrote_recently(self, user_id) -> bool:
+        if self._writers.get(user_id):
+            return True
+        if self.shared is None:
+            return False
+        try:
+            return bool(self.shared.exists(self._key(user_id)))
+        except Exception:
+            return True
+
+    def pool_for(self, user_id=None, since=None):
+        healthy = self._healthy
+        if not healthy:
+            DB_READS.inc(target="primary")
+            return self.primary
+        if user_id is not None and self._wrote_recently(user_id):
+            DB_READS.inc(target="primary_recent_write")
+            return self.primary
+        if since is not None and time.monotonic() - since < self.window:
+            DB_READS.inc(target="primary_recent_write")
+            return self.primary
+        DB_READS.inc(target="replica")
+        return healthy[next(self._next) % len(healthy)]
+
+    def acquire(self, user_id=None, since=None):
+        target = self.pool_for(user_id, since)
+        if target is self.primary:
+            return target.acquire()
+        try:
+            return target.acquire()
+        except (PoolTimeout, mysql.connector.Error) as e:
+            # take it out of rotation until the next lag check says otherwise
+            self._healthy = [r for r in self._healthy if r is not target]
+            DB_READS.inc(target="primary_fallback")
+            log.warning("Replica %s unavailable, reading from primary: %s", target.name, e)
+            return self.primary.acquire()
+
+    def _measure(self, replica):
+        """Seconds behind the source, or None if unreachable or not replicating."""
+        try:
+            conn = replica.acquire(timeout=1)
+        except Exception as e:
+            log.warning("Replica %s unreachable: %s", replica.name, e)
+            return None
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                column = "Seconds_Behind_Source"
+            except mysql.connector.Error:
+                # before MySQL 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+                column = "Seconds_Behind_Master"
+            row = cursor.fetchone()
+            if row is None or row.get(column) is None:
+                return None
+            return float(row[column])
+        except Exception as e:
+            log.warning("Could not read lag of replica %s: %s", replica.name, e)
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+
+    def check_lag(self):
+        healthy = []
+        for replica in self.replicas:
+            lag = self._measure(replica)
+            self.lag[replica.name] = lag
+            DB_REPLICA_LAG.set(-1 if lag is None else lag, replica=replica.name)
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(replica)
+        if len(healthy) != len(self._healthy):
+            log.info("%d of %d replicas within %.1fs lag", len(healthy), len(self.replicas), self.max_lag)
+        self._healthy = healthy
+
+    def close(self):
+        """Close the replica pools (the primary is closed by its owner)."""
+        for replica in self.replicas:
+            replica.close_all()
+
+    def stats(self):
+        healthy = {replica.name for replica in self._healthy}
+        return {
+            replica.name: {"lagSeconds": self.lag[replica.name], "inRotation": replica.name in healthy, **replica.stats()}
+            for replica in self.replicas
+        }
+
+
+def _replica_pool(spec):
+    host, _, port = spec.partition(":")
+    port = int(port or DB_PORT)
+    return ConnectionPool(
+        connect=lambda: _connect(host, port), size=DB_REPLICA_POOL_SIZE, name=f"{host}:{port}"
+    )
+
+
+pool = ConnectionPool()
+
+
+def _shared_store():
+    if not (DB_REPLICAS and DB_WRITES_REDIS_URL):
+        return None
+    import redis
+    return redis.Redis.from_url(DB_WRITES_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+
+read_router = ReadRouter(pool, [_replica_pool(spec) for spec in DB_REPLICAS], shared=_shared_store())
+
+gauge("db_pool_in_use", "Connections checked out of the pool", fn=lambda: pool.stats()["inUse"])
+gauge("db_pool_idle", "Idle connections in the pool", fn=lambda: pool.stats()["idle"])
+
+
+def get_connection():
+    """Check a connection out of the pool. Call .close() to give it back."""
+    return pool.acquire()
+
+
+def get_read_connection(user_id=None, since=None):
+    """
+    Connection for SELECT-only work: a replica when one is fresh enough,
+    otherwise the primary. Pass the user id to see that user's own recent
+    writes. Call .close() to give it back.
+    """
+    return read_router.acquire(user_id, since)
+
+
+def mark_written(user_id) -> None:
+    """Call after committing a user's write so their next reads see it."""
+    read_router.wrote(user_id)
+
+
+_insert_id_step = None
+
+
+def insert_ids(cursor, count: int):
+    """
+    Ids of the `count` rows created by the multi-row INSERT ... VALUES just
+    run on `cursor`, in order. Such an insert states its row count up
+    front, so InnoDB reserves all its ids in one step in every
+    innodb_autoinc_lock_mode: LAST_INSERT_ID() and then one
+    @@auto_increment_increment apart (more than 1 on multi-primary
+    setups). The increment is read once per process.
+    """
+    global _insert_id_step
+    first_id = cursor.lastrowid
+    if _insert_id_step is None:
+        cursor.execute("SELECT @@auto_increment_increment")
+        _insert_id_step = int(cursor.fetchone()[0])
+    return [first_id + i * _insert_id_step for i in range(count)]
+
+
+def get_db():
+    """
+    FastAPI dependency: one pooled connection for the whole request.
+    Dependencies are cached per request, so get_current_user and the
+    route handler share the same connection.
+    """
+    try:
+        conn = pool.acquire()
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def read_db(user_id=None, since=None):
+    """Like get_db, on a connection from get_read_connection."""
+    try:
+        conn = get_read_connection(user_id, since)
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats():
+    return pool.stats()
+
+
+def replica_stats():
+    return read_router.stats()
+
+
+async def replica_monitor():
+    """Background loop: re-measure replica lag every DB_REPLICA_CHECK_SECONDS."""
+    while True:
+        try:
+            await asyncio.to_thread(read_router.check_lag)
+        except Exception:
+            log.exception("Replica lag check failed")
+        await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
@@ -0,0 +1,144 @@
+# app/feed.py
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from app.core.cache import TTLCache
+from app.database import get_connection
+
+# How long a worker trusts its copy of the shared feed version (seconds)
+FEED_VERSION_TTL = float(os.getenv("FEED_VERSION_TTL", 1))
+# Rendered pages kept per worker
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", 2000))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", 300))
+
+log = logging.getLogger(__name__)
+
+
+class FeedVersion:
+    """
+    Counter that changes whenever the ride feed would change (ride created,
+    status or seats changed). Stored in MySQL so every worker sees bumps made
+    by the others; each worker re-reads it at most every FEED_VERSION_TTL
+    seconds and sees its own bumps immediately. `changed_at` is when this
+    worker last saw the value change (time.monotonic()).
+
+    `epoch` is local to the worker and goes up when a bump fails, so
+    tag() (what ETags are built from) still changes on this worker.
+    """
+
+    NAME = "rides"
+
+    def __init__(self, ttl=FEED_VERSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._read_at = 0.0
+        self.changed_at = None
+        self.epoch = 0
+
+    def get(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now - self._read_at < self.ttl:
+                return self._value
+        value = self._read()
+        with self._lock:
+            if value != self._value:
+                self.changed_at = now
+            self._value, self._read_at = value, now
+        return value
+
+    def tag(self) -> str:
+        value = self.get()
+        return f"{value}.{self.epoch}" if self.epoch else str(value)
+
+    def bump(self, conn=None) -> int:
+        """Increment the shared version. With `conn`, on that connection
+        instead of a freshly checked out one."""
+        value = self._increment(conn)
+        with self._lock:
+            self._value, self._read_at = value, time.monotonic()
+            self.changed_at = self._read_at
+        return value
+
+    def _read(self) -> int:
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM feed_versions WHERE name = %s", (self.NAME,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def invalidate_local(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self.changed_at = time.monotonic()
+
+    def _increment(self, conn=None) -> int:
+        own = conn is None
+        if own:
+            conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            # LAST_INSERT_ID(expr) hands the new value back without a second read
+            cursor.execute(
+                """
+                INSERT INTO feed_versions (name, version) VALUES (%s, LAST_INSERT_ID(1))
+                ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)
+                """,
+                (self.NAME,),
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            if own:
+                conn.close()
+
+
+feed_version = FeedVersion()
+# (version, ...request params) -> rendered JSON bytes
+feed_cache = TTLCache(FEED_CACHE_SIZE, FEED_CACHE_TTL)
+feed_stats = {"notModified": 0}
+
+
+def rides_changed(conn=None) -> None:
+    """
+    Call after committing anything that changes what the feed shows.
+    Pass the connection the change was made on, if still held, so the bump
+    doesn't need a second one from the pool.
+    """
+    try:
+        feed_version.bump(conn)
+    except Exception as e:
+        # other workers catch up within FEED_CACHE_TTL; this one stops
+        # serving (and 304-ing) pages rendered before the change right away
+        feed_version.invalidate_local()
+        feed_cache.clear()
+        log.warning("Could not bump feed version: %s", e)
+
+
+def make_etag(version, *params) -> str:
+    digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
+def feed_cache_stats():
+    stats = feed_cache.stats()
+    stats["notModified"] = feed_stats["notModified"]
+    return stats
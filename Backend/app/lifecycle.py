@@ -0,0 +1,163 @@
+# app/lifecycle.py
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.core.metrics import counter, histogram
+from app.database import get_connection
+from app.feed import rides_changed
+from app.matching import matcher
+from app.places import place_index
+
+# How often the lifecycle pass runs, and how many rides one batch may touch
+RIDE_LIFECYCLE_SECONDS = float(os.getenv("RIDE_LIFECYCLE_SECONDS", 60))
+RIDE_LIFECYCLE_BATCH = int(os.getenv("RIDE_LIFECYCLE_BATCH", 500))
+# A started ride counts as completed this long after its departure
+RIDE_COMPLETE_AFTER_HOURS = float(os.getenv("RIDE_COMPLETE_AFTER_HOURS", 6))
+# Completed/cancelled rides move to rides_history once they departed this long ago
+RIDE_ARCHIVE_AFTER_DAYS = float(os.getenv("RIDE_ARCHIVE_AFTER_DAYS", 30))
+RIDE_ARCHIVE_SECONDS = float(os.getenv("RIDE_ARCHIVE_SECONDS", 3600))
+
+log = logging.getLogger(__name__)
+
+RIDES_MOVED = counter("ride_lifecycle_rows_total", "Rides moved by the lifecycle worker", ("transition",))
+PASS_SECONDS = histogram("ride_lifecycle_pass_seconds", "Duration of one lifecycle batch", ("transition",))
+
+RIDE_COLUMNS = (
+    "id, driver_id, from_addr, to_addr, seats, duration, amount, status, created_at, "
+    "car_name, car_number, car_color, date, time, pickup_point, drop_point, has_location"
+)
+BOOKING_COLUMNS = "id, ride_id, rider_id, seats, status, idempotency_key, hold_expires_at, created_at, updated_at"
+
+
+def _departed_before(cutoff: datetime):
+    """WHERE fragment for departure <= cutoff that can use (status, date, time)."""
+    return "(date < %s OR (date = %s AND time <= %s))", [cutoff.date(), cutoff.date(), cutoff.time()]
+
+
+def _lock_batch(cursor, status, cutoff, limit):
+    """Ids of the oldest rides in `status` departed by `cutoff`, row-locked.
+    SKIP LOCKED lets every worker run the pass without waiting on each other."""
+    departed, params = _departed_before(cutoff)
+    cursor.execute(
+        f"""
+        SELECT id FROM rides
+        WHERE status = %s AND {departed}
+        ORDER BY date, time
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """,
+        [status] + params + [limit],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _transition(from_status, to_status, cutoff, limit):
+    conn = get_connection()
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        ids = _lock_batch(cursor, from_status, cutoff, limit)
+        if ids:
+            cursor.execute(
+                f"UPDATE rides SET status = %s WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                [to_status] + ids,
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    PASS_SECONDS.observe(time.perf_counter() - started, transition=to_status)
+    RIDES_MOVED.inc(len(ids), transition=to_status)
+    return ids
+
+
+def start_departed_rides(limit: int = RIDE_LIFECYCLE_BATCH, now=None):
+    """scheduled -> ongoing for rides whose departure time has passed."""
+    ids = _transition("scheduled", "ongoing", now or datetime.now(), limit)
+    for ride_id in ids:
+        matcher.ride_removed(ride_id)
+        place_index.ride_removed(ride_id)
+    return len(ids)
+
+
+def complete_finished_rides(limit: int = RIDE_LIFECYCLE_BATCH, now=None):
+    """ongoing -> completed RIDE_COMPLETE_AFTER_HOURS after departure."""
+    cutoff = (now or datetime.now()) - timedelta(hours=RIDE_COMPLETE_AFTER_HOURS)
+    return len(_transition("ongoing", "completed", cutoff, limit))
+
+
+def archive_rides(limit: int = RIDE_LIFECYCLE_BATCH, now=None):
+    """
+    Copy old completed/cancelled rides and their bookings to the history
+    tables and delete them from the hot tables, in one transaction per batch.
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=RIDE_ARCHIVE_AFTER_DAYS)
+    conn = get_connection()
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    ids = []
+    try:
+        for status in ("completed", "cancelled"):
+            ids += _lock_batch(cursor, status, cutoff, limit - len(ids))
+            if len(ids) >= limit:
+                break
+        if ids:
+            in_ids = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"INSERT INTO rides_history ({RIDE_COLUMNS}) SELECT {RIDE_COLUMNS} FROM rides WHERE id IN ({in_ids})",
+                ids,
+            )
+            cursor.execute(
+                f"INSERT INTO bookings_history ({BOOKING_COLUMNS}) "
+                f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE ride_id IN ({in_ids})",
+                ids,
+            )
+            # bookings go with the ride (ON DELETE CASCADE)
+            cursor.execute(f"DELETE FROM rides WHERE id IN ({in_ids})", ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    PASS_SECONDS.observe(time.perf_counter() - started, transition="archived")
+    RIDES_MOVED.inc(len(ids), transition="archived")
+    return len(ids)
+
+
+def _drain(step, limit=RIDE_LIFECYCLE_BATCH):
+    """Run `step` batch after batch until one comes back short."""
+    total = 0
+    while True:
+        moved = step(limit)
+        total += moved
+        if moved < limit:
+            return total
+
+
+async def ride_lifecycle():
+    """Background loop: start, complete and (less often) archive rides."""
+    last_archive = 0.0
+    while True:
+        await asyncio.sleep(RIDE_LIFECYCLE_SECONDS)
+        try:
+            started = await asyncio.to_thread(_drain, start_departed_rides)
+            completed = await asyncio.to_thread(_drain, complete_finished_rides)
+            archived = 0
+            if time.monotonic() - last_archive >= RIDE_ARCHIVE_SECONDS:
+                archived = await asyncio.to_thread(_drain, archive_rides)
+                last_archive = time.monotonic()
+            if started:
+                # nearby results only list scheduled rides
+                await asyncio.to_thread(rides_changed)
+            if started or completed or archived:
+                log.info("Ride lifecycle: %d started, %d completed, %d archived", started, completed, archived)
+        except Exception:
+            log.exception("Ride lifecycle pass failed")
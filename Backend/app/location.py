@@ -0,0 +1,237 @@
+# app/location.py
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from app.chat import disconnect_hooks, sid_to_user, sio, timed_event
+from app.core.cache import TTLCache
+from app.core.metrics import counter, gauge
+from app.database import get_connection
+
+# Most position broadcasts a ride room gets per second; faster ticks are coalesced
+LOCATION_BROADCAST_HZ = float(os.getenv("LOCATION_BROADCAST_HZ", 1))
+# Positions nobody refreshed for this long are dropped
+LOCATION_STALE_SECONDS = float(os.getenv("LOCATION_STALE_SECONDS", 300))
+# How long a "may this user publish/watch this ride" answer is reused
+LOCATION_ACCESS_TTL = float(os.getenv("LOCATION_ACCESS_TTL", 60))
+# Rooms broadcast per flush before yielding back to the event loop
+LOCATION_FLUSH_CHUNK = int(os.getenv("LOCATION_FLUSH_CHUNK", 200))
+
+log = logging.getLogger(__name__)
+
+LOCATION_TICKS = counter("location_ticks_total", "Driver location ticks by outcome", ("result",))
+
+_access_cache = TTLCache(maxsize=20000, ttl=LOCATION_ACCESS_TTL)
+
+
+def ride_room(ride_id: int) -> str:
+    """Socket.IO room of everyone watching a ride's driver."""
+    return f"ride:{ride_id}"
+
+
+def ride_access(ride_id: int, user_id: str) -> Optional[str]:
+    """'driver', 'rider' (live booking) or None. Cached for LOCATION_ACCESS_TTL."""
+    key = (ride_id, user_id)
+    role = _access_cache.get(key, False)
+    if role is not False:
+        return role
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT r.driver_id, r.status,
+                   EXISTS(SELECT 1 FROM bookings b
+                          WHERE b.ride_id = r.id AND b.rider_id = %s AND b.status IN ('held', 'confirmed'))
+            FROM rides r
+            WHERE r.id = %s
+            """,
+            (user_id, ride_id),
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    role = None
+    if row is not None and row[1] in ("scheduled", "ongoing"):
+        if str(row[0]) == user_id:
+            role = "driver"
+        elif row[2]:
+            role = "rider"
+    _access_cache.set(key, role)
+    return role
+
+
+class LocationHub:
+    """
+    Latest driver position per ride, broadcast to the ride's room at most
+    LOCATION_BROADCAST_HZ times a second.
+
+    A tick only overwrites the ride's entry and marks it dirty; one flush
+    loop sends each dirty ride once per interval, yielding to the event
+    loop every LOCATION_FLUSH_CHUNK rooms. Nothing is written to the DB.
+    Positions are compact lists: [rideId, lat, lng, heading, speed, ts].
+    """
+
+    def __init__(self, hz: float = LOCATION_BROADCAST_HZ):
+        self.interval = 1.0 / hz
+        self._latest: Dict[int, List] = {}
+        self._dirty: Set[int] = set()
+        # sid -> {ride_id: user_id} this socket was verified to drive
+        self._drivers: Dict[str, Dict[int, str]] = {}
+        self._received = 0
+        self._task = None
+
+    def publish(self, ride_id: int, lat: float, lng: float, heading=None, speed=None) -> None:
+        self._latest[ride_id] = [ride_id, round(lat, 5), round(lng, 5), heading, speed, int(time.time())]
+        self._dirty.add(ride_id)
+        self._received += 1
+
+    def latest(self, ride_id: int) -> Optional[List]:
+        return self._latest.get(ride_id)
+
+    def is_driver(self, sid: str, ride_id: int, user_id: str) -> bool:
+        return self._drivers.get(sid, {}).get(ride_id) == user_id
+
+    def add_driver(self, sid: str, ride_id: int, user_id: str) -> None:
+        self._drivers.setdefault(sid, {})[ride_id] = user_id
+
+    def drop_socket(self, sid: str) -> None:
+        self._drivers.pop(sid, None)
+
+    def tracked(self) -> int:
+        return len(self._latest)
+
+    async def flush(self) -> int:
+        dirty, self._dirty = self._dirty, set()
+        received, self._received = self._received, 0
+        sent = 0
+        for ride_id in dirty:
+            point = self._latest.get(ride_id)
+            if point is None:
+                continue
+            await sio.emit("driverLocation", point, room=ride_room(ride_id))
+            sent += 1
+            if sent % LOCATION_FLUSH_CHUNK == 0:
+                await asyncio.sleep(0)
+        if received:
+            LOCATION_TICKS.inc(sent, result="broadcast")
+            LOCATION_TICKS.inc(received - sent, result="coalesced")
+        return sent
+
+    def expire(self, now: float = None) -> int:
+        cutoff = (now or time.time()) - LOCATION_STALE_SECONDS
+        stale = [ride_id for ride_id, point in self._latest.items() if point[5] < cutoff]
+        for ride_id in stale:
+            del self._latest[ride_id]
+        return len(stale)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        last_expire = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_expire >= LOCATION_STALE_SECONDS / 5:
+                    self.expire()
+                    last_expire = time.monotonic()
+            except Exception:
+                log.exception("Location flush failed")
+
+
+location_hub = LocationHub()
+disconnect_hooks.append(location_hub.drop_socket)
+
+gauge("location_rides_tracked", "Rides with a known driver position on this worker", fn=location_hub.tracked)
+
+
+def _ride_id(data) -> Optional[int]:
+    try:
+        return int(data.get("rideId"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _number(value, low, high) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and low <= value <= high else None
+
+
+# --------------- Socket.IO events -----------------
+
+@sio.event
+@timed_event
+async def subscribeRide(sid, data):
+    """
+    Rider (or the driver) starts watching a ride:
+      socket.emitWithAck('subscribeRide', {'rideId': rideId});
+    The ack carries the last known position; later ones arrive as
+    'driverLocation' [rideId, lat, lng, heading, speed, ts].
+    """
+    user_id = sid_to_user.get(sid)
+    ride_id = _ride_id(data)
+    if not user_id or ride_id is None:
+        return {"success": False, "error": "Authenticate and pass a rideId first"}
+    if await asyncio.to_thread(ride_access, ride_id, user_id) is None:
+        return {"success": False, "error": "Not booked on this ride"}
+    await sio.enter_room(sid, ride_room(ride_id))
+    return {"success": True, "location": location_hub.latest(ride_id)}
+
+
+@sio.event
+@timed_event
+async def unsubscribeRide(sid, data):
+    ride_id = _ride_id(data)
+    if ride_id is None:
+        return {"success": False}
+    await sio.leave_room(sid, ride_room(ride_id))
+    return {"success": True}
+
+
+@sio.event
+async def locationUpdate(sid, data):
+    """
+    Driver publishes a position for their ride, as often as the GPS fires:
+      socket.emit('locationUpdate', {'rideId': id, 'lat': .., 'lng': .., 'heading': .., 'speed': ..});
+    Only the first tick per ride and socket touches the DB (ownership check).
+    """
+    user_id = sid_to_user.get(sid)
+    ride_id = _ride_id(data)
+    if not user_id or ride_id is None:
+        LOCATION_TICKS.inc(result="rejected")
+        return {"success": False}
+    lat = _number(data.get("lat"), -90, 90)
+    lng = _number(data.get("lng"), -180, 180)
+    if lat is None or lng is None:
+        LOCATION_TICKS.inc(result="rejected")
+        return {"success": False, "error": "Invalid coordinates"}
+
+    if not location_hub.is_driver(sid, ride_id, user_id):
+        if await asyncio.to_thread(ride_access, ride_id, user_id) != "driver":
+            LOCATION_TICKS.inc(result="rejected")
+            return {"success": False, "error": "Only the ride's driver can publish its location"}
+        location_hub.add_driver(sid, ride_id, user_id)
+
+    heading = _number(data.get("heading"), 0, 360)
+    speed = _number(data.get("speed"), 0, 500)
+    location_hub.publish(
+        ride_id, lat, lng,
+        None if heading is None else round(heading),
+        None if speed is None else round(speed, 1),
+    )
+    return {"success": True}
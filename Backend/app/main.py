@@ -1,8 +1,63 @@
-from fastapi import FastAPI
-from app.routes import auth,rides, user
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import socketio
+from fastapi import FastAPI, Request, Response
+from app.routes import auth,rides, user, chat, bookings
+from app.bookings import hold_sweeper
+from app.lifecycle import ride_lifecycle
+from app.routes.auth import auth_cache_stats, user_change_listener
+from app.database import DB_REPLICAS, pool, pool_stats, read_router, replica_monitor, replica_stats
+from app.feed import feed_cache_stats, feed_version
+from app.places import place_index, place_index_refresher
+from app.chat import presence, sio
+from app.presence import CHAT_REDIS_URL
+from app.chat_store import message_writer
+from app.location import location_hub
+from app.core.security import hash_pool
+from app.uploads import UPLOAD_DIR, UploadFiles, thumbnail_pool
+from app.core.log import setup_logging, shutdown_logging
+from app.core.metrics import CONTENT_TYPE, histogram, registry
+from app.core.serialization import FastJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="RideMatch Backend")
+setup_logging()
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await presence.start()
+    await location_hub.start()
+    sweeper = asyncio.create_task(hold_sweeper())
+    lifecycle = asyncio.create_task(ride_lifecycle())
+    replicas = asyncio.create_task(replica_monitor()) if DB_REPLICAS else None
+    places = asyncio.create_task(place_index_refresher())
+    user_changes = asyncio.create_task(user_change_listener()) if CHAT_REDIS_URL else None
+    yield
+    if user_changes is not None:
+        user_changes.cancel()
+    places.cancel()
+    if replicas is not None:
+        replicas.cancel()
+    sweeper.cancel()
+    lifecycle.cancel()
+    await location_hub.stop()
+    await presence.stop()
+    # flush queued chat messages before the pool goes away
+    await message_writer.stop()
+    hash_pool.shutdown()
+    thumbnail_pool.shutdown()
+    read_router.close()
+    pool.close_all()
+    shutdown_logging()
+
+
+app = FastAPI(title="RideMatch Backend", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,10 +67,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_template(request: Request):
+    """
+    Full template of the matched route (/api/rides/user/{user_id}), or None.
+    Routers are included lazily, so route.path is relative to its router's
+    prefix; the prefix (and any root_path/mount) comes from the request path
+    with the route's own segments cut off.
+    """
+    route = request.scope.get("route")
+    if route is None:
+        return None
+    depth = route.path.count("/")
+    prefix = "/".join(request.scope["path"].split("/")[:-depth]) if depth else ""
+    return prefix + route.path
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template (/api/rides/user/{user_id}), not raw path
+        path = route_template(request)
+        if path is None:
+            path = "/socket.io" if request.url.path.startswith("/socket.io") else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=request.method, route=path, status=status
+        )
+
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(rides.router, prefix="/api/rides", tags=["rides"])
+app.include_router(bookings.router, prefix="/api/rides", tags=["bookings"])
 app.include_router(user.router, prefix="/api/user", tags=["user"])
+app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
+
+# Socket.IO chat on the same port, at the default /socket.io/ path
+app.mount("/socket.io", socketio.ASGIApp(sio))
+
+# Profile images; content-hash names are served as immutable
+app.mount("/uploads", UploadFiles(directory=UPLOAD_DIR), name="uploads")
 
 @app.get("/")
 def home():
-    return {"message": "Backend is running"}
\ No newline at end of file
+    return {"message": "Backend is running"}
+
+@app.get("/health/db")
+def db_health():
+    return {"success": True, "pool": pool_stats(), "replicas": replica_stats()}
+
+@app.get("/health/cache")
+def cache_health():
+    return {"success": True, "auth": auth_cache_stats(), "feed": {"version": feed_version.get(), **feed_cache_stats()}}
+
+@app.get("/health/places")
+def places_health():
+    return {"success": True, "places": place_index.stats()}
+
+@app.get("/health/hashing")
+def hashing_health():
+    return {"success": True, "hashing": hash_pool.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
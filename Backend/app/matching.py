@@ -0,0 +1,286 @@
+# app/matching.py
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.database import get_connection
+from app.utils.geo import EARTH_RADIUS_KM
+
+# Poll for rides created on other workers this often (seconds)
+MATCH_REFRESH_SECONDS = float(os.getenv("MATCH_REFRESH_SECONDS", 5))
+# Rebuild the whole snapshot this often, to pick up status/seat changes made elsewhere
+MATCH_FULL_RELOAD_SECONDS = float(os.getenv("MATCH_FULL_RELOAD_SECONDS", 300))
+
+# Score weights: lower score is a better match
+W_PICKUP_KM = 1.0
+W_DROP_KM = 1.0
+W_TIME_MIN = 0.1
+W_PRICE = 0.01
+# Used in place of the drop-off distance when a ride has no drop point
+UNKNOWN_DROP_KM = 5.0
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def departure_ts(ride_date, ride_time) -> float:
+    """Naive departure datetime -> seconds, the same way for DB rows and requests."""
+    if isinstance(ride_time, timedelta):  # MySQL TIME columns come back as timedelta
+        dt = datetime.combine(ride_date, datetime.min.time()) + ride_time
+    else:
+        dt = datetime.combine(ride_date, ride_time)
+    return (dt - _EPOCH).total_seconds()
+
+
+def parse_departure(date_str: str, time_str: str) -> float | None:
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return (datetime.strptime(f"{date_str} {time_str}", fmt) - _EPOCH).total_seconds()
+        except ValueError:
+            continue
+    return None
+
+
+def _to_float(value, default=np.nan) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    """Vectorized great-circle distance in km; inputs in degrees."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RideSnapshot:
+    """
+    Scheduled rides as parallel NumPy arrays (one slot per ride) so scoring
+    is a single vectorized pass. Slots are kept dense: removing a ride moves
+    the last slot into its place. Capacity doubles as rides are added.
+    """
+
+    FIELDS = ("pickup_lat", "pickup_lng", "drop_lat", "drop_lng", "depart", "seats", "amount")
+
+    def __init__(self, capacity: int = 1024):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        for name in self.FIELDS:
+            setattr(self, name, np.full(capacity, np.nan, dtype=np.float64))
+        self.size = 0
+        self._slot = {}  # ride id -> slot
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = len(self.ids) * 2
+        self.ids = np.resize(self.ids, capacity)
+        for name in self.FIELDS:
+            setattr(self, name, np.resize(getattr(self, name), capacity))
+
+    def upsert(self, ride_id, pickup_lat, pickup_lng, drop_lat, drop_lng, depart, seats, amount):
+        slot = self._slot.get(ride_id)
+        if slot is None:
+            if self.size == len(self.ids):
+                self._grow()
+            slot = self.size
+            self.size += 1
+            self._slot[ride_id] = slot
+        self.ids[slot] = ride_id
+        self.pickup_lat[slot] = pickup_lat
+        self.pickup_lng[slot] = pickup_lng
+        self.drop_lat[slot] = np.nan if drop_lat is None else drop_lat
+        self.drop_lng[slot] = np.nan if drop_lng is None else drop_lng
+        self.depart[slot] = depart
+        self.seats[slot] = seats
+        self.amount[slot] = amount
+
+    def remove(self, ride_id) -> bool:
+        slot = self._slot.pop(ride_id, None)
+        if slot is None:
+            return False
+        last = self.size - 1
+        if slot != last:
+            moved = int(self.ids[last])
+            self.ids[slot] = moved
+            for name in self.FIELDS:
+                arr = getattr(self, name)
+                arr[slot] = arr[last]
+            self._slot[moved] = slot
+        self.size = last
+        return True
+
+    def set_seats(self, ride_id, seats) -> None:
+        slot = self._slot.get(ride_id)
+        if slot is not None:
+            self.seats[slot] = seats
+
+
+class MatchingEngine:
+    """
+    Ranks scheduled rides for a rider's origin, destination and departure
+    window. The snapshot is loaded lazily, topped up with newly created
+    rides every MATCH_REFRESH_SECONDS and rebuilt every
+    MATCH_FULL_RELOAD_SECONDS; create/status hooks keep it current in
+    between on this worker.
+    """
+
+    def __init__(self, load_rows=None):
+        self._load_rows = load_rows or _load_scheduled_rides
+        self._lock = threading.RLock()
+        # one refresh at a time; other requests keep matching on the current snapshot
+        self._refresh_lock = threading.Lock()
+        self.snapshot = RideSnapshot()
+        self._max_id = 0
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._last_full = 0.0
+
+    # ---- keeping the snapshot current ----
+
+    def _add_rows(self, rows):
+        for row in rows:
+            self.snapshot.upsert(*row)
+            self._max_id = max(self._max_id, int(row[0]))
+
+    def reload(self):
+        rows = self._load_rows(0)
+        with self._lock:
+            self.snapshot = RideSnapshot(max(1024, len(rows) * 2))
+            self._max_id = 0
+            self._add_rows(rows)
+            self._loaded = True
+            self._last_refresh = self._last_full = time.monotonic()
+
+    def _due(self, now):
+        return (
+            not self._loaded
+            or now - self._last_full > MATCH_FULL_RELOAD_SECONDS
+            or now - self._last_refresh > MATCH_REFRESH_SECONDS
+        )
+
+    def refresh(self):
+        """
+        Bring the snapshot up to date if it is due. Only the first load
+        waits; afterwards a request finding another refresh in progress
+        just matches against the current snapshot.
+        """
+        if not self._due(time.monotonic()):
+            return
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            now = time.monotonic()
+            if not self._loaded or now - self._last_full > MATCH_FULL_RELOAD_SECONDS:
+                self.reload()
+            elif now - self._last_refresh > MATCH_REFRESH_SECONDS:
+                rows = self._load_rows(self._max_id)
+                with self._lock:
+                    self._add_rows(rows)
+                    self._last_refresh = now
+        finally:
+            self._refresh_lock.release()
+
+    def ride_created(self, ride_id, pickup_lat, pickup_lng, drop_lat, drop_lng, depart, seats, amount):
+        with self._lock:
+            if self._loaded:
+                self._add_rows([(ride_id, pickup_lat, pickup_lng, drop_lat, drop_lng, depart, seats, amount)])
+
+    def ride_removed(self, ride_id):
+        """Call when a ride leaves 'scheduled' (started, completed, cancelled)."""
+        with self._lock:
+            self.snapshot.remove(ride_id)
+
+    def seats_changed(self, ride_id, seats):
+        with self._lock:
+            if seats <= 0:
+                self.snapshot.remove(ride_id)
+            else:
+                self.snapshot.set_seats(ride_id, seats)
+
+    # ---- matching ----
+
+    def match(self, origin_lat, origin_lng, dest_lat, dest_lng, depart, window_s,
+              seats=1, max_price=None, max_pickup_km=10.0, k=10):
+        """
+        Returns up to k (ride_id, score, pickup_km, drop_km, time_diff_min)
+        tuples, best first.
+        """
+        with self._lock:
+            snap = self.snapshot
+            n = snap.size
+            if n == 0:
+                return []
+
+            dep = snap.depart[:n]
+            time_diff = np.abs(dep - depart)
+            mask = (time_diff <= window_s) & (snap.seats[:n] >= seats)
+            if max_price is not None:
+                mask &= snap.amount[:n] <= max_price
+            idx = np.flatnonzero(mask)
+            if idx.size == 0:
+                return []
+
+            ids = snap.ids[idx]
+            pickup_km = _haversine(origin_lat, origin_lng, snap.pickup_lat[idx], snap.pickup_lng[idx])
+            drop_lat, drop_lng = snap.drop_lat[idx], snap.drop_lng[idx]
+            amount = np.nan_to_num(snap.amount[idx], nan=0.0)
+            time_diff = time_diff[idx]
+
+        keep = pickup_km <= max_pickup_km
+        if dest_lat is not None and dest_lng is not None:
+            drop_km = _haversine(dest_lat, dest_lng, drop_lat, drop_lng)
+            drop_km = np.where(np.isnan(drop_km), UNKNOWN_DROP_KM, drop_km)
+        else:
+            drop_km = np.zeros_like(pickup_km)
+
+        time_min = time_diff / 60.0
+        score = W_PICKUP_KM * pickup_km + W_DROP_KM * drop_km + W_TIME_MIN * time_min + W_PRICE * amount
+        score = np.where(keep, score, np.inf)
+
+        k = min(k, int(np.count_nonzero(keep)))
+        if k == 0:
+            return []
+        top = np.argpartition(score, k - 1)[:k]
+        top = top[np.argsort(score[top], kind="stable")]
+        return [
+            (int(ids[i]), float(score[i]), float(pickup_km[i]), float(drop_km[i]), float(time_min[i]))
+            for i in top
+        ]
+
+
+def _load_scheduled_rides(after_id: int):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT
+                id,
+                ST_Latitude(pickup_point),
+                ST_Longitude(pickup_point),
+                ST_Latitude(drop_point),
+                ST_Longitude(drop_point),
+                date,
+                time,
+                seats,
+                amount
+            FROM rides
+            WHERE status = 'scheduled' AND id > %s AND seats > 0 AND has_location
+            """,
+            (after_id,),
+        )
+        return [
+            (r[0], r[1], r[2], r[3], r[4], departure_ts(r[5], r[6]), r[7], _to_float(r[8]))
+            for r in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+matcher = MatchingEngine()
@@ -0,0 +1,292 @@
+# app/places.py
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+from app.database import get_connection
+from app.matching import departure_ts
+
+# Poll for rides created on other workers this often (seconds)
+PLACES_REFRESH_SECONDS = float(os.getenv("PLACES_REFRESH_SECONDS", 5))
+# Rebuild the whole index this often, to drop rides that left 'scheduled' elsewhere
+PLACES_FULL_RELOAD_SECONDS = float(os.getenv("PLACES_FULL_RELOAD_SECONDS", 300))
+
+ROLES = ("from", "to")
+
+log = logging.getLogger(__name__)
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=65536)
+def normalize_place(text) -> str:
+    """"Rājwāḍa,  Indore " -> "rajwada indore": accents, case and punctuation dropped."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", stripped.casefold()).strip()
+
+
+class Place:
+    """One normalized place name and its scheduled rides, per role, sorted by (departure, id)."""
+
+    __slots__ = ("key", "name", "rides")
+
+    def __init__(self, key, name):
+        self.key = key
+        self.name = name
+        self.rides = {"from": [], "to": []}
+
+    def count(self, role=None) -> int:
+        if role is None:
+            return len(self.rides["from"]) + len(self.rides["to"])
+        return len(self.rides[role])
+
+
+class PlaceIndex:
+    """
+    Word-prefix index over the origins and destinations of scheduled rides.
+
+    Places are keyed by normalize_place(); every word of a place is kept
+    in a sorted token list, so a prefix is one bisect plus a short scan
+    instead of a LIKE '%q%' over every ride. A query matches places that
+    have a word starting with each of its words ("air ind" finds "Indore
+    Airport"). Each place keeps its rides sorted by departure, so search
+    merges the first page of each matching place without touching the
+    rest. Built and kept current off the request path by
+    place_index_refresher(): create/status hooks on this worker, new ids
+    every PLACES_REFRESH_SECONDS and a rebuild every
+    PLACES_FULL_RELOAD_SECONDS.
+    """
+
+    def __init__(self, load_rows=None):
+        self._load_rows = load_rows or _load_scheduled_places
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._reset()
+        self._loaded = False
+        self._last_refresh = 0.0
+        self._last_full = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def _reset(self):
+        self._places = {}       # key -> Place
+        self._tokens = {}       # word -> set of place keys
+        self._sorted = []       # every word ever added, sorted; may hold dropped ones
+        self._rides = {}        # ride id -> (departure, from key, to key)
+        self._max_id = 0
+
+    # ---- keeping the index current ----
+
+    def _place(self, text):
+        key = normalize_place(text)
+        if not key:
+            return None
+        place = self._places.get(key)
+        if place is None:
+            place = self._places[key] = Place(key, " ".join(str(text).split()))
+            for word in set(key.split()):
+                keys = self._tokens.get(word)
+                if keys is None:
+                    keys = self._tokens[word] = set()
+                    bisect.insort(self._sorted, word)
+                keys.add(key)
+        return place
+
+    def _drop_if_empty(self, place):
+        if place.count():
+            return
+        del self._places[place.key]
+        for word in set(place.key.split()):
+            keys = self._tokens.get(word)
+            if keys is not None:
+                keys.discard(place.key)
+                if not keys:
+                    # left in _sorted; lookups skip words missing from _tokens
+                    del self._tokens[word]
+
+    def _add(self, ride_id, from_addr, to_addr, depart, insert=bisect.insort):
+        ride_id = int(ride_id)
+        if ride_id in self._rides:
+            return
+        entry = (depart, ride_id)
+        origin = self._place(from_addr)
+        if origin is not None:
+            insert(origin.rides["from"], entry)
+        destination = self._place(to_addr)
+        if destination is not None:
+            insert(destination.rides["to"], entry)
+        self._rides[ride_id] = (
+            depart, origin.key if origin is not None else None, destination.key if destination is not None else None
+        )
+        if ride_id > self._max_id:
+            self._max_id = ride_id
+
+    def _add_rows(self, rows):
+        for row in rows:
+            self._add(*row)
+
+    def reload(self):
+        rows = self._load_rows(0)
+        fresh = PlaceIndex(self._load_rows)
+        # in (departure, id) order every place list is built by appending
+        rows.sort(key=lambda r: (r[3], r[0]))
+        for row in rows:
+            fresh._add(*row, insert=list.append)
+        with self._lock:
+            self._places, self._tokens, self._sorted = fresh._places, fresh._tokens, fresh._sorted
+            self._rides, self._max_id = fresh._rides, fresh._max_id
+            self._loaded = True
+            self._last_refresh = self._last_full = time.monotonic()
+
+    def refresh(self):
+        now = time.monotonic()
+        if not self._loaded or now - self._last_full > PLACES_FULL_RELOAD_SECONDS:
+            # a rebuild at 1M rides takes seconds: one thread does it while
+            # the others keep answering from the current index
+            if self._reload_lock.acquire(blocking=not self._loaded):
+                try:
+                    if not self._loaded or time.monotonic() - self._last_full > PLACES_FULL_RELOAD_SECONDS:
+                        self.reload()
+                finally:
+                    self._reload_lock.release()
+        elif now - self._last_refresh > PLACES_REFRESH_SECONDS:
+            rows = self._load_rows(self._max_id)
+            with self._lock:
+                self._add_rows(rows)
+                self._last_refresh = now
+
+    def ride_created(self, ride_id, from_addr, to_addr, depart):
+        with self._lock:
+            if self._loaded:
+                self._add(ride_id, from_addr, to_addr, depart)
+
+    def ride_removed(self, ride_id):
+        """Call when a ride leaves 'scheduled' (started, completed, cancelled)."""
+        with self._lock:
+            entry = self._rides.pop(int(ride_id), None)
+            if entry is None:
+                return
+            depart, *keys = entry
+            for role, key in zip(ROLES, keys):
+                place = self._places.get(key)
+                if place is None:
+                    continue
+                rides = place.rides[role]
+                i = bisect.bisect_left(rides, (depart, int(ride_id)))
+                if i < len(rides) and rides[i][1] == int(ride_id):
+                    del rides[i]
+                self._drop_if_empty(place)
+
+    # ---- lookups ----
+
+    def _prefix_keys(self, prefix):
+        keys = set()
+        i = bisect.bisect_left(self._sorted, prefix)
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            keys |= self._tokens.get(self._sorted[i], set())
+            i += 1
+        return keys
+
+    def _matching(self, query):
+        words = normalize_place(query).split()
+        if not words:
+            return []
+        # rarest word first keeps the intersection small
+        sets = sorted((self._prefix_keys(word) for word in set(words)), key=len)
+        keys = set(sets[0])
+        for other in sets[1:]:
+            keys &= other
+            if not keys:
+                break
+        return [self._places[key] for key in keys]
+
+    def autocomplete(self, query, limit=10, role=None):
+        """
+        Places matching `query`, best first: names starting with the whole
+        query before others, then by number of scheduled rides.
+        Returns [{"name", "rides", "from", "to"}].
+        """
+        norm = normalize_place(query)
+        with self._lock:
+            places = [p for p in self._matching(query) if p.count(role)]
+            top = heapq.nsmallest(
+                limit, places, key=lambda p: (p.key != norm, not p.key.startswith(norm), -p.count(role), p.key)
+            )
+            return [
+                {"name": p.name, "rides": p.count(role), "from": p.count("from"), "to": p.count("to")}
+                for p in top
+            ]
+
+    def search(self, query, role=None, limit=20, after=None):
+        """
+        Ids of scheduled rides whose origin (role="from"), destination
+        (role="to") or either matches `query`, soonest departure first.
+        `after` is the (departure, id) of the last ride of the previous
+        page. Returns [(departure, id)].
+        """
+        roles = (role,) if role else ROLES
+        with self._lock:
+            pages = []
+            for place in self._matching(query):
+                for r in roles:
+                    rides = place.rides[r]
+                    start = bisect.bisect_right(rides, tuple(after)) if after else 0
+                    if start < len(rides):
+                        # a ride going from one match to another shows up twice
+                        pages.append(rides[start:start + limit])
+        found, seen = [], set()
+        for entry in heapq.merge(*pages):
+            if entry[1] in seen:
+                continue
+            seen.add(entry[1])
+            found.append(entry)
+            if len(found) == limit:
+                break
+        return found
+
+    def stats(self):
+        with self._lock:
+            return {"places": len(self._places), "words": len(self._tokens), "rides": len(self._rides)}
+
+
+def _load_scheduled_places(after_id: int):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT id, from_addr, to_addr, date, time
+            FROM rides
+            WHERE status = 'scheduled' AND id > %s
+            """,
+            (after_id,),
+        )
+        return [(r[0], r[1], r[2], departure_ts(r[3], r[4])) for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+place_index = PlaceIndex()
+
+
+async def place_index_refresher():
+    """Background loop: build the place index, then refresh it every PLACES_REFRESH_SECONDS."""
+    while True:
+        try:
+            await asyncio.to_thread(place_index.refresh)
+        except Exception:
+            log.exception("Place index refresh failed")
+        await asyncio.sleep(PLACES_REFRESH_SECONDS)
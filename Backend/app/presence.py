@@ -0,0 +1,128 @@
+# app/presence.py
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Set
+
+# Shared Redis-compatible store for presence and cross-worker fan-out.
+# Leave unset to run everything in-process (single worker only).
+CHAT_REDIS_URL = os.getenv("CHAT_REDIS_URL")
+# A socket counts as online while its worker keeps refreshing it.
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", 60))
+
+log = logging.getLogger(__name__)
+
+
+def user_room(user_id: str) -> str:
+    """Socket.IO room holding every connected device of a user."""
+    return f"user:{user_id}"
+
+
+class InMemoryPresence:
+    """Presence for a single process. Also the stand-in used in tests."""
+
+    def __init__(self):
+        self._sids: Dict[str, Set[str]] = {}
+
+    async def add(self, user_id: str, sid: str) -> None:
+        self._sids.setdefault(user_id, set()).add(sid)
+
+    async def remove(self, user_id: str, sid: str) -> None:
+        sids = self._sids.get(user_id)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            del self._sids[user_id]
+
+    async def is_online(self, user_id: str) -> bool:
+        return bool(self._sids.get(user_id))
+
+    async def device_count(self, user_id: str) -> int:
+        return len(self._sids.get(user_id, ()))
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisPresence:
+    """
+    Presence shared by every worker and host through Redis.
+
+    Each user has a sorted set `presence:<user_id>` of socket ids scored by
+    the last time their worker vouched for them. Workers refresh their own
+    sockets every PRESENCE_TTL / 3 seconds, so sockets of a crashed worker
+    age out after PRESENCE_TTL without any cleanup.
+    """
+
+    def __init__(self, client, ttl: float = PRESENCE_TTL):
+        self._redis = client
+        self.ttl = ttl
+        self._local: Dict[str, str] = {}  # sid -> user_id, sockets on this worker
+        self._task = None
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"presence:{user_id}"
+
+    async def add(self, user_id: str, sid: str) -> None:
+        self._local[sid] = user_id
+        key = self._key(user_id)
+        await self._redis.zadd(key, {sid: time.time()})
+        await self._redis.expire(key, int(self.ttl * 2))
+
+    async def remove(self, user_id: str, sid: str) -> None:
+        self._local.pop(sid, None)
+        await self._redis.zrem(self._key(user_id), sid)
+
+    async def is_online(self, user_id: str) -> bool:
+        return await self.device_count(user_id) > 0
+
+    async def device_count(self, user_id: str) -> int:
+        return await self._redis.zcount(self._key(user_id), time.time() - self.ttl, "+inf")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # this worker's sockets are going away with it
+        for sid, user_id in list(self._local.items()):
+            await self.remove(user_id, sid)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                now = time.time()
+                pipe = self._redis.pipeline()
+                for sid, user_id in list(self._local.items()):
+                    key = self._key(user_id)
+                    pipe.zadd(key, {sid: now})
+                    pipe.zremrangebyscore(key, "-inf", now - self.ttl)
+                    pipe.expire(key, int(self.ttl * 2))
+                await pipe.execute()
+            except Exception as e:
+                log.warning("Presence refresh failed: %s", e)
+
+
+def create_presence():
+    if not CHAT_REDIS_URL:
+        return InMemoryPresence()
+    import redis.asyncio as redis
+    return RedisPresence(redis.from_url(CHAT_REDIS_URL))
+
+
+def create_client_manager():
+    """Socket.IO client manager: Redis pub/sub across workers, or in-process."""
+    if not CHAT_REDIS_URL:
+        return None
+    import socketio
+    return socketio.AsyncRedisManager(CHAT_REDIS_URL)
@@ -1,8 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
-from app.database import get_connection
-from app.core.security import hash_password, verify_password, create_access_token, decode_access_token
-import os, shutil
+from app.database import PoolTimeout, db_unavailable, get_connection, get_read_connection, mark_written, read_db
+from app.core.cache import TTLCache
+from app.core.security import hash_password_async, verify_password_async, create_access_token, decode_access_token
+from app.feed import rides_changed
+from app.presence import CHAT_REDIS_URL
+from app.uploads import UPLOAD_FORM_OVERHEAD, UPLOAD_MAX_BYTES, multipart_file, save_image, thumbnail_pool, upload_url
+import asyncio, logging, os, time
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+
+# user id -> users row, for get_current_user
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# bearer token -> user id, so a token is only decoded once; never outlives the token's exp
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# Redis pub/sub channel on CHAT_REDIS_URL telling every worker which users rows changed
+USER_CHANGED_CHANNEL = "auth:user-changed"
+
+log = logging.getLogger(__name__)
 
 router =APIRouter()
 
@@ -15,50 +35,188 @@ class LoginIn(BaseModel):
     email: EmailStr
     password: str
 
-@router.post("/register")
-def register(inp: RegisterIn):
-    conn = get_connection()
+def _email_taken(conn, email):
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id FROM users WHERE email =  %s",(inp.email,))
-        if cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Email already registered")
+        cursor.execute("SELECT id FROM users WHERE email =  %s",(email,))
+        return cursor.fetchone() is not None
+    finally:
+        cursor.close()
 
-        pwd_hash = hash_password(inp.password)
 
+def _insert_user(conn, name, email, pwd_hash):
+    cursor = conn.cursor(dictionary=True)
+    try:
         cursor.execute(
             "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
-            (inp.name, inp.email, pwd_hash)
+            (name, email, pwd_hash)
         )
         conn.commit()
-        return {"success": True, "message": "Account created successfully"}
+        user_id = cursor.lastrowid
+    finally:
+        cursor.close()
+    # may write to Redis: keep it in the threadpool call with the INSERT
+    mark_written(user_id)
+    return user_id
+
+
+def _find_user_by_email(conn, email):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id,name,email, password_hash FROM users WHERE email =  %s",(email,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _update_password_hash(conn, user_id, pwd_hash):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s", (pwd_hash, user_id))
+        conn.commit()
     finally:
         cursor.close()
+
+
+def _with_connection(fn, *args):
+    """Run fn(conn, *args) on a connection held only for that call."""
+    try:
+        conn = get_connection()
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        return fn(conn, *args)
+    finally:
         conn.close()
 
+
+# register/login are async so the handler waits on the hash pool without
+# holding a threadpool thread. Each DB step checks a connection out for
+# just that step: hashing can queue for a while, and a login storm must
+# not pin the whole DB pool while it waits.
+
+@router.post("/register")
+async def register(inp: RegisterIn):
+    if await run_in_threadpool(_with_connection, _email_taken, inp.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    pwd_hash = await hash_password_async(inp.password)
+
+    await run_in_threadpool(_with_connection, _insert_user, inp.name, inp.email, pwd_hash)
+    return {"success": True, "message": "Account created successfully"}
+
 @router.post("/login")
-def login(inp: LoginIn):
-    conn = get_connection()
+async def login(inp: LoginIn):
+    user = await run_in_threadpool(_with_connection, _find_user_by_email, inp.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    ok, new_hash = await verify_password_async(inp.password, user["password_hash"])
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # work factor changed since this hash was made
+        await run_in_threadpool(_with_connection, _update_password_hash, user["id"], new_hash)
+    token = create_access_token(str(user["id"]))
+    return {
+        "success": True,
+        "token": token,
+        "user": {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"],
+            "phone": user.get("phone"),
+        }
+    }
+
+_publisher = None
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Call after any change to a users row so get_current_user re-reads it,
+    on this worker and (through USER_CHANGED_CHANNEL) on every other one.
+    Blocking; run off the event loop.
+    """
+    global _publisher
+    user_cache.pop(user_id)
+    if not CHAT_REDIS_URL:
+        return
+    try:
+        if _publisher is None:
+            import redis
+            _publisher = redis.Redis.from_url(CHAT_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+        _publisher.publish(USER_CHANGED_CHANNEL, str(user_id))
+    except Exception as e:
+        # the other workers' copies expire within USER_CACHE_TTL
+        log.warning("Could not broadcast change of user %s: %s", user_id, e)
+
+
+async def user_change_listener(client=None):
+    """Background loop: drop users rows changed on other workers from this worker's cache."""
+    if client is None:
+        import redis.asyncio as redis
+        client = redis.from_url(CHAT_REDIS_URL)
+    while True:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(USER_CHANGED_CHANNEL)
+            async for message in pubsub.listen():
+                try:
+                    user_cache.pop(int(message["data"]))
+                except (TypeError, ValueError):
+                    continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # changes published while unsubscribed were missed: start over
+            user_cache.clear()
+            log.warning("User change listener failed, resubscribing: %s", e)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+def auth_cache_stats():
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+
+def _user_id_from_token(token: str) -> int:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    payload= decode_access_token(token)
+    if not payload or "sub" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = int(payload["sub"])
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    token_cache.set(token, user_id, ttl)
+    return user_id
+
+
+def _find_user(conn, user_id):
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id,name,email, password_hash FROM users WHERE email =  %s",(inp.email,))
-        user = cursor.fetchone()
-        if not user or not verify_password(inp.password, user["password_hash"]):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        token = create_access_token(str(user["id"]))
-        return {
-            "success": True,
-            "token": token,
-            "user": {
-                "id": user["id"],
-                "name": user["name"],
-                "email": user["email"],
-                "phone": user.get("phone"),
-            }
-        }
+        cursor.execute("SELECT id, name, email, phone, profile_url, created_at FROM users WHERE id = %s", (user_id,))
+        return cursor.fetchone()
     finally:
         cursor.close()
+
+
+def _load_user(user_id: int):
+    try:
+        conn = get_read_connection(user_id)
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        user = _find_user(conn, user_id)
+    finally:
         conn.close()
+    if user is None:
+        # a valid token for a user the replica doesn't have yet (just
+        # registered, possibly through another worker): ask the primary
+        user = _with_connection(_find_user, user_id)
+    return user
+
 
 def get_current_user(authorization:str | None = Header(None)):
     if not authorization:
@@ -67,22 +225,20 @@ def get_current_user(authorization:str | None = Header(None)):
     if len(parts) != 2 or parts[0].lower()!= "bearer":
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     token = parts[1]
-    payload= decode_access_token(token)
-    if not payload or "sub" not in payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user_id = int(payload["sub"])
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    user_id = _user_id_from_token(token)
 
-    try:
-        cursor.execute("SELECT id, name, email, phone, profile_url, created_at FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
+    user = user_cache.get(user_id)
+    if user is None:
+        user = _load_user(user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
-    finally:
-        cursor.close()
-        conn.close()
+        user_cache.set(user_id, user)
+    # handlers get their own copy so they can't corrupt the cached row
+    return dict(user)
+
+def get_user_read_db(user: dict = Depends(get_current_user)):
+    """get_db for SELECT-only handlers: a replica unless this user just wrote."""
+    yield from read_db(user["id"])
 
 @router.get("/me")
 def me(user:dict = Depends(get_current_user)):
@@ -94,35 +250,41 @@ def me(user:dict = Depends(get_current_user)):
         "createdAt": user["created_at"].isoformat() if hasattr(user["created_at"], "isoformat") else str(user["created_at"]),
     }
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-@router.post("/upload-profile")
-def upload_profile(
-    profile: UploadFile = File(...),
-    user: dict = Depends(get_current_user),
-):
-    filename = f"user_{user['id']}_{profile.filename}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(profile.file, buffer)
-
-    # Save relative URL or path in DB
-    relative_url = f"/uploads/{filename}"
-
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+def _set_profile_url(conn, user_id, url):
+    """Store the new URL and let caches and the ride feed see it. Blocking; run off the loop."""
+    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "UPDATE users SET profile_url = %s WHERE id = %s",
-            (relative_url, user["id"]),
-        )
+        cursor.execute("UPDATE users SET profile_url = %s WHERE id = %s", (url, user_id))
         conn.commit()
     finally:
         cursor.close()
-        conn.close()
+    mark_written(user_id)
+    invalidate_user(user_id)
+    # ride feeds show driver avatars
+    rides_changed(conn)
+
+
+@router.post("/upload-profile")
+async def upload_profile(request: Request, user: dict = Depends(get_current_user)):
+    """
+    Multipart upload with the image in the `profile` field.
+
+    Oversized requests are refused from Content-Length before the body is
+    read. The body is then parsed as it streams in and the image part is
+    written straight to disk under a content-hash name (see
+    app/uploads.py), stopping with 413 as soon as it passes the limit even
+    for chunked requests. The URL changes exactly when the picture does
+    and can be cached forever. Thumbnails are made in the background.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Profile image is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
 
-    return {"success": True, "profileUrl": relative_url}
+    digest, name = await save_image(multipart_file(request, "profile"))
 
+    thumbnail_pool.submit(name, digest)
+    relative_url = upload_url(name)
+    if relative_url != user.get("profile_url"):
+        await run_in_threadpool(_with_connection, _set_profile_url, user["id"], relative_url)
 
+    return {"success": True, "profileUrl": relative_url, "thumbnails": thumbnail_pool.urls(digest)}
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from app.bookings import book_ride, cancel_booking, confirm_booking
+from app.routes.auth import get_current_user
+
+router = APIRouter()
+
+
+class BookIn(BaseModel):
+    seats: int = Field(1, ge=1, le=8)
+    # hold the seats for BOOKING_HOLD_SECONDS until /confirm (e.g. pending payment)
+    hold: bool = False
+
+
+class CancelIn(BaseModel):
+    bookingId: int
+
+
+@router.post("/{ride_id}/book")
+async def book(
+    ride_id: int,
+    data: BookIn,
+    idempotency_key: str | None = Header(None, max_length=64),
+    user=Depends(get_current_user),
+):
+    """
+    Book seats on a ride. Send an Idempotency-Key header so retries of the
+    same request return the original booking instead of booking twice.
+    """
+    result = await run_in_threadpool(book_ride, ride_id, user["id"], data.seats, data.hold, idempotency_key)
+    return {"success": True, **result}
+
+
+@router.post("/{ride_id}/bookings/{booking_id}/confirm")
+async def confirm(ride_id: int, booking_id: int, user=Depends(get_current_user)):
+    result = await run_in_threadpool(confirm_booking, ride_id, user["id"], booking_id)
+    return {"success": True, **result}
+
+
+@router.post("/{ride_id}/cancel")
+async def cancel(ride_id: int, data: CancelIn, user=Depends(get_current_user)):
+    result = await run_in_threadpool(cancel_booking, ride_id, user["id"], data.bookingId)
+    return {"success": True, **result}
@@ -0,0 +1,148 @@
+from fastapi import APIRouter, Depends, Query
+from app.database import get_db
+from app.routes.auth import get_current_user
+from app.utils.pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor
+
+router = APIRouter()
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+@router.get("/conversations")
+def get_conversations(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str | None = Query(None, description="nextCursor from the previous page"),
+    user=Depends(get_current_user),
+    conn=Depends(get_db),
+):
+    """
+    Inbox: one entry per peer with the latest message and unread count,
+    most recent conversation first.
+
+    Reads the chat_conversations summary (maintained by the message writer)
+    through its (user_id, last_message_id) index, so the cost grows with
+    the number of conversations, not messages.
+    """
+    after = decode_cursor(cursor, 1, (int,))
+    where = "c.user_id = %s"
+    params = [user["id"]]
+    if after:
+        where += " AND c.last_message_id < %s"
+        params.append(after[0])
+
+    db_cursor = conn.cursor(dictionary=True)
+    try:
+        db_cursor.execute(
+            f"""
+            SELECT
+                c.peer_id,
+                c.unread_count,
+                c.last_message_id,
+                m.sender_id,
+                m.message,
+                m.created_at,
+                u.name        AS peer_name,
+                u.profile_url AS peer_profile_url
+            FROM chat_conversations c
+            JOIN chat_messages m ON m.id = c.last_message_id
+            JOIN users u ON u.id = c.peer_id
+            WHERE {where}
+            ORDER BY c.last_message_id DESC
+            LIMIT %s
+            """,
+            params + [limit + 1],
+        )
+        rows = db_cursor.fetchall()
+    finally:
+        db_cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["last_message_id"])
+
+    conversations = [
+        {
+            "peerId": row["peer_id"],
+            "peerName": row["peer_name"],
+            "peerProfileUrl": row["peer_profile_url"],
+            "unreadCount": row["unread_count"],
+            "lastMessage": {
+                "id": row["last_message_id"],
+                "senderId": row["sender_id"],
+                "message": row["message"],
+                "createdAt": _iso(row["created_at"]),
+            },
+        }
+        for row in rows
+    ]
+    return {"success": True, "conversations": conversations, "limit": limit, "nextCursor": next_cursor}
+
+
+@router.get("/history/{peer_id}")
+def get_history(
+    peer_id: int,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str | None = Query(None, description="nextCursor from the previous page"),
+    user=Depends(get_current_user),
+    conn=Depends(get_db),
+):
+    """
+    Messages between the current user and peer_id, newest first.
+
+    (user_lo, user_hi) is the canonical conversation key, so the thread is
+    one range scan on (user_lo, user_hi, id) instead of an OR across the
+    sender and receiver indexes. Loading the first page marks the
+    conversation as read.
+    """
+    user_id = user["id"]
+    lo, hi = min(user_id, peer_id), max(user_id, peer_id)
+
+    after = decode_cursor(cursor, 1, (int,))
+    where = "user_lo = %s AND user_hi = %s"
+    params = [lo, hi]
+    if after:
+        where += " AND id < %s"
+        params.append(after[0])
+
+    db_cursor = conn.cursor(dictionary=True)
+    try:
+        db_cursor.execute(
+            f"""
+            SELECT id, sender_id, receiver_id, message, created_at
+            FROM chat_messages
+            WHERE {where}
+            ORDER BY id DESC
+            LIMIT %s
+            """,
+            params + [limit + 1],
+        )
+        rows = db_cursor.fetchall()
+
+        if not after:
+            db_cursor.execute(
+                "UPDATE chat_conversations SET unread_count = 0 WHERE user_id = %s AND peer_id = %s AND unread_count > 0",
+                (user_id, peer_id),
+            )
+            conn.commit()
+    finally:
+        db_cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["id"])
+
+    messages = [
+        {
+            "id": row["id"],
+            "senderId": row["sender_id"],
+            "receiverId": row["receiver_id"],
+            "message": row["message"],
+            "createdAt": _iso(row["created_at"]),
+        }
+        for row in rows
+    ]
+    return {"success": True, "messages": messages, "limit": limit, "nextCursor": next_cursor}
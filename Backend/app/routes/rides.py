@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from app.database import get_connection
-from pydantic import BaseModel, Field
+import logging
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from app.database import PoolTimeout, db_unavailable, get_connection, get_read_connection, get_db, insert_ids, mark_written
+from pydantic import BaseModel, Field, field_validator
 from app.routes.auth import get_current_user
-from datetime import date, datetime, time
+from app.core.serialization import Const, FastJSONResponse, RowMapper, clock_time, display_date, display_time, dumps, iso_date
+from app.feed import etag_matches, feed_cache, feed_stats, feed_version, make_etag, rides_changed
+from app.utils.geo import AXIS_ORDER, SRID, bbox_wkt, point_wkt
+from app.matching import matcher, parse_departure
+from app.places import place_index
+from app.utils.pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor, stream_json_list
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
 
 router = APIRouter(tags=["rides"])
+log = logging.getLogger(__name__)
 
 
 class CarDetails(BaseModel):
@@ -14,189 +26,685 @@ class CarDetails(BaseModel):
     color: str
 
 
-class RideCreate(BaseModel):
+class GeoPoint(BaseModel):
+    """GeoJSON point, as sent by the app: coordinates are [longitude, latitude]."""
+    type: str = "Point"
+    coordinates: List[float]
+
+    @field_validator("coordinates")
+    @classmethod
+    def check_coordinates(cls, v):
+        if len(v) != 2:
+            raise ValueError("coordinates must be [longitude, latitude]")
+        lng, lat = v
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise ValueError("coordinates out of range")
+        return v
+
+    @property
+    def lng(self) -> float:
+        return self.coordinates[0]
+
+    @property
+    def lat(self) -> float:
+        return self.coordinates[1]
+
+
+class RideDetails(BaseModel):
     from_: str = Field(alias="from")
     to: str
-    date: str
-    time: str
     availableSeats: int
     amount: int
     carDetails: CarDetails
+    # pickup point; rides without one get has_location = 0 (pickup_point is a
+    # placeholder at 0,0 that the spatial index needs) and stay out of /nearby and /match
+    location: Optional[GeoPoint] = None
+    dropLocation: Optional[GeoPoint] = None
 
 
-@router.post("/")
-def create_ride(data: RideCreate, user=Depends(get_current_user)):
-    user_id = user["id"]
+class RideCreate(RideDetails):
+    date: str
+    time: str
+
+
+class RideRecurrence(RideDetails):
+    """The same ride at `time` on every chosen weekday from startDate to endDate (inclusive)."""
+    daysOfWeek: List[int] = Field(..., description="ISO weekdays: 1 = Monday ... 7 = Sunday")
+    startDate: str
+    endDate: str
+    time: str
+
+    @field_validator("daysOfWeek")
+    @classmethod
+    def check_days(cls, v):
+        if not v or any(d < 1 or d > 7 for d in v):
+            raise ValueError("daysOfWeek must be a non-empty list of 1 (Monday) .. 7 (Sunday)")
+        return sorted(set(v))
+
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+class RideBulkCreate(BaseModel):
+    rides: List[RideCreate] = []
+    recurrence: Optional[RideRecurrence] = None
 
+
+class RideMatchRequest(BaseModel):
+    origin: GeoPoint
+    destination: Optional[GeoPoint] = None
+    date: str
+    time: str
+    windowMinutes: int = Field(60, ge=0, le=24 * 60)
+    seats: int = Field(1, ge=1)
+    maxPrice: Optional[float] = None
+    maxPickupKm: float = Field(10, gt=0, le=200)
+    limit: int = Field(10, ge=1, le=50)
+
+
+# Most rides one bulk request may create, and the longest recurrence range
+RIDES_BULK_MAX = int(os.getenv("RIDES_BULK_MAX", 200))
+RIDES_RECURRENCE_MAX_DAYS = int(os.getenv("RIDES_RECURRENCE_MAX_DAYS", 366))
+
+_RIDE_COLUMNS = (
+    "driver_id, from_addr, to_addr, date, time, seats, amount, "
+    "car_name, car_number, car_color, status, pickup_point, drop_point, has_location"
+)
+_RIDE_VALUES = (
+    "(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,"
+    f"ST_GeomFromText(%s, {SRID}, '{AXIS_ORDER}'),"
+    f"ST_GeomFromText(%s, {SRID}, '{AXIS_ORDER}'),%s)"
+)
+_NO_LOCATION = GeoPoint(coordinates=[0.0, 0.0])
+
+
+def _ride_params(user_id, ride: RideDetails, ride_date: str, ride_time: str):
+    pickup = ride.location or _NO_LOCATION
+    drop = ride.dropLocation
+    return [
+        user_id,
+        ride.from_,
+        ride.to,
+        ride_date,
+        ride_time,
+        ride.availableSeats,
+        ride.amount,
+        ride.carDetails.name,
+        ride.carDetails.number,
+        ride.carDetails.color,
+        'scheduled',  # Set default status to 'scheduled'
+        point_wkt(pickup.lat, pickup.lng),
+        point_wkt(drop.lat, drop.lng) if drop else None,
+        ride.location is not None,
+    ]
+
+
+def _insert_rides(conn, user_id, items):
+    """
+    Insert (ride, date, time) items with one multi-row INSERT and a single
+    commit, then make them visible to matching and the feed. Returns the
+    new ids in input order.
+    """
+    params = [value for ride, d, t in items for value in _ride_params(user_id, ride, d, t)]
+    cursor = conn.cursor()
     try:
         cursor.execute(
-            """
-            INSERT INTO rides
-            (driver_id, from_addr, to_addr, date, time, seats, amount,
-             car_name, car_number, car_color, status)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            """,
-            (
-                user_id,
-                data.from_,
-                data.to,
-                data.date,
-                data.time,
-                data.availableSeats,
-                data.amount,
-                data.carDetails.name,
-                data.carDetails.number,
-                data.carDetails.color,
-                'scheduled',  # Set default status to 'scheduled'
-            ),
+            f"INSERT INTO rides ({_RIDE_COLUMNS}) VALUES " + ",".join([_RIDE_VALUES] * len(items)),
+            params,
         )
+        ids = insert_ids(cursor, len(items))
         conn.commit()
-        return {"success": True}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    mark_written(user_id)
+    for ride_id, (ride, d, t) in zip(ids, items):
+        depart = parse_departure(d, t)
+        if depart is None:
+            continue
+        place_index.ride_created(ride_id, ride.from_, ride.to, depart)
+        pickup = ride.location
+        if pickup is None:
+            continue
+        drop = ride.dropLocation
+        matcher.ride_created(
+            ride_id,
+            pickup.lat,
+            pickup.lng,
+            drop.lat if drop else None,
+            drop.lng if drop else None,
+            depart,
+            ride.availableSeats,
+            ride.amount,
+        )
+    rides_changed(conn)
+    return ids
 
 
+@router.post("/")
+def create_ride(data: RideCreate, user=Depends(get_current_user), conn=Depends(get_db)):
+    try:
+        ride_id, = _insert_rides(conn, user["id"], [(data, data.date, data.time)])
+        return {"success": True, "id": ride_id}
+    except Exception as e:
+        log.exception("Could not create ride")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _parse_date(value: str, field: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field}: invalid date, expected YYYY-MM-DD")
+
+
+def _expand_recurrence(rec: RideRecurrence):
+    start = _parse_date(rec.startDate, "recurrence.startDate")
+    end = _parse_date(rec.endDate, "recurrence.endDate")
+    if end < start:
+        raise HTTPException(status_code=400, detail="recurrence.endDate is before startDate")
+    if (end - start).days >= RIDES_RECURRENCE_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"recurrence may span at most {RIDES_RECURRENCE_MAX_DAYS} days"
+        )
+    days = set(rec.daysOfWeek)
+    items = []
+    day = start
+    while day <= end:
+        if day.isoweekday() in days:
+            items.append((rec, day.isoformat(), rec.time))
+        day += timedelta(days=1)
+    return items
+
+
+@router.post("/bulk")
+def create_rides_bulk(data: RideBulkCreate, user=Depends(get_current_user), conn=Depends(get_db)):
+    """
+    Create many rides at once: an explicit `rides` list, a `recurrence`
+    (e.g. every weekday at 08:30 for a month) expanded server-side, or
+    both. Everything is validated before anything is written; then all
+    rides go in with one multi-row INSERT in a single transaction, so
+    either every ride is created or none is.
+    """
+    items = [(ride, ride.date, ride.time) for ride in data.rides]
+    if data.recurrence is not None:
+        items += _expand_recurrence(data.recurrence)
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No rides to create")
+    if len(items) > RIDES_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {RIDES_BULK_MAX} rides per request, got {len(items)}")
+    for i, (ride, d, t) in enumerate(items):
+        where = f"rides[{i}]" if i < len(data.rides) else f"recurrence ({d})"
+        if parse_departure(d, t) is None:
+            raise HTTPException(status_code=400, detail=f"{where}: invalid date/time, expected YYYY-MM-DD and HH:MM")
+        if ride.availableSeats < 1:
+            raise HTTPException(status_code=400, detail=f"{where}: availableSeats must be at least 1")
+        if ride.amount < 0:
+            raise HTTPException(status_code=400, detail=f"{where}: amount cannot be negative")
+
+    try:
+        ids = _insert_rides(conn, user["id"], items)
     except Exception as e:
-        print("🔥 SQL ERROR:", str(e))
+        log.exception("Could not create rides in bulk")
         raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "ids": ids, "count": len(ids)}
 
 
+def _stream_rows(conn, sql, params, mapper, batch=500):
+    """
+    Run `sql` on an unbuffered (server-side) cursor and yield rows mapped
+    by `mapper` batch by batch. Owns `conn` and gives it back when done.
+    """
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(sql, params)
+        map_row = mapper.bind(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            for row in rows:
+                yield map_row(row)
     finally:
-        cursor.close()
+        try:
+            cursor.close()
+        except Exception:
+            # client went away mid-stream; the pool drops the connection
+            pass
         conn.close()
 
+
+def _streaming_response(sql, params, mapper, user_id=None, since=None):
+    try:
+        conn = get_read_connection(user_id, since)
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    return StreamingResponse(
+        stream_json_list("rides", _stream_rows(conn, sql, params, mapper)),
+        media_type="application/json",
+    )
+
+
+# reshaped to match Flutter
+USER_RIDE = RowMapper([
+    ("id", "id"),
+    ("from", "from"),
+    ("to", "to"),
+    ("amount", "amount"),
+    ("date", "date", iso_date),
+    ("time", "time", clock_time),
+    ("availableSeats", "availableSeats"),
+    ("driverName", "driverName"),
+    ("driverContact", "driverContact"),
+    ("carDetails", RowMapper([
+        ("name", "car_name"),
+        ("number", "car_number"),
+        ("color", "car_color"),
+    ])),
+])
+
+
 @router.get("/user/{user_id}")
-def get_user_rides(user_id: int, user=Depends(get_current_user)):
+def get_user_rides(
+    user_id: int,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str | None = Query(None, description="nextCursor from the previous page"),
+    stream: bool = Query(False, description="Stream every remaining ride instead of one page"),
+    user=Depends(get_current_user),
+):
     # Secure: do not allow users to fetch others' rides
     user_id = user["id"]
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT
-                r.id,
-                r.from_addr AS `from`,
-                r.to_addr AS `to`,
-                r.amount,
-                r.date AS `date`,
-                r.time AS `time`,
-                r.seats AS availableSeats,
-                r.car_name,
-                r.car_number,
-                r.car_color,
-                u.name AS driverName,
-                u.phone AS driverContact
-            FROM rides r
-            LEFT JOIN users u ON u.id = r.driver_id
-            WHERE r.driver_id = %s
-            ORDER BY r.created_at DESC
-            """,
-            (user_id,)
-        )
-        rows = cursor.fetchall()
+    # keyset on (created_at, id), newest first; created_at is NOT NULL in both tables,
+    # so every row yields a cursor decode_cursor accepts
+    after = decode_cursor(cursor, 2, (str, int))
+    where = "r.driver_id = %s"
+    branch_params = [user_id]
+    if after:
+        where += " AND (r.created_at < %s OR (r.created_at = %s AND r.id < %s))"
+        branch_params += [after[0], after[0], after[1]]
 
-        # reshape to match Flutter
-        for ride in rows:
-            ride["carDetails"] = {
-                "name": ride.pop("car_name"),
-                "number": ride.pop("car_number"),
-                "color": ride.pop("car_color"),
-            }
+    # Archived rides live in rides_history (app/lifecycle.py); each branch
+    # walks its own (driver_id, created_at) index and is cut to one page.
+    branch_limit = "" if stream else "LIMIT %s"
+    if not stream:
+        branch_params.append(limit + 1)
+    branch = f"""
+            SELECT r.id, r.driver_id, r.from_addr, r.to_addr, r.amount, r.date, r.time, r.seats,
+                   r.car_name, r.car_number, r.car_color, r.created_at
+            FROM {{table}} r
+            WHERE {where}
+            ORDER BY r.created_at DESC, r.id DESC
+            {branch_limit}
+    """
+    params = branch_params + branch_params
 
-        return {"success": True, "rides": rows}
+    sql = f"""
+        SELECT
+            r.id,
+            r.from_addr AS `from`,
+            r.to_addr AS `to`,
+            r.amount,
+            r.date AS `date`,
+            r.time AS `time`,
+            r.seats AS availableSeats,
+            r.car_name,
+            r.car_number,
+            r.car_color,
+            r.created_at,
+            u.name AS driverName,
+            u.phone AS driverContact
+        FROM (
+            ({branch.format(table="rides")})
+            UNION ALL
+            ({branch.format(table="rides_history")})
+        ) r
+        LEFT JOIN users u ON u.id = r.driver_id
+        ORDER BY r.created_at DESC, r.id DESC
+        """
+
+    # no request-scoped connection here: a stream holds its own until the
+    # last row is sent, and a second one for the request would sit idle
+    if stream:
+        return _streaming_response(sql, params, USER_RIDE, user_id=user_id)
+
+    try:
+        conn = get_read_connection(user_id)
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        db_cursor = conn.cursor()
+        try:
+            db_cursor.execute(sql + " LIMIT %s", params + [limit + 1])
+            rows = db_cursor.fetchall()
+            columns = db_cursor.column_names
+        finally:
+            db_cursor.close()
     finally:
-        cursor.close()
         conn.close()
 
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[columns.index("created_at")], last[0])
+
+    map_row = USER_RIDE.bind(columns)
+    rides = [map_row(row) for row in rows]
+    return FastJSONResponse({"success": True, "rides": rides, "limit": limit, "nextCursor": next_cursor})
+
+
+# Columns of a ride card, shared by /nearby and /match. The avatar
+# fallback is built in SQL; dates and times go through cached formatters.
+# Rides created without a location report null pickup coordinates.
+_RIDE_CARD_COLUMNS = """
+        r.id,
+        r.from_addr   AS from_addr,
+        r.to_addr     AS to_addr,
+        r.date   AS ride_date,
+        r.time   AS ride_time,
+        r.seats       AS seats,
+        r.amount      AS amount,
+        r.car_name    AS car_name,
+        r.car_number  AS car_number,
+        r.car_color   AS car_color,
+        u.name        AS driver_name,
+        -- uploaded avatars have content-hash URLs, so clients cache them for good
+        COALESCE(u.profile_url, CONCAT('https://i.pravatar.cc/150?u=', u.name)) AS driver_image,
+        IF(r.has_location, ST_Latitude(r.pickup_point), NULL)  AS pickup_lat,
+        IF(r.has_location, ST_Longitude(r.pickup_point), NULL) AS pickup_lng"""
+
+
+def _km(value):
+    return round(value, 2)
+
+
+# Build object matching your Flutter UI keys
+_RIDE_CARD_FIELDS = [
+    ("id", "id"),
+    ("from", "from_addr"),
+    ("to", "to_addr"),
+    ("date", "ride_date", display_date),  # "27 Oct 2025"
+    ("time", "ride_time", display_time),  # "10:30 AM"
+    ("seats", "seats"),
+    ("amount", "amount"),
+    ("carName", "car_name"),
+    ("carNumber", "car_number"),
+    ("carColor", "car_color"),
+    ("driver", "driver_name"),
+    ("pickupLat", "pickup_lat"),
+    ("pickupLng", "pickup_lng"),
+]
+# You don't have ratings in DB yet, so we fake them for now
+_RATING = ("rating", Const(4.5))
+
+NEARBY_RIDE = RowMapper(_RIDE_CARD_FIELDS + [
+    ("distanceKm", "distance_km", _km),
+    _RATING,
+    ("driverImage", "driver_image"),
+])
+MATCHED_RIDE = RowMapper(_RIDE_CARD_FIELDS + [
+    _RATING,
+    ("driverImage", "driver_image"),
+])
+
+
+_NEARBY_SQL = f"""
+    SELECT {_RIDE_CARD_COLUMNS},
+        ST_Distance_Sphere(
+            r.pickup_point,
+            ST_GeomFromText(%s, {SRID}, '{AXIS_ORDER}')
+        ) / 1000 AS distance_km
+    FROM rides r
+    JOIN users u ON u.id = r.driver_id
+    WHERE r.status = 'scheduled'
+      AND r.has_location
+      AND MBRContains(ST_GeomFromText(%s, {SRID}, '{AXIS_ORDER}'), r.pickup_point)
+    HAVING {{having}}
+    ORDER BY distance_km, r.id
+    """
+
+
+def _nearby_query(latitude, longitude, radius, cursor):
+    center = point_wkt(latitude, longitude)
+    box = bbox_wkt(latitude, longitude, radius)
+
+    # (distance in km, ride id)
+    after = decode_cursor(cursor, 2, ((int, float), int))
+    having = "distance_km <= %s"
+    params = [center, box, radius]
+    if after:
+        having += " AND (distance_km > %s OR (distance_km = %s AND r.id > %s))"
+        params += [after[0], after[0], after[1]]
+    return _NEARBY_SQL.format(having=having), params
+
+
+def query_nearby_rides(conn, latitude, longitude, radius, limit=DEFAULT_LIMIT, cursor=None):
+    """One page of nearby rides straight from MySQL, formatted for the app."""
+    sql, params = _nearby_query(latitude, longitude, radius, cursor)
+    db_cursor = conn.cursor()
+    try:
+        db_cursor.execute(sql + " LIMIT %s", params + [limit + 1])
+        rows = db_cursor.fetchall()
+        columns = db_cursor.column_names
+    finally:
+        db_cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[columns.index("distance_km")], last[0])
+
+    map_row = NEARBY_RIDE.bind(columns)
+    rides = [map_row(row) for row in rows]
+    return {"success": True, "rides": rides, "limit": limit, "nextCursor": next_cursor}
+
+
 @router.get("/nearby")
 def get_nearby_rides(
     latitude: float = Query(...),
     longitude: float = Query(...),
-    radius: int = Query(10),
+    radius: float = Query(10, gt=0, le=500, description="Search radius in km"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str | None = Query(None, description="nextCursor from the previous page"),
+    stream: bool = Query(False, description="Stream every remaining ride instead of one page"),
+    if_none_match: str | None = Header(None),
     user: dict = Depends(get_current_user),
 ):
     """
-    Returns ALL scheduled rides in the app.
-    For now we ignore latitude/longitude and radius and just
-    give a global feed that matches the RideScreen UI shape.
+    Scheduled rides whose pickup point is within `radius` km of
+    (latitude, longitude), nearest first.
+
+    MBRContains on the bounding box lets MySQL use the SPATIAL index on
+    pickup_point; ST_Distance_Sphere then trims the box to the circle.
+    Pages are keyed on (distance, id), so a cursor is only valid for the
+    same latitude/longitude/radius.
+
+    Pages are rendered once per feed version (bumped whenever a ride is
+    created or its seats/status change) and kept in memory. The ETag is
+    the version plus the query, so a poller sending If-None-Match gets a
+    304 without touching the database.
     """
-    print(f"🟢 Nearby rides requested by user: {user.get('id')}")
-    
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    log.debug("Nearby rides requested by user: %s", user.get("id"))
+
+    if stream:
+        sql, params = _nearby_query(latitude, longitude, radius, cursor)
+        return _streaming_response(sql, params, NEARBY_RIDE, since=feed_version.changed_at)
+
+    etag = make_etag(feed_version.tag(), "nearby", latitude, longitude, radius, limit, cursor)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        feed_stats["notModified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    body = feed_cache.get(etag)
+    if body is None:
+        try:
+            # the page is cached under this version, so a replica may only
+            # serve it once the change behind the version has reached it
+            conn = get_read_connection(since=feed_version.changed_at)
+        except PoolTimeout as e:
+            raise db_unavailable(e)
+        try:
+            page = query_nearby_rides(conn, latitude, longitude, radius, limit, cursor)
+        except HTTPException:
+            raise
+        except Exception as e:
+            log.exception("Error in get_nearby_rides")
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            conn.close()
+        body = dumps(page)
+        feed_cache.set(etag, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/match")
+def match_rides(data: RideMatchRequest, user=Depends(get_current_user)):
+    """
+    Best scheduled rides for a rider going from `origin` to `destination`
+    around `date` `time` (+/- windowMinutes), lowest score first.
+
+    Candidates are filtered by departure window, free seats and price, then
+    scored on pickup distance, drop-off distance, time difference and price
+    in one vectorized pass over the in-memory snapshot (app/matching.py).
+    Only the top matches are read from MySQL, for display.
+    """
+    depart = parse_departure(data.date, data.time)
+    if depart is None:
+        raise HTTPException(status_code=400, detail="Invalid date/time, expected YYYY-MM-DD and HH:MM")
+
+    matcher.refresh()
+    dest = data.destination
+    matches = matcher.match(
+        data.origin.lat,
+        data.origin.lng,
+        dest.lat if dest else None,
+        dest.lng if dest else None,
+        depart,
+        data.windowMinutes * 60,
+        seats=data.seats,
+        max_price=data.maxPrice,
+        max_pickup_km=data.maxPickupKm,
+        k=data.limit,
+    )
+    if not matches:
+        return {"success": True, "rides": []}
+
+    # checked out only now, so refresh() never waits on a second connection
     try:
-        cursor.execute(
-            """
-            SELECT
-                r.id,
-                r.from_addr   AS from_addr,
-                r.to_addr     AS to_addr,
-                r.date   AS ride_date,
-                r.time   AS ride_time,
-                r.seats       AS seats,
-                r.amount      AS amount,
-                r.car_name    AS car_name,
-                r.car_number  AS car_number,
-                r.car_color   AS car_color,
-                u.name        AS driver_name
+        conn = get_connection()
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    ids = [m[0] for m in matches]
+    db_cursor = conn.cursor()
+    try:
+        db_cursor.execute(
+            f"""
+            SELECT {_RIDE_CARD_COLUMNS}
             FROM rides r
             JOIN users u ON u.id = r.driver_id
-            WHERE r.status = 'scheduled'
-            ORDER BY r.date, r.time
-            """
+            WHERE r.id IN ({", ".join(["%s"] * len(ids))}) AND r.status = 'scheduled'
+            """,
+            ids,
         )
-        rows = cursor.fetchall()
-
-        rides = []
-        for row in rows:
-            # --- date formatting ---
-            # If ride_date is a date object, pretty print as "27 Oct 2025"
-            ride_date = row.get("ride_date")
-            if isinstance(ride_date, (date, datetime)):
-                date_str = ride_date.strftime("%d %b %Y")
-            else:
-                # if it's already a string, just use it
-                date_str = ride_date or ""
-
-            # --- time formatting ---
-            # If ride_time is a time object, pretty print as "10:30 AM"
-            ride_time = row.get("ride_time")
-            if isinstance(ride_time, (time, datetime)):
-                time_str = ride_time.strftime("%I:%M %p")  # 12h with AM/PM
-            else:
-                time_str = ride_time or ""
-
-            # Build object matching your Flutter UI keys
-            rides.append(
-                {
-                    "id": row["id"],
-                    "from": row["from_addr"],
-                    "to": row["to_addr"],
-                    "date": date_str,
-                    "time": time_str,
-                    "seats": row["seats"],
-                    "amount": row["amount"],
-                    "carName": row["car_name"],
-                    "carNumber": row["car_number"],
-                    "carColor": row["car_color"],
-                    "driver": row["driver_name"],
-                    # You don't have ratings/images in DB yet, so we fake them for now
-                    "rating": 4.5,
-                    "driverImage": (
-                        "https://i.pravatar.cc/150?u=" + row["driver_name"]
-                    ),
-                }
-            )
+        map_row = MATCHED_RIDE.bind(db_cursor.column_names)
+        rows = {row[0]: row for row in db_cursor.fetchall()}
+    finally:
+        db_cursor.close()
+        conn.close()
 
-        return {"success": True, "rides": rides}
-    except Exception as e:
-        print(f"🔴 Error in get_nearby_rides: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    rides = []
+    for ride_id, score, pickup_km, drop_km, time_min in matches:
+        row = rows.get(ride_id)
+        if row is None:
+            # gone since the snapshot was taken
+            matcher.ride_removed(ride_id)
+            continue
+        ride = map_row(row)
+        ride.update({
+            "distanceKm": round(pickup_km, 2),
+            "score": round(score, 3),
+            "dropDistanceKm": round(drop_km, 2),
+            "timeDiffMinutes": round(time_min, 1),
+        })
+        rides.append(ride)
+
+    return FastJSONResponse({"success": True, "rides": rides})
+
+
+def _require_place_index():
+    # built by place_index_refresher() at startup; until then, ask the client to retry
+    if not place_index.loaded:
+        raise HTTPException(status_code=503, detail="Place index is loading", headers={"Retry-After": "1"})
+
+
+@router.get("/places")
+def autocomplete_places(
+    q: str = Query(..., min_length=1, max_length=100),
+    role: str | None = Query(None, pattern="^(from|to)$", description="Only origins or only destinations"),
+    limit: int = Query(10, ge=1, le=50),
+    user=Depends(get_current_user),
+):
+    """
+    Place names of scheduled rides matching what the user has typed so
+    far, from the in-memory place index (app/places.py); no query runs.
+    """
+    _require_place_index()
+    return FastJSONResponse({"success": True, "places": place_index.autocomplete(q, limit, role)})
+
+
+@router.get("/search")
+def search_rides(
+    q: str = Query(..., min_length=1, max_length=100),
+    role: str | None = Query(None, pattern="^(from|to)$", description="Match origins or destinations only"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: str | None = Query(None, description="nextCursor from the previous page"),
+    user=Depends(get_current_user),
+):
+    """
+    Scheduled rides from or to places matching `q` ("airport", "vijay
+    nagar"), soonest departure first. The place index picks the ride ids;
+    MySQL is only asked for those rows, by primary key.
+    """
+    # (departure timestamp, ride id)
+    after = decode_cursor(cursor, 2, ((int, float), int))
+    _require_place_index()
+    found = place_index.search(q, role, limit + 1, after)
+    next_cursor = None
+    if len(found) > limit:
+        found = found[:limit]
+        next_cursor = encode_cursor(*found[-1])
+    if not found:
+        return FastJSONResponse({"success": True, "rides": [], "limit": limit, "nextCursor": None})
+
+    ids = [ride_id for _, ride_id in found]
+    try:
+        conn = get_read_connection(user["id"])
+    except PoolTimeout as e:
+        raise db_unavailable(e)
+    try:
+        db_cursor = conn.cursor()
+        try:
+            db_cursor.execute(
+                f"""
+                SELECT {_RIDE_CARD_COLUMNS}
+                FROM rides r
+                JOIN users u ON u.id = r.driver_id
+                WHERE r.id IN ({", ".join(["%s"] * len(ids))}) AND r.status = 'scheduled'
+                """,
+                ids,
+            )
+            map_row = MATCHED_RIDE.bind(db_cursor.column_names)
+            rows = {row[0]: row for row in db_cursor.fetchall()}
+        finally:
+            db_cursor.close()
     finally:
-        cursor.close()
         conn.close()
+
+    # rows missing here left 'scheduled' elsewhere; the next reload drops them
+    rides = [map_row(rows[ride_id]) for ride_id in ids if ride_id in rows]
+    return FastJSONResponse({"success": True, "rides": rides, "limit": limit, "nextCursor": next_cursor})
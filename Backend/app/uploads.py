@@ -0,0 +1,313 @@
+# app/uploads.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+from fastapi.staticfiles import StaticFiles
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.metrics import counter
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are skipped without Pillow
+    Image = None
+
+UPLOAD_DIR = os.path.abspath(os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__), "..", "uploads")))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 5 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 256 * 1024))  # bytes per disk write
+# multipart boundaries, part headers and small fields on top of the file itself
+UPLOAD_FORM_OVERHEAD = 16 * 1024
+# Square thumbnail edge lengths generated for every image
+THUMBNAIL_SIZES = tuple(int(s) for s in os.getenv("THUMBNAIL_SIZES", "64,256").split(",") if s)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 1))
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+log = logging.getLogger(__name__)
+
+UPLOADS = counter("uploads_total", "Profile image uploads by outcome", ("result",))
+
+# Sniffed from the first bytes instead of trusting the client's content type
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# <sha256 prefix>.<ext> and <sha256 prefix>_<size>.jpg never change content
+_HASHED_NAME = re.compile(r"^[0-9a-f]{32}(_\d+)?\.(jpg|png|gif|webp)$")
+
+
+def _sniff(head: bytes) -> str | None:
+    for magic, ext in _SIGNATURES:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def upload_url(name: str) -> str:
+    return f"/uploads/{name}"
+
+
+def thumbnail_name(digest: str, size: int) -> str:
+    return f"{digest}_{size}.jpg"
+
+
+def _too_large():
+    UPLOADS.inc(result="too_large")
+    return HTTPException(status_code=413, detail=f"Profile image is larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+
+
+async def multipart_file(request: Request, field: str) -> AsyncIterator[bytes]:
+    """
+    Bytes of the file part named `field`, straight off request.stream().
+
+    The body goes through python-multipart's streaming parser as it
+    arrives; nothing is spooled to a temporary file first. Reading stops
+    with 413 once the body outgrows UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD,
+    whatever Content-Length said (or didn't), and 422 if the part is missing.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    wanted = field.encode()
+    part = {"headers": {}, "name": b"", "value": b"", "target": False}
+    state = {"found": False, "done": False}
+    pending = []
+
+    def on_part_begin():
+        part.update(headers={}, name=b"", value=b"", target=False)
+
+    def on_header_field(data, start, end):
+        part["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["name"].lower()] = part["value"]
+        part["name"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["target"] = (
+            not state["found"] and disposition.get(b"name") == wanted and b"filename" in disposition
+        )
+
+    def on_part_data(data, start, end):
+        if part["target"]:
+            pending.append(bytes(data[start:end]))
+
+    def on_part_end():
+        if part["target"]:
+            state["found"] = state["done"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD:
+            raise _too_large()
+        parser.write(chunk)
+        if pending:
+            data = b"".join(pending)
+            pending.clear()
+            yield data
+        if state["done"]:
+            # the rest of the body is ignored
+            return
+    if not state["found"]:
+        raise HTTPException(status_code=422, detail=f"Missing '{field}' file")
+
+
+async def save_image(chunks: AsyncIterator[bytes]) -> tuple[str, str]:
+    """
+    Stream an uploaded image to UPLOAD_DIR as its chunks arrive, hashing
+    as it goes. The file is named after its content, so re-uploading the
+    same picture reuses the existing file. Returns (digest, file name).
+    Raises 413 past UPLOAD_MAX_BYTES and 415 for non-images.
+    """
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}")
+    sha = hashlib.sha256()
+    size = 0
+    ext = None
+    buffer = bytearray()
+    out = await asyncio.to_thread(open, tmp_path, "wb")
+
+    def check_type():
+        nonlocal ext
+        ext = _sniff(bytes(buffer[:16]))
+        if ext is None:
+            UPLOADS.inc(result="rejected_type")
+            raise HTTPException(status_code=415, detail="Profile image must be JPEG, PNG, GIF or WebP")
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                raise _too_large()
+            sha.update(chunk)
+            buffer += chunk
+            if ext is None and len(buffer) >= 16:
+                check_type()
+            # network chunks are small; write to disk in UPLOAD_CHUNK_BYTES pieces
+            if len(buffer) >= UPLOAD_CHUNK_BYTES:
+                await asyncio.to_thread(out.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            if ext is None:
+                check_type()
+            await asyncio.to_thread(out.write, bytes(buffer))
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(_remove, tmp_path)
+        raise
+    await asyncio.to_thread(out.close)
+
+    if ext is None:
+        await asyncio.to_thread(_remove, tmp_path)
+        UPLOADS.inc(result="empty")
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    digest = sha.hexdigest()[:32]
+    name = digest + ext
+    stored = await asyncio.to_thread(_store, tmp_path, os.path.join(UPLOAD_DIR, name))
+    UPLOADS.inc(result="stored" if stored else "deduplicated")
+    return digest, name
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _store(tmp_path, final_path) -> bool:
+    """Move into place unless identical content is already stored."""
+    if os.path.exists(final_path):
+        _remove(tmp_path)
+        return False
+    os.replace(tmp_path, final_path)
+    return True
+
+
+# --------------- thumbnails -----------------
+
+def _thumbnail_job(src, digest, sizes, directory):
+    """Runs in a worker process: write a square JPEG per size, skipping existing ones."""
+    made = []
+    with Image.open(src) as img:
+        img = img.convert("RGB")
+        edge = min(img.size)
+        left, top = (img.width - edge) // 2, (img.height - edge) // 2
+        square = img.crop((left, top, left + edge, top + edge))
+        for size in sizes:
+            path = os.path.join(directory, thumbnail_name(digest, size))
+            if os.path.exists(path):
+                continue
+            tmp = f"{path}.{os.getpid()}.tmp"
+            square.resize((size, size), Image.LANCZOS).save(tmp, "JPEG", quality=85, optimize=True)
+            os.replace(tmp, path)
+            made.append(size)
+    return made
+
+
+class ThumbnailPool:
+    """
+    Generates thumbnails in a ProcessPoolExecutor, off the request path.
+    Jobs for a digest already in flight are not queued twice.
+    """
+
+    def __init__(self, workers=THUMBNAIL_WORKERS, sizes=THUMBNAIL_SIZES):
+        self.workers = workers
+        self.sizes = sizes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.stats = {"queued": 0, "done": 0, "failed": 0, "skipped": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def submit(self, name: str, digest: str) -> bool:
+        """Queue thumbnails for a stored image. Returns False if they won't be made."""
+        if Image is None or not self.sizes:
+            self.stats["skipped"] += 1
+            return False
+        with self._lock:
+            if digest in self._in_flight:
+                return True
+            self._in_flight.add(digest)
+        self.stats["queued"] += 1
+        future = self._get_executor().submit(
+            _thumbnail_job, os.path.join(UPLOAD_DIR, name), digest, self.sizes, UPLOAD_DIR
+        )
+        future.add_done_callback(lambda f: self._done(digest, f))
+        return True
+
+    def _done(self, digest, future):
+        with self._lock:
+            self._in_flight.discard(digest)
+        if future.exception() is not None:
+            self.stats["failed"] += 1
+            log.warning("Thumbnail generation failed for %s: %s", digest, future.exception())
+        else:
+            self.stats["done"] += 1
+
+    def urls(self, digest: str) -> dict:
+        if Image is None:
+            return {}
+        return {str(size): upload_url(thumbnail_name(digest, size)) for size in self.sizes}
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+thumbnail_pool = ThumbnailPool()
+
+
+# --------------- serving -----------------
+
+class UploadFiles(StaticFiles):
+    """
+    /uploads with long-lived caching for content-addressed names: a new
+    picture gets a new URL, so clients may keep the old one forever.
+    Legacy names (user_<id>_<filename>) are revalidated instead.
+    """
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        name = os.path.basename(full_path)
+        response.headers["Cache-Control"] = self.IMMUTABLE if _HASHED_NAME.match(name) else "no-cache"
+        return response
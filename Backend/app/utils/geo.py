@@ -0,0 +1,51 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+# MySQL stores these as SRID 4326 geometries. We always build WKT in
+# longitude-latitude order and tell MySQL so explicitly.
+SRID = 4326
+AXIS_ORDER = "axis-order=long-lat"
+
+
+def point_wkt(lat: float, lng: float) -> str:
+    return f"POINT({lng:.7f} {lat:.7f})"
+
+
+def bbox_wkt(lat: float, lng: float, radius_km: float, pad: float = 1.1) -> str:
+    """
+    Lat/lng rectangle that fully contains the circle of `radius_km`
+    around (lat, lng), as a WKT polygon. Used as the index-friendly
+    pre-filter before the exact distance check.
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_km * pad)
+    return (
+        f"POLYGON(({min_lng:.7f} {min_lat:.7f}, {max_lng:.7f} {min_lat:.7f}, "
+        f"{max_lng:.7f} {max_lat:.7f}, {min_lng:.7f} {max_lat:.7f}, "
+        f"{min_lng:.7f} {min_lat:.7f}))"
+    )
+
+
+def bounding_box(lat: float, lng: float, radius_km: float):
+    dlat = radius_km / KM_PER_DEG_LAT
+    cos_lat = math.cos(math.radians(lat))
+    # near the poles the box degenerates; just take every longitude
+    if cos_lat < 1e-6:
+        dlng = 180.0
+    else:
+        dlng = min(180.0, radius_km / (KM_PER_DEG_LAT * cos_lat))
+    return (
+        max(-90.0, lat - dlat),
+        max(-180.0, lng - dlng),
+        min(90.0, lat + dlat),
+        min(180.0, lng + dlng),
+    )
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,54 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+from app.core.serialization import dumps
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset cursor for the last row of a page."""
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, size: int, types=None):
+    """
+    Inverse of encode_cursor. Returns None when no cursor is given.
+    `types` gives the accepted type (or tuple of types) of each value;
+    a cursor holding anything else is a 400, like a malformed one.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if types is not None:
+        for value, expected in zip(values, types):
+            # JSON true/false would pass as int
+            if isinstance(value, bool) or not isinstance(value, expected):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def stream_json_list(key: str, rows, extra: dict | None = None):
+    """
+    Yield a `{"success": true, <key>: [...]}` document piece by piece,
+    so rows can be sent as they come off a server-side cursor.
+    Rows must already be plain payload dicts (see RowMapper).
+    """
+    head = {"success": True, **(extra or {})}
+    yield dumps(head)[:-1] + f',"{key}":['.encode()
+    first = True
+    for row in rows:
+        chunk = dumps(row)
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]}"
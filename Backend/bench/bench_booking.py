@@ -0,0 +1,158 @@
+"""
+Load test for seat booking on a single popular ride.
+
+Creates a ride with --seats seats and --riders riders, then has every
+rider try to book one seat at the same time from --concurrency threads.
+A share of riders retry their request with the same idempotency key, as
+a flaky mobile connection would. Run from Backend/ against a scratch
+database (DB_POOL_SIZE should be >= --concurrency):
+
+    DB_NAME=ridepool_bench DB_POOL_SIZE=64 python -m bench.bench_booking --riders 500 --seats 40
+
+Reports throughput, latency percentiles and oversells (must be 0):
+seats booked beyond capacity, negative seat counts, or riders holding
+more than one booking.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app.bookings import book_ride
+from app.database import get_connection
+from app.utils.geo import point_wkt
+
+EMAIL_DOMAIN = "booking-bench.ridematch.local"
+
+
+def setup(riders, seats):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        ids = []
+        for i in range(riders + 1):
+            cursor.execute(
+                "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
+                (f"bench {i}", f"user{i}-{time.time_ns()}@{EMAIL_DOMAIN}", "x"),
+            )
+            ids.append(cursor.lastrowid)
+        cursor.execute(
+            "INSERT INTO rides (driver_id, from_addr, to_addr, seats, amount, status, date, time, pickup_point) "
+            "VALUES (%s, 'bench', 'bench', %s, '100', 'scheduled', CURDATE(), '09:00:00', "
+            "ST_GeomFromText(%s, 4326, 'axis-order=long-lat'))",
+            (ids[0], seats, point_wkt(22.72, 75.86)),
+        )
+        ride_id = cursor.lastrowid
+        conn.commit()
+        return ride_id, ids[1:]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def verify(ride_id, seats):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT seats FROM rides WHERE id = %s", (ride_id,))
+        seats_left = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COALESCE(SUM(seats), 0), COUNT(*), COUNT(DISTINCT rider_id) FROM bookings "
+            "WHERE ride_id = %s AND status IN ('held', 'confirmed')",
+            (ride_id,),
+        )
+        booked, bookings, riders = cursor.fetchone()
+        return {
+            "seatsLeft": seats_left,
+            "seatsBooked": int(booked),
+            "oversold": max(0, int(booked) - seats) + max(0, -seats_left),
+            "duplicateBookings": bookings - riders,
+            "consistent": seats_left + int(booked) == seats,
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def cleanup():
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{EMAIL_DOMAIN}",))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--riders", type=int, default=500)
+    parser.add_argument("--seats", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--retry-share", type=float, default=0.2)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    ride_id, riders = setup(args.riders, args.seats)
+    samples, outcomes = [], {"booked": 0, "replayed": 0, "soldOut": 0, "errors": 0}
+    lock = threading.Lock()
+    go = threading.Event()
+
+    def attempt(rider_id, key):
+        started = time.perf_counter()
+        try:
+            result = book_ride(ride_id, rider_id, 1, False, key)
+            outcome = "replayed" if result["replayed"] else "booked"
+        except HTTPException as e:
+            outcome = "soldOut" if e.status_code == 409 else "errors"
+        except Exception:
+            outcome = "errors"
+        with lock:
+            samples.append((time.perf_counter() - started) * 1000)
+            outcomes[outcome] += 1
+
+    def rider(rider_id):
+        go.wait()
+        key = uuid.uuid4().hex
+        attempt(rider_id, key)
+        if random.random() < args.retry_share:
+            attempt(rider_id, key)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+            futures = [ex.submit(rider, rider_id) for rider_id in riders]
+            started = time.perf_counter()
+            go.set()
+            for f in futures:
+                f.result()
+        elapsed = time.perf_counter() - started
+
+        samples.sort()
+        report = {
+            "benchmark": "booking",
+            "riders": args.riders,
+            "seats": args.seats,
+            "concurrency": args.concurrency,
+            "requests": len(samples),
+            "requestsPerSec": round(len(samples) / elapsed, 1),
+            "p50Ms": round(statistics.median(samples), 2),
+            "p99Ms": round(samples[int(len(samples) * 0.99) - 1], 2),
+            "outcomes": outcomes,
+        }
+        report.update(verify(ride_id, args.seats))
+    finally:
+        if not args.keep:
+            cleanup()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
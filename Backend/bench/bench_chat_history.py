@@ -0,0 +1,121 @@
+"""
+Inbox and thread latency for a user with a large chat history.
+
+Creates one benchmark user and --peers peers, writes --messages messages
+between them through the same batched writer the socket server uses
+(so the conversation summaries are maintained), then times
+/api/chat/conversations and /api/chat/history/{peer_id} (first page and
+a page deep into the thread). Run from Backend/ against a scratch
+database:
+
+    DB_NAME=ridepool_bench python -m bench.bench_chat_history --messages 100000
+
+Benchmark users (and, by cascade, their messages) are deleted at the end
+unless --keep is given.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.chat_store import insert_messages
+from app.database import get_connection
+from app.routes.chat import get_conversations, get_history
+
+EMAIL_DOMAIN = "chat-bench.ridematch.local"
+
+
+def create_users(conn, count):
+    cursor = conn.cursor()
+    try:
+        ids = []
+        for i in range(count):
+            cursor.execute(
+                "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
+                (f"bench {i}", f"user{i}-{time.time_ns()}@{EMAIL_DOMAIN}", "x"),
+            )
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        return ids
+    finally:
+        cursor.close()
+
+
+def seed_messages(me, peers, count, batch=1000):
+    written = 0
+    while written < count:
+        n = min(batch, count - written)
+        rows = []
+        for _ in range(n):
+            peer = random.choice(peers)
+            sender, receiver = (me, peer) if random.random() < 0.5 else (peer, me)
+            rows.append((str(sender), str(receiver), "benchmark message " + "x" * random.randint(5, 80)))
+        insert_messages(rows)
+        written += n
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50Ms": round(statistics.median(samples), 2),
+        "p99Ms": round(samples[max(0, int(len(samples) * 0.99) - 1)], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--peers", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    users = create_users(conn, args.peers + 1)
+    me, peers = users[0], users[1:]
+    user = {"id": me}
+    try:
+        started = time.perf_counter()
+        seed_messages(me, peers, args.messages)
+        seed_seconds = time.perf_counter() - started
+
+        busiest = peers[0]
+        first = get_history(peer_id=busiest, limit=50, cursor=None, user=user, conn=conn)
+        deep_cursor = first["nextCursor"]
+        for _ in range(5):
+            if not deep_cursor:
+                break
+            deep_cursor = get_history(peer_id=busiest, limit=50, cursor=deep_cursor, user=user, conn=conn)["nextCursor"]
+
+        report = {
+            "benchmark": "chat_history",
+            "messages": args.messages,
+            "peers": args.peers,
+            "seedMessagesPerSec": round(args.messages / seed_seconds, 1),
+            "inbox": timed(lambda: get_conversations(limit=50, cursor=None, user=user, conn=conn), args.runs),
+            "historyFirstPage": timed(
+                lambda: get_history(peer_id=busiest, limit=50, cursor=None, user=user, conn=conn), args.runs
+            ),
+            "historyDeepPage": timed(
+                lambda: get_history(peer_id=busiest, limit=50, cursor=deep_cursor, user=user, conn=conn), args.runs
+            ),
+        }
+    finally:
+        if not args.keep:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{EMAIL_DOMAIN}",))
+            conn.commit()
+            cursor.close()
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Password verification throughput: Starlette-style threadpool vs the
+process pool used by /api/auth/login.
+
+No database needed. Run from Backend/:
+
+    python -m bench.bench_login --logins 2000 --concurrency 100
+
+"Before" runs verify_password on a 40-thread pool (Starlette's default
+for sync handlers), "after" awaits verify_password_async from the
+event loop. Results are logins/s in total and per core.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.security import PWD_ROUNDS, hash_password, hash_pool, verify_password, verify_password_async
+
+PASSWORD = "correct horse battery staple"
+
+
+def bench_threadpool(stored, logins, threads=40):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        results = list(ex.map(lambda _: verify_password(PASSWORD, stored), range(logins)))
+    assert all(results)
+    return time.perf_counter() - started
+
+
+async def bench_process_pool(stored, logins, concurrency):
+    # warm the worker processes so startup isn't measured
+    await asyncio.gather(*(verify_password_async(PASSWORD, stored) for _ in range(hash_pool.workers)))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            ok, _ = await verify_password_async(PASSWORD, stored)
+            assert ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    stored = hash_password(PASSWORD)
+
+    before = bench_threadpool(stored, args.logins)
+    after = asyncio.run(bench_process_pool(stored, args.logins, args.concurrency))
+    stats = hash_pool.stats()
+    hash_pool.shutdown()
+
+    print(json.dumps({
+        "benchmark": "login",
+        "rounds": PWD_ROUNDS,
+        "cores": cores,
+        "hashWorkers": hash_pool.workers,
+        "logins": args.logins,
+        "threadpool": {
+            "loginsPerSec": round(args.logins / before, 1),
+            "loginsPerSecPerCore": round(args.logins / before / cores, 1),
+        },
+        "processPool": {
+            "loginsPerSec": round(args.logins / after, 1),
+            "loginsPerSecPerWorker": round(args.logins / after / hash_pool.workers, 1),
+            "queueTimeAvgMs": stats["queueTimeAvgMs"],
+            "hashTimeAvgMs": stats["hashTimeAvgMs"],
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Latency of the ride matching engine behind /api/rides/match.
+
+Builds a snapshot of --rides synthetic scheduled rides (no database
+needed) spread over a ~200 km square and a week of departures, then
+times MatchingEngine.match for random riders. Run from Backend/:
+
+    python -m bench.bench_match --rides 100000
+
+The target is p99 under 20 ms at 100k active rides.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.matching import MatchingEngine
+
+CENTER_LAT, CENTER_LNG = 22.7196, 75.8577
+SPREAD_DEG = 0.9
+WEEK_S = 7 * 24 * 3600
+
+
+def synthetic_rides(count, seed=1):
+    rng = np.random.default_rng(seed)
+    pickup_lat = CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    pickup_lng = CENTER_LNG + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    drop_lat = CENTER_LAT + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    drop_lng = CENTER_LNG + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    depart = rng.uniform(0, WEEK_S, count)
+    seats = rng.integers(0, 5, count)
+    amount = rng.uniform(50, 500, count)
+    return [
+        (i + 1, pickup_lat[i], pickup_lng[i], drop_lat[i], drop_lng[i], depart[i], int(seats[i]), amount[i])
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rides", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--window-minutes", type=int, default=60)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = synthetic_rides(args.rides)
+    engine = MatchingEngine(load_rows=lambda after_id: rows if after_id == 0 else [])
+    started = time.perf_counter()
+    engine.reload()
+    load_ms = (time.perf_counter() - started) * 1000
+
+    samples, found = [], 0
+    for _ in range(args.queries):
+        started = time.perf_counter()
+        result = engine.match(
+            CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+            CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+            CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+            CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+            random.uniform(0, WEEK_S),
+            args.window_minutes * 60,
+            seats=random.randint(1, 3),
+            k=args.k,
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+        found += len(result)
+
+    # incremental updates, as create_ride / bookings would do
+    started = time.perf_counter()
+    for i in range(1000):
+        engine.ride_created(args.rides + i + 1, CENTER_LAT, CENTER_LNG, None, None, 0.0, 3, 100.0)
+        engine.ride_removed(random.randint(1, args.rides))
+    update_us = (time.perf_counter() - started) * 1e6 / 2000
+
+    samples.sort()
+    print(json.dumps({
+        "benchmark": "match",
+        "rides": args.rides,
+        "queries": args.queries,
+        "snapshotLoadMs": round(load_ms, 1),
+        "p50Ms": round(statistics.median(samples), 3),
+        "p95Ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        "p99Ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+        "avgMatches": round(found / args.queries, 2),
+        "updateUs": round(update_us, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
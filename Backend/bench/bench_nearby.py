@@ -0,0 +1,136 @@
+"""
+Latency of /api/rides/nearby as the rides table grows.
+
+Grows the rides table in steps (default 10k -> 100k -> 1M rows) with
+rides scattered over a ~200 km square, and after each step times the
+nearby query (bypassing the feed cache) against random centers. Run from Backend/ against a
+scratch database:
+
+    DB_NAME=ridepool_bench python -m bench.bench_nearby --sizes 10000,100000,1000000
+
+Only rows belonging to the benchmark driver are touched, and they are
+deleted at the end unless --keep is given.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.database import get_connection
+from app.routes.rides import query_nearby_rides
+from app.utils.geo import point_wkt
+
+CENTER_LAT, CENTER_LNG = 22.7196, 75.8577  # Indore
+SPREAD_DEG = 0.9
+BENCH_EMAIL = "bench-driver@ridematch.local"
+
+
+def bench_driver(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM users WHERE email = %s", (BENCH_EMAIL,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute(
+            "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
+            ("bench driver", BENCH_EMAIL, "x"),
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def seed_rides(conn, driver_id, count, batch=5000):
+    cursor = conn.cursor()
+    try:
+        done = 0
+        while done < count:
+            n = min(batch, count - done)
+            values, params = [], []
+            for _ in range(n):
+                lat = CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+                lng = CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+                values.append(
+                    "(%s,'bench from','bench to',3,'150','scheduled','Honda City','MP09AB1234','White',"
+                    "DATE_ADD(CURDATE(), INTERVAL %s DAY),'09:00:00',"
+                    "ST_GeomFromText(%s, 4326, 'axis-order=long-lat'))"
+                )
+                params.extend([driver_id, random.randint(0, 30), point_wkt(lat, lng)])
+            cursor.execute(
+                "INSERT INTO rides (driver_id, from_addr, to_addr, seats, amount, status, "
+                "car_name, car_number, car_color, date, time, pickup_point) VALUES "
+                + ",".join(values),
+                params,
+            )
+            conn.commit()
+            done += n
+    finally:
+        cursor.close()
+
+
+def time_queries(conn, queries, radius):
+    samples = []
+    results = 0
+    for _ in range(queries):
+        lat = CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+        lng = CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+        started = time.perf_counter()
+        resp = query_nearby_rides(conn, lat, lng, radius)
+        samples.append((time.perf_counter() - started) * 1000)
+        results += len(resp["rides"])
+    samples.sort()
+    return {
+        "p50Ms": round(statistics.median(samples), 2),
+        "p95Ms": round(samples[int(len(samples) * 0.95) - 1], 2),
+        "p99Ms": round(samples[int(len(samples) * 0.99) - 1], 2),
+        "avgResults": round(results / queries, 1),
+    }
+
+
+def cleanup(conn, driver_id):
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute("DELETE FROM rides WHERE driver_id = %s LIMIT 50000", (driver_id,))
+            conn.commit()
+            if cursor.rowcount == 0:
+                break
+        cursor.execute("DELETE FROM users WHERE id = %s", (driver_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--radius", type=float, default=5.0, help="km")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    driver_id = bench_driver(conn)
+    report = []
+    seeded = 0
+    try:
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            seed_rides(conn, driver_id, size - seeded)
+            seeded = size
+            result = {"rides": size, "radiusKm": args.radius, "queries": args.queries}
+            result.update(time_queries(conn, args.queries, args.radius))
+            report.append(result)
+            print(json.dumps(result))
+    finally:
+        if not args.keep:
+            cleanup(conn, driver_id)
+        conn.close()
+
+    print(json.dumps({"benchmark": "nearby", "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
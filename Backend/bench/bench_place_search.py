@@ -0,0 +1,193 @@
+"""
+Place search: the in-memory place index behind /api/rides/search and
+/api/rides/places against a LIKE '%q%' scan of rides.
+
+Generates --rides scheduled rides between synthetic place names (a few
+thousand localities, landmarks and "<locality>, <landmark>" variants),
+builds the PlaceIndex from them and times autocomplete and a first page
+of search for random 2-6 letter prefixes. No database is needed for
+that part. Run from Backend/:
+
+    python -m bench.bench_place_search --rides 1000000
+
+With --db the same rides are inserted into a scratch database for the
+LIKE baseline (SELECT ... WHERE from_addr LIKE %q% OR to_addr LIKE %q%
+ORDER BY date, time LIMIT 20), and the index is loaded from MySQL the
+way the API loads it:
+
+    DB_NAME=ridepool_bench python -m bench.bench_place_search --rides 1000000 --db
+
+Only rows of the benchmark driver are touched; they are deleted at the
+end unless --keep is given.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from app.matching import departure_ts
+from app.places import PlaceIndex, _load_scheduled_places
+from app.utils.geo import point_wkt
+
+CENTER_LAT, CENTER_LNG = 22.7196, 75.8577  # Indore
+SPREAD_DEG = 0.9
+
+LOCALITIES = (
+    "Vijay Nagar", "Palasia", "Rajwada", "Bhawarkuan", "Malharganj", "Sudama Nagar", "Rau", "Mhow",
+    "Nipania", "Bengali Square", "Khajrana", "Pipliyahana", "Annapurna", "Scheme 54", "Scheme 78",
+    "Silicon City", "Dewas Naka", "Musakhedi", "Tilak Nagar", "Sapna Sangeeta", "Navlakha", "Aerodrome",
+)
+LANDMARKS = (
+    "Airport", "Railway Station", "Bus Stand", "SVVV", "IIT Indore", "IIM Indore", "DAVV", "Treasure Island",
+    "C21 Mall", "Phoenix Citadel", "MY Hospital", "Bombay Hospital", "Collectorate", "High Court",
+)
+PREFIXES = ("vi", "vij", "pal", "air", "airp", "rail", "sta", "bus", "svv", "iit", "ii", "dav", "mal",
+            "sch", "sil", "nag", "sq", "hos", "bomb", "rau", "mh", "nip", "tre", "c2", "pho", "coll")
+
+
+def place_names(extra):
+    names = list(LOCALITIES) + list(LANDMARKS)
+    names += [f"{landmark}, {locality}" for locality in LOCALITIES for landmark in LANDMARKS]
+    names += [f"Sector {i}, {random.choice(LOCALITIES)}" for i in range(extra)]
+    return names
+
+
+def synthetic_rides(count, names, seed=1):
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(count):
+        ride_date = today + timedelta(days=rng.randint(0, 30))
+        ride_time = timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+        rows.append((i + 1, rng.choice(names), rng.choice(names), ride_date, ride_time))
+    return rows
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50Ms": round(statistics.median(samples), 3),
+        "p95Ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        "p99Ms": round(samples[int(len(samples) * 0.99) - 1], 3),
+    }
+
+
+def timed(fn, queries):
+    samples, results = [], 0
+    for q in queries:
+        started = time.perf_counter()
+        results += len(fn(q))
+        samples.append((time.perf_counter() - started) * 1000)
+    return {**percentiles(samples), "avgResults": round(results / len(queries), 1)}
+
+
+def seed_rides(conn, driver_id, rows, batch=5000):
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            values, params = [], []
+            for _, from_addr, to_addr, ride_date, ride_time in chunk:
+                values.append(
+                    "(%s,%s,%s,3,'150','scheduled','Honda City','MP09AB1234','White',%s,%s,"
+                    "ST_GeomFromText(%s, 4326, 'axis-order=long-lat'))"
+                )
+                lat = CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+                lng = CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG)
+                params.extend([driver_id, from_addr, to_addr, ride_date, ride_time, point_wkt(lat, lng)])
+            cursor.execute(
+                "INSERT INTO rides (driver_id, from_addr, to_addr, seats, amount, status, "
+                "car_name, car_number, car_color, date, time, pickup_point) VALUES " + ",".join(values),
+                params,
+            )
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def like_search(conn, limit):
+    def run(q):
+        cursor = conn.cursor()
+        try:
+            pattern = f"%{q}%"
+            cursor.execute(
+                """
+                SELECT id FROM rides
+                WHERE status = 'scheduled' AND (from_addr LIKE %s OR to_addr LIKE %s)
+                ORDER BY date, time, id
+                LIMIT %s
+                """,
+                (pattern, pattern, limit),
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rides", type=int, default=1000000)
+    parser.add_argument("--places", type=int, default=3000, help="extra 'Sector N, <locality>' names")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", action="store_true", help="also time LIKE '%%q%%' in MySQL")
+    parser.add_argument("--like-queries", type=int, default=20, help="LIKE is slow; fewer samples")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    random.seed(1)
+    names = place_names(args.places)
+    rows = synthetic_rides(args.rides, names)
+    queries = [random.choice(PREFIXES) for _ in range(args.queries)]
+    result = {"benchmark": "place_search", "rides": args.rides, "places": len(set(names)), "limit": args.limit}
+
+    conn = driver_id = None
+    if args.db:
+        from app.database import get_connection
+        from bench.bench_nearby import bench_driver, cleanup
+
+        conn = get_connection()
+        driver_id = bench_driver(conn)
+        started = time.perf_counter()
+        seed_rides(conn, driver_id, rows)
+        result["seedSeconds"] = round(time.perf_counter() - started, 1)
+        load_rows = _load_scheduled_places
+    else:
+        index_rows = [(r[0], r[1], r[2], departure_ts(r[3], r[4])) for r in rows]
+        load_rows = lambda after_id: index_rows if after_id == 0 else []  # noqa: E731
+
+    try:
+        index = PlaceIndex(load_rows=load_rows)
+        started = time.perf_counter()
+        index.reload()
+        result["indexBuildSeconds"] = round(time.perf_counter() - started, 2)
+        result["index"] = index.stats()
+
+        result["autocomplete"] = timed(lambda q: index.autocomplete(q, 10), queries)
+        result["search"] = timed(lambda q: index.search(q, None, args.limit), queries)
+
+        # incremental hooks, as create_ride and the lifecycle worker call them
+        now = departure_ts(datetime.now().date(), timedelta(hours=12))
+        started = time.perf_counter()
+        for i in range(1000):
+            index.ride_created(args.rides + i + 1, random.choice(names), random.choice(names), now)
+            index.ride_removed(random.randint(1, args.rides))
+        result["updateUs"] = round((time.perf_counter() - started) * 1e6 / 2000, 2)
+
+        if conn is not None:
+            result["like"] = timed(like_search(conn, args.limit), queries[:args.like_queries])
+            result["speedupP50"] = round(result["like"]["p50Ms"] / max(result["search"]["p50Ms"], 1e-3), 1)
+    finally:
+        if conn is not None:
+            if not args.keep:
+                cleanup(conn, driver_id)
+            conn.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
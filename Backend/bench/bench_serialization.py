@@ -0,0 +1,111 @@
+"""
+Cost of turning ride rows into a JSON response body, without a database.
+
+"Before" is the previous path: dictionary cursor rows, a per-row format
+function calling strftime twice, then FastAPI's jsonable_encoder and
+json.dumps. "After" is the current one: tuple rows through the compiled
+NEARBY_RIDE mapper and orjson. Run from Backend/:
+
+    python -m bench.bench_serialization --rides 10000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import dumps, orjson
+from app.routes.rides import NEARBY_RIDE
+
+COLUMNS = (
+    "id", "from_addr", "to_addr", "ride_date", "ride_time", "seats", "amount", "car_name", "car_number",
+    "car_color", "driver_name", "driver_image", "pickup_lat", "pickup_lng", "distance_km",
+)
+
+
+def make_rows(count):
+    today = date.today()
+    rows = []
+    for i in range(count):
+        driver = f"driver {random.randint(1, 500)}"
+        rows.append((
+            i + 1, "SVVV", "Malharganj", today + timedelta(days=random.randint(0, 30)),
+            timedelta(minutes=random.randrange(0, 24 * 60, 5)), random.randint(1, 4), str(random.randint(50, 500)),
+            "Honda City", "MP09AB1234", "White", driver, "https://i.pravatar.cc/150?u=" + driver,
+            22.7 + random.random(), 75.8 + random.random(), random.random() * 10,
+        ))
+    return rows
+
+
+def legacy_format(row):
+    ride_date = row.get("ride_date")
+    date_str = ride_date.strftime("%d %b %Y") if isinstance(ride_date, (date, datetime)) else ride_date or ""
+    ride_time = row.get("ride_time")
+    time_str = (datetime.min + ride_time).strftime("%I:%M %p") if isinstance(ride_time, timedelta) else ride_time or ""
+    return {
+        "id": row["id"],
+        "from": row["from_addr"],
+        "to": row["to_addr"],
+        "date": date_str,
+        "time": time_str,
+        "seats": row["seats"],
+        "amount": row["amount"],
+        "carName": row["car_name"],
+        "carNumber": row["car_number"],
+        "carColor": row["car_color"],
+        "driver": row["driver_name"],
+        "pickupLat": row["pickup_lat"],
+        "pickupLng": row["pickup_lng"],
+        "distanceKm": round(row["distance_km"], 2),
+        "rating": 4.5,
+        "driverImage": row["driver_image"],
+    }
+
+
+def before(dict_rows):
+    rides = [legacy_format(row) for row in dict_rows]
+    return json.dumps(jsonable_encoder({"success": True, "rides": rides})).encode()
+
+
+def after(rows):
+    map_row = NEARBY_RIDE.bind(COLUMNS)
+    return dumps({"success": True, "rides": [map_row(row) for row in rows]})
+
+
+def timed(fn, arg, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rides", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rides)
+    # the dictionary cursor hands out one dict per row; built outside the timing
+    dict_rows = [dict(zip(COLUMNS, row)) for row in rows]
+    assert json.loads(before(dict_rows)) == json.loads(after(rows))
+
+    before_ms = timed(before, dict_rows, args.runs)
+    after_ms = timed(after, rows, args.runs)
+    print(json.dumps({
+        "benchmark": "serialization",
+        "rides": args.rides,
+        "encoder": "orjson" if orjson is not None else "json",
+        "beforeMs": before_ms,
+        "afterMs": after_ms,
+        "speedup": round(before_ms / after_ms, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
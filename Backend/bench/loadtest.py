@@ -0,0 +1,472 @@
+"""
+End-to-end load test for the HTTP API and the Socket.IO chat.
+
+Three steps, all run from Backend/ against a scratch database:
+
+    # 1. create the schema from ridepool.sql and add synthetic data
+    DB_NAME=ridepool_bench python -m bench.loadtest seed --schema ../ridepool.sql \\
+        --users 2000 --rides 100000 --messages 200000
+
+    # 2. start the server on the same database (any worker count)
+    DB_NAME=ridepool_bench uvicorn app.main:app --port 5000 --workers 4
+
+    # 3. drive it and keep the report
+    DB_NAME=ridepool_bench python -m bench.loadtest run --base-url http://127.0.0.1:5000 \\
+        --concurrency 50 --duration 20 --out loadtest-$(git rev-parse --short HEAD).json
+
+Scenarios run one after another, each with --concurrency clients for
+--duration seconds:
+
+    login          POST /api/auth/login
+    me             GET  /api/auth/me
+    rides_create   POST /api/rides/
+    nearby         GET  /api/rides/nearby (clients revalidate with If-None-Match)
+    socket_register   Socket.IO 'register'
+    socket_send       Socket.IO 'sendMessage' (acked once the message is stored)
+
+For each one the report has req/s, p50/p95/p99 latency, status counts and
+DB queries per request. The query count is the change in MySQL's global
+`Questions` counter, so run it against a database nothing else is using.
+
+--schema drops and recreates every table in the dump. `clean` deletes only
+the synthetic users and everything that belongs to them.
+
+Needs httpx and aiohttp besides requirements.txt:  pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from app.chat_store import insert_messages
+from app.core.security import hash_password
+from app.database import get_connection
+from app.utils.geo import point_wkt
+
+EMAIL_DOMAIN = "loadtest.example.com"
+PASSWORD = "loadtest-password"
+CENTER_LAT, CENTER_LNG = 22.7196, 75.8577  # Indore
+SPREAD_DEG = 0.9
+
+SCENARIOS = ("login", "me", "rides_create", "nearby", "socket_register", "socket_send")
+
+
+# ---- seeding ----
+
+def load_schema(conn, path):
+    """Run a mysqldump file statement by statement (it has no procedures)."""
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if not line.startswith("--")]
+    cursor = conn.cursor()
+    try:
+        for statement in "".join(lines).split(";\n"):
+            if statement.strip():
+                cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def seed_users(conn, count, batch=1000):
+    # every synthetic user shares one hash, so seeding costs one hash
+    stored = hash_password(PASSWORD)
+    cursor = conn.cursor()
+    try:
+        for start in range(0, count, batch):
+            n = min(batch, count - start)
+            rows = [(f"load user {i}", f"user{i}@{EMAIL_DOMAIN}", f"9{i:09d}", stored) for i in range(start, start + n)]
+            cursor.executemany(
+                "INSERT IGNORE INTO users (name, email, phone, password_hash) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def load_users(conn, limit=None):
+    """(id, email) of the synthetic users, lowest id first."""
+    cursor = conn.cursor()
+    try:
+        sql = "SELECT id, email FROM users WHERE email LIKE %s ORDER BY id"
+        params = [f"%@{EMAIL_DOMAIN}"]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def random_point():
+    return (
+        CENTER_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+        CENTER_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+    )
+
+
+def seed_rides(conn, driver_ids, count, batch=5000):
+    cursor = conn.cursor()
+    try:
+        done = 0
+        while done < count:
+            n = min(batch, count - done)
+            values, params = [], []
+            for _ in range(n):
+                pickup, drop = random_point(), random_point()
+                values.append(
+                    "(%s,'load from','load to',%s,%s,'scheduled','Honda City','MP09AB1234','White',"
+                    "DATE_ADD(CURDATE(), INTERVAL %s DAY),SEC_TO_TIME(%s),"
+                    "ST_GeomFromText(%s, 4326, 'axis-order=long-lat'),"
+                    "ST_GeomFromText(%s, 4326, 'axis-order=long-lat'))"
+                )
+                params.extend([
+                    random.choice(driver_ids),
+                    random.randint(1, 4),
+                    str(random.randint(50, 500)),
+                    random.randint(0, 30),
+                    random.randrange(0, 86400, 300),
+                    point_wkt(*pickup),
+                    point_wkt(*drop),
+                ])
+            cursor.execute(
+                "INSERT INTO rides (driver_id, from_addr, to_addr, seats, amount, status, "
+                "car_name, car_number, car_color, date, time, pickup_point, drop_point) VALUES "
+                + ",".join(values),
+                params,
+            )
+            conn.commit()
+            done += n
+    finally:
+        cursor.close()
+
+
+def seed_messages(user_ids, count, batch=1000):
+    # through the same writer path the socket server uses, so the
+    # conversation summaries exist too
+    written = 0
+    while written < count:
+        n = min(batch, count - written)
+        rows = []
+        for _ in range(n):
+            sender, receiver = random.sample(user_ids, 2)
+            rows.append((str(sender), str(receiver), "load message " + "x" * random.randint(5, 80)))
+        insert_messages(rows)
+        written += n
+
+
+def seed(args):
+    conn = get_connection()
+    try:
+        if args.schema:
+            load_schema(conn, args.schema)
+        started = time.perf_counter()
+        seed_users(conn, args.users)
+        user_ids = [row[0] for row in load_users(conn)]
+        seed_rides(conn, user_ids, args.rides)
+        seed_messages(user_ids, args.messages)
+        report = {
+            "users": len(user_ids),
+            "ridesAdded": args.rides,
+            "messagesAdded": args.messages,
+            "seconds": round(time.perf_counter() - started, 1),
+        }
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2))
+
+
+def clean(args):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        pattern = f"%@{EMAIL_DOMAIN}"
+        # rides only lose their driver when a user is deleted, so remove them first
+        while True:
+            cursor.execute(
+                "DELETE FROM rides WHERE driver_id IN (SELECT id FROM users WHERE email LIKE %s) LIMIT 50000",
+                (pattern,),
+            )
+            conn.commit()
+            if cursor.rowcount == 0:
+                break
+        cursor.execute("DELETE FROM users WHERE email LIKE %s", (pattern,))
+        conn.commit()
+        print(json.dumps({"usersDeleted": cursor.rowcount}))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ---- measuring ----
+
+def db_questions(conn) -> int:
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        return int(cursor.fetchone()[1])
+    finally:
+        cursor.close()
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    rank = max(0, min(len(sorted_samples) - 1, int(round(pct / 100 * len(sorted_samples))) - 1))
+    return round(sorted_samples[rank], 2)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = []
+        self.errors = 0
+        self.statuses = {}
+
+    async def time(self, op):
+        started = time.perf_counter()
+        try:
+            status = await op()
+        except Exception:
+            self.errors += 1
+            status = "error"
+        self.samples.append((time.perf_counter() - started) * 1000)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+
+async def run_scenario(conn, make_op, clients, duration):
+    """Run one op per client in a loop for `duration` seconds."""
+    recorder = Recorder()
+    deadline = None
+
+    async def worker(op):
+        while time.perf_counter() < deadline:
+            await recorder.time(op)
+
+    ops = [make_op(client) for client in clients]
+    before = db_questions(conn)
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(worker(op) for op in ops))
+    elapsed = time.perf_counter() - started
+    # -1 for the SHOW STATUS that opened the window
+    queries = db_questions(conn) - before - 1
+
+    samples = sorted(recorder.samples)
+    total = len(samples)
+    return {
+        "requests": total,
+        "errors": recorder.errors,
+        "statusCodes": recorder.statuses,
+        "reqPerSec": round(total / elapsed, 1),
+        "p50Ms": percentile(samples, 50),
+        "p95Ms": percentile(samples, 95),
+        "p99Ms": percentile(samples, 99),
+        "dbQueriesPerRequest": round(queries / total, 2) if total else None,
+    }
+
+
+# ---- scenarios ----
+
+def login_op(http, client):
+    async def op():
+        resp = await http.post("/api/auth/login", json={"email": client["email"], "password": PASSWORD})
+        return resp.status_code
+    return op
+
+
+def me_op(http, client):
+    headers = {"Authorization": f"Bearer {client['token']}"}
+
+    async def op():
+        resp = await http.get("/api/auth/me", headers=headers)
+        return resp.status_code
+    return op
+
+
+def rides_create_op(http, client):
+    headers = {"Authorization": f"Bearer {client['token']}"}
+
+    async def op():
+        lat, lng = random_point()
+        resp = await http.post("/api/rides/", headers=headers, json={
+            "from": "load from",
+            "to": "load to",
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "time": "09:30",
+            "availableSeats": 3,
+            "amount": 150,
+            "carDetails": {"name": "Honda City", "number": "MP09AB1234", "color": "White"},
+            "location": {"type": "Point", "coordinates": [lng, lat]},
+        })
+        return resp.status_code
+    return op
+
+
+def nearby_op(http, client, centers):
+    headers = {"Authorization": f"Bearer {client['token']}"}
+    etags = {}  # like a polling app: remember the ETag of every query
+
+    async def op():
+        lat, lng = random.choice(centers)
+        params = {"latitude": lat, "longitude": lng, "radius": 10}
+        key = (lat, lng)
+        request_headers = dict(headers)
+        if key in etags:
+            request_headers["If-None-Match"] = etags[key]
+        resp = await http.get("/api/rides/nearby", params=params, headers=request_headers)
+        if "etag" in resp.headers:
+            etags[key] = resp.headers["etag"]
+        return resp.status_code
+    return op
+
+
+async def connect_sockets(base_url, clients):
+    import socketio
+
+    async def connect(client):
+        sock = socketio.AsyncClient(reconnection=False)
+
+        @sock.on("missedMessages")
+        async def missed(batch):
+            return True  # ack so catch-up moves on
+
+        # sockets authenticate with the login token; 'register' only starts catch-up
+        await sock.connect(base_url, auth={"token": client["token"]}, transports=["websocket"])
+        client["socket"] = sock
+
+    await asyncio.gather(*(connect(client) for client in clients))
+
+
+def socket_register_op(client):
+    async def op():
+        await client["socket"].call("register", client["id"], timeout=30)
+        return "ack"
+    return op
+
+
+def socket_send_op(client, user_ids):
+    async def op():
+        receiver = random.choice(user_ids)
+        ack = await client["socket"].call("sendMessage", {
+            "senderId": client["id"],
+            "receiverId": receiver,
+            "message": "load test message",
+        }, timeout=30)
+        return "ack" if ack and ack.get("success") else "failed"
+    return op
+
+
+async def login_clients(http, users):
+    async def one(user_id, email):
+        resp = await http.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+        resp.raise_for_status()
+        return {"id": user_id, "email": email, "token": resp.json()["token"]}
+
+    return await asyncio.gather(*(one(user_id, email) for user_id, email in users))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drive(args):
+    import httpx
+
+    conn = get_connection()
+    try:
+        users = load_users(conn)
+        if len(users) < 2:
+            raise SystemExit("No synthetic users; run `python -m bench.loadtest seed` first")
+        user_ids = [row[0] for row in users]
+        random.shuffle(users)
+        centers = [random_point() for _ in range(args.nearby_centers)]
+        scenarios = [s for s in args.scenarios.split(",") if s]
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as http:
+            clients = await login_clients(http, users[: args.concurrency])
+            results = {}
+            for name in scenarios:
+                if name == "login":
+                    make_op = lambda c: login_op(http, c)
+                elif name == "me":
+                    make_op = lambda c: me_op(http, c)
+                elif name == "rides_create":
+                    make_op = lambda c: rides_create_op(http, c)
+                elif name == "nearby":
+                    make_op = lambda c: nearby_op(http, c, centers)
+                elif name == "socket_register":
+                    await connect_sockets(args.base_url, [c for c in clients if "socket" not in c])
+                    make_op = socket_register_op
+                elif name == "socket_send":
+                    await connect_sockets(args.base_url, [c for c in clients if "socket" not in c])
+                    make_op = lambda c: socket_send_op(c, user_ids)
+                else:
+                    raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+                results[name] = await run_scenario(conn, make_op, clients, args.duration)
+
+            for client in clients:
+                if "socket" in client:
+                    await client["socket"].disconnect()
+    finally:
+        conn.close()
+
+    return {
+        "benchmark": "loadtest",
+        "commit": git_commit(),
+        "startedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "baseUrl": args.base_url,
+        "concurrency": args.concurrency,
+        "durationSeconds": args.duration,
+        "users": len(users),
+        "scenarios": results,
+    }
+
+
+def run(args):
+    report = asyncio.run(drive(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("seed", help="add synthetic users, rides and messages")
+    p.add_argument("--schema", help="mysqldump file to load first (drops existing tables)")
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--rides", type=int, default=50000)
+    p.add_argument("--messages", type=int, default=100000)
+    p.set_defaults(func=seed)
+
+    p = sub.add_parser("run", help="drive a running server and print the report")
+    p.add_argument("--base-url", default="http://127.0.0.1:5000")
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p.add_argument("--nearby-centers", type=int, default=200, help="distinct places clients search around")
+    p.add_argument("--out", help="also write the report to this file")
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("clean", help="delete the synthetic users and their rides and messages")
+    p.set_defaults(func=clean)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
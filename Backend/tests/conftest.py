@@ -0,0 +1,81 @@
+"""
+Shared helpers. Nothing here needs MySQL or Redis: stores are faked at
+the seams the app exposes for it (connect=, insert_batch=, load_rows=)
+and Redis is fakeredis.
+
+Run from Backend/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import asyncio
+
+import fakeredis
+import pytest
+import uvicorn
+from fakeredis.aioredis import FakeAsyncRedisConnection
+
+# fakeredis instances on one FakeServer share their data and pub/sub, like
+# several workers talking to one Redis
+FAKE_REDIS_URL = "redis://fakeredis"
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def redis_options(server):
+    """Redis.from_url() keyword arguments that connect to `server` instead."""
+    return {"connection_class": FakeAsyncRedisConnection, "server": server}
+
+
+class FakeClock:
+    """Stands in for the `time` module so tests can move time forward."""
+
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class LiveServer:
+    """An ASGI app served by uvicorn on a free local port, inside the running loop."""
+
+    def __init__(self, app):
+        self._server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        )
+        self._task = None
+        self.url = None
+
+    async def __aenter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.should_exit = True
+        await self._task
+
+
+async def wait_for(predicate, timeout=5.0):
+    """Poll an (async or plain) predicate until it is true or `timeout` passes."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        result = predicate()
+        if asyncio.iscoroutine(result):
+            result = await result
+        if result:
+            return result
+        if loop.time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
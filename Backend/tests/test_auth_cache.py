@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app.core import cache
+from app.core.cache import TTLCache
+from app.core.security import ALGORITHM, SECRET_KEY
+from app.routes import auth
+from conftest import FAKE_REDIS_URL, FakeClock, wait_for
+
+
+def test_invalidate_user_publishes_the_change(redis_server, monkeypatch):
+    monkeypatch.setattr(auth, "CHAT_REDIS_URL", FAKE_REDIS_URL)
+    monkeypatch.setattr(auth, "_publisher", fakeredis.FakeRedis(server=redis_server))
+    pubsub = fakeredis.FakeRedis(server=redis_server).pubsub()
+    pubsub.subscribe(auth.USER_CHANGED_CHANNEL)
+    assert pubsub.get_message(timeout=1)["type"] == "subscribe"
+    auth.user_cache.set(7, {"id": 7})
+    try:
+        auth.invalidate_user(7)
+        assert auth.user_cache.get(7) is None
+        assert pubsub.get_message(timeout=1)["data"] == b"7"
+    finally:
+        auth.user_cache.clear()
+
+
+def test_user_change_listener_drops_rows_changed_elsewhere(redis_server):
+    other_worker = fakeredis.aioredis.FakeRedis(server=redis_server)
+    auth.user_cache.set(7, {"id": 7, "profile_url": "/uploads/old.jpg"})
+    auth.user_cache.set(8, {"id": 8, "profile_url": None})
+
+    async def subscribed():
+        return dict(await other_worker.pubsub_numsub(auth.USER_CHANGED_CHANNEL))[
+            auth.USER_CHANGED_CHANNEL.encode()
+        ]
+
+    async def scenario():
+        listener = asyncio.get_running_loop().create_task(
+            auth.user_change_listener(fakeredis.aioredis.FakeRedis(server=redis_server))
+        )
+        await wait_for(subscribed)
+        await other_worker.publish(auth.USER_CHANGED_CHANNEL, "7")
+        await wait_for(lambda: auth.user_cache.get(7) is None)
+        listener.cancel()
+
+    try:
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+        assert auth.user_cache.get(8) is not None
+    finally:
+        auth.user_cache.clear()
+
+
+def test_cached_token_never_outlives_its_exp(monkeypatch):
+    clock = FakeClock(time.time())
+    monkeypatch.setattr(cache, "time", clock)
+    monkeypatch.setattr(auth, "time", clock)
+    monkeypatch.setattr(auth, "token_cache", TTLCache(maxsize=10, ttl=300))
+    token = jwt.encode({"sub": "5", "exp": int(clock.now) + 60}, SECRET_KEY, algorithm=ALGORITHM)
+
+    assert auth._user_id_from_token(token) == 5
+    clock.now += 30
+    assert auth.token_cache.get(token) == 5
+    # the token expires well before the cache's own 300 s ttl
+    clock.now += 31
+    assert auth.token_cache.get(token) is None
+
+    with pytest.raises(HTTPException) as err:
+        auth._user_id_from_token("not-a-jwt")
+    assert err.value.status_code == 401
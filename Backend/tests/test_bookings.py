@@ -0,0 +1,242 @@
+import copy
+import re
+from datetime import datetime, timedelta
+
+import mysql.connector
+import pytest
+from fastapi import HTTPException
+
+from app import bookings
+
+
+NOW = datetime(2026, 1, 1, 9, 0)
+
+
+class FakeBookingDB:
+    """
+    The rides and bookings rows bookings.py touches, behind a cursor that
+    understands exactly the statements it issues. Writes are undone on
+    rollback, like an InnoDB transaction.
+    """
+
+    def __init__(self, rides):
+        self.rides = {ride["id"]: dict(ride) for ride in rides}
+        self.bookings = {}
+        self.before_insert = None
+        self._snapshot = None
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def add_booking(self, **row):
+        """A committed booking, as if another request had made it."""
+        row = {"hold_expires_at": None, "created_at": NOW, "idempotency_key": None, **row}
+        self.bookings[row["id"]] = row
+        if self._snapshot is not None:
+            self._snapshot[1][row["id"]] = dict(row)
+        return row
+
+    def begin(self):
+        if self._snapshot is None:
+            self._snapshot = (copy.deepcopy(self.rides), copy.deepcopy(self.bookings))
+
+    def commit(self):
+        self._snapshot = None
+
+    def rollback(self):
+        if self._snapshot is not None:
+            self.rides, self.bookings = self._snapshot
+            self._snapshot = None
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        assert dictionary
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def close(self):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def _booking(self, row):
+        return {k: row[k] for k in bookings.BOOKING_COLUMNS.split(", ")}
+
+    def execute(self, sql, params=()):
+        db = self.db
+        sql = re.sub(r"\s+", " ", sql).strip()
+        self.rows, self.rowcount = [], 0
+
+        if sql.startswith("UPDATE") or sql.startswith("INSERT"):
+            db.begin()
+
+        if sql.startswith("UPDATE rides SET seats = seats - %s"):
+            seats, ride_id, _, rider_id = params
+            ride = db.rides.get(ride_id)
+            if ride and ride["status"] == "scheduled" and ride["seats"] >= seats and ride["driver_id"] != rider_id:
+                ride["seats"] -= seats
+                self.rowcount = 1
+        elif sql.startswith("UPDATE rides SET seats = seats + %s"):
+            seats, ride_id = params
+            db.rides[ride_id]["seats"] += seats
+            self.rowcount = 1
+        elif sql.startswith("SELECT status, seats, driver_id FROM rides"):
+            ride = db.rides.get(params[0])
+            self.rows = [dict(ride)] if ride else []
+        elif sql.startswith("SELECT seats, status FROM rides") or sql.startswith("SELECT seats FROM rides"):
+            ride = db.rides.get(params[0])
+            self.rows = [{"seats": ride["seats"], "status": ride["status"]}] if ride else []
+        elif sql.startswith("INSERT INTO bookings"):
+            if db.before_insert:
+                hook, db.before_insert = db.before_insert, None
+                hook()
+            ride_id, rider_id, seats, status, key, hold, _ = params
+            if key and any(b["rider_id"] == rider_id and b["idempotency_key"] == key for b in db.bookings.values()):
+                raise mysql.connector.IntegrityError(msg="Duplicate entry", errno=1062)
+            self.lastrowid = max(db.bookings, default=0) + 1
+            db.bookings[self.lastrowid] = {
+                "id": self.lastrowid, "ride_id": ride_id, "rider_id": rider_id, "seats": seats,
+                "status": status, "idempotency_key": key,
+                "hold_expires_at": NOW + timedelta(seconds=bookings.BOOKING_HOLD_SECONDS) if hold else None,
+                "created_at": NOW,
+            }
+            self.rowcount = 1
+        elif sql.startswith(f"SELECT {bookings.BOOKING_COLUMNS} FROM bookings WHERE rider_id"):
+            rider_id, key = params
+            self.rows = [
+                self._booking(b) for b in db.bookings.values()
+                if b["rider_id"] == rider_id and b["idempotency_key"] == key
+            ]
+        elif sql.startswith(f"SELECT {bookings.BOOKING_COLUMNS} FROM bookings WHERE id"):
+            booking = db.bookings.get(params[0])
+            if booking and (len(params) == 1 or (booking["ride_id"], booking["rider_id"]) == params[1:]):
+                self.rows = [self._booking(booking)]
+        elif sql.startswith("UPDATE bookings SET status = %s"):
+            status, booking_id = params
+            booking = db.bookings.get(booking_id)
+            if booking and booking["status"] in ("held", "confirmed"):
+                booking["status"], booking["hold_expires_at"] = status, None
+                self.rowcount = 1
+        elif sql.startswith("SELECT id, ride_id, seats FROM bookings WHERE status = 'held'"):
+            # every hold in the fake has expired
+            held = [b for b in db.bookings.values() if b["status"] == "held"][: params[0]]
+            self.rows = [{"id": b["id"], "ride_id": b["ride_id"], "seats": b["seats"]} for b in held]
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+
+class Matcher:
+    def __init__(self):
+        self.seats = {}
+
+    def seats_changed(self, ride_id, seats):
+        self.seats[ride_id] = seats
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeBookingDB([
+        {"id": 1, "driver_id": 10, "status": "scheduled", "seats": 2},
+        {"id": 2, "driver_id": 10, "status": "scheduled", "seats": 3},
+    ])
+    monkeypatch.setattr(bookings, "get_connection", db.connect)
+    monkeypatch.setattr(bookings, "matcher", Matcher())
+    monkeypatch.setattr(bookings, "rides_changed", lambda conn=None: None)
+    return db
+
+
+def _status(call, *args, **kwargs):
+    with pytest.raises(HTTPException) as err:
+        call(*args, **kwargs)
+    return err.value.status_code
+
+
+def test_last_seat_goes_to_one_rider(db):
+    result = bookings.book_ride(1, 20, seats=2)
+    assert result["seatsLeft"] == 0 and result["booking"]["status"] == "confirmed"
+    assert bookings.matcher.seats == {1: 0}
+    assert _status(bookings.book_ride, 1, 21) == 409
+    assert _status(bookings.book_ride, 99, 21) == 404
+    # nothing half-done is left behind by the refusals
+    assert db.rides[1]["seats"] == 0 and len(db.bookings) == 1
+
+
+def test_drivers_cannot_book_their_own_ride(db):
+    assert _status(bookings.book_ride, 1, 10) == 400
+    assert db.rides[1]["seats"] == 2
+
+
+def test_idempotent_replay(db):
+    first = bookings.book_ride(2, 20, key="k1")
+    again = bookings.book_ride(2, 20, key="k1")
+    assert again == {"booking": first["booking"], "replayed": True}
+    assert db.rides[2]["seats"] == 2
+    # the same key for another ride is a client bug, not a replay
+    assert _status(bookings.book_ride, 1, 20, key="k1") == 422
+
+
+def test_duplicate_key_race_returns_the_winner(db):
+    # a concurrent retry with the same key commits between our lookup and INSERT
+    db.before_insert = lambda: db.add_booking(
+        id=50, ride_id=2, rider_id=20, seats=1, status="confirmed", idempotency_key="k1"
+    )
+    result = bookings.book_ride(2, 20, key="k1")
+    assert result["replayed"] is True and result["booking"]["id"] == 50
+    # our own decrement was rolled back (the fake winner took no seats)
+    assert db.rides[2]["seats"] == 3
+
+
+def test_cancelling_twice_is_a_no_op(db):
+    booking = bookings.book_ride(2, 20, seats=2)["booking"]
+    first = bookings.cancel_booking(2, 20, booking["id"])
+    assert first["released"] is True and first["booking"]["status"] == "cancelled"
+    assert db.rides[2]["seats"] == 3
+    second = bookings.cancel_booking(2, 20, booking["id"])
+    assert second["released"] is False and second["booking"]["status"] == "cancelled"
+    assert db.rides[2]["seats"] == 3
+    assert _status(bookings.cancel_booking, 2, 21, booking["id"]) == 404
+
+
+def test_release_only_settles_live_bookings(db):
+    booking = db.add_booking(id=7, ride_id=1, rider_id=20, seats=1, status="held")
+    cursor = db.connect().cursor(dictionary=True)
+    assert bookings._release(cursor, booking, "expired") is True
+    assert db.rides[1]["seats"] == 3 and db.bookings[7]["status"] == "expired"
+    assert bookings._release(cursor, booking, "cancelled") is False
+    assert db.rides[1]["seats"] == 3
+
+
+def test_expire_holds_gives_seats_back(db):
+    held = bookings.book_ride(1, 20, seats=2, hold=True)["booking"]
+    confirmed = bookings.book_ride(2, 21, seats=1)["booking"]
+    assert held["status"] == "held" and db.rides[1]["seats"] == 0
+
+    assert bookings.expire_holds() == 1
+    assert db.bookings[held["id"]]["status"] == "expired"
+    assert db.bookings[confirmed["id"]]["status"] == "confirmed"
+    assert db.rides[1]["seats"] == 2 and bookings.matcher.seats[1] == 2
+    assert bookings.expire_holds() == 0
@@ -0,0 +1,33 @@
+from app.core import cache
+from app.core.cache import TTLCache
+from conftest import FakeClock
+
+
+def test_ttl_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(cache, "time", FakeClock())
+    lru = TTLCache(maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # "b" is now the oldest
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_ttl_cache_entries_expire(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    lru = TTLCache(maxsize=10, ttl=60)
+    lru.set("default", 1)
+    lru.set("short", 2, ttl=5)
+    lru.set("capped", 3, ttl=600)  # never longer than the cache's own ttl
+    lru.set("gone", 4, ttl=0)
+    assert lru.get("gone") is None
+
+    clock.now += 5
+    assert lru.get("short") is None
+    assert lru.get("default") == 1
+    clock.now += 55
+    assert lru.get("default") is None and lru.get("capped") is None
+    assert lru.stats()["expired"] == 3
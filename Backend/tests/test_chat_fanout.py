@@ -0,0 +1,182 @@
+"""
+Socket.IO chat end to end: real sockets against app.chat served by
+uvicorn, with presence and the client manager on fakeredis. Each worker
+is a fresh import of app.chat, so it has its own AsyncServer, handlers
+and sid_to_user, exactly like a separate process.
+"""
+import asyncio
+import importlib.util
+import itertools
+
+import fakeredis
+import pytest
+import socketio
+
+from app.chat_store import MessageWriter
+from app.core.security import create_access_token
+from app.presence import RedisPresence
+from conftest import FAKE_REDIS_URL, LiveServer, redis_options, wait_for
+
+
+def _load_chat_module():
+    spec = importlib.util.find_spec("app.chat")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Worker:
+    """One API worker's chat: app.chat on AsyncRedisManager + RedisPresence."""
+
+    def __init__(self, redis_server, insert_batch):
+        self.chat = _load_chat_module()
+        self.manager = socketio.AsyncRedisManager(FAKE_REDIS_URL, redis_options=redis_options(redis_server))
+        self.chat.sio.manager = self.manager
+        self.manager.set_server(self.chat.sio)
+        self.chat.presence = RedisPresence(fakeredis.FakeAsyncRedis(server=redis_server))
+        self.chat.message_writer = MessageWriter(insert_batch=insert_batch, flush_interval=0.001)
+        self.server = LiveServer(socketio.ASGIApp(self.chat.sio))
+
+    async def __aenter__(self):
+        self.chat.sio.manager_initialized = True
+        self.manager.initialize()
+        await self.server.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.chat.message_writer.stop()
+        await self.server.__aexit__(*exc)
+
+    @property
+    def url(self):
+        return self.server.url
+
+
+class Device:
+    """A client socket logged in as `user_id`, recording what it receives."""
+
+    def __init__(self, user_id):
+        self.user_id = str(user_id)
+        self.received = []
+        self.client = socketio.AsyncClient()
+        self.client.on("receiveMessage", self.received.append)
+
+    async def connect(self, url):
+        token = create_access_token(self.user_id)
+        await self.client.connect(url, auth={"token": token}, transports=["websocket"])
+        return self
+
+    async def send(self, receiver_id, message):
+        return await self.client.call(
+            "sendMessage", {"senderId": self.user_id, "receiverId": str(receiver_id), "message": message}
+        )
+
+
+@pytest.fixture
+def insert_batch():
+    ids = itertools.count(1)
+    return lambda rows: [next(ids) for _ in rows]
+
+
+async def _subscribed(redis_server, workers):
+    client = fakeredis.FakeAsyncRedis(server=redis_server)
+    (_, count), = await client.pubsub_numsub("socketio")
+    return count >= workers
+
+
+def test_message_reaches_every_device_on_one_worker(redis_server, insert_batch):
+    async def scenario():
+        async with Worker(redis_server, insert_batch) as worker:
+            await wait_for(lambda: _subscribed(redis_server, 1))
+            alice_phone = await Device(5).connect(worker.url)
+            alice_laptop = await Device(5).connect(worker.url)
+            bob_phone = await Device(7).connect(worker.url)
+            bob_laptop = await Device(7).connect(worker.url)
+            assert await worker.chat.presence.device_count("7") == 2
+
+            ack = await alice_phone.send(7, "on my way")
+            assert ack["success"] is True
+
+            await wait_for(lambda: bob_phone.received and bob_laptop.received)
+            for device in (bob_phone, bob_laptop):
+                assert device.received == [
+                    {"senderId": "5", "receiverId": "7", "message": "on my way", "id": ack["id"]}
+                ]
+            # the sender's own devices get the echo
+            await wait_for(lambda: alice_phone.received and alice_laptop.received)
+            assert alice_laptop.received == bob_phone.received
+
+            await bob_laptop.client.disconnect()
+            await wait_for(lambda: _device_count(worker, "7", 1))
+            for device in (alice_phone, alice_laptop, bob_phone):
+                await device.client.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_unsaved_message_is_not_echoed_or_delivered(redis_server):
+    def insert_batch(rows):
+        raise ConnectionError("database gone")
+
+    async def scenario():
+        async with Worker(redis_server, insert_batch) as worker:
+            await wait_for(lambda: _subscribed(redis_server, 1))
+            alice = await Device(5).connect(worker.url)
+            bob = await Device(7).connect(worker.url)
+
+            ack = await alice.send(7, "lost")
+            assert ack == {"success": False, "error": "Message could not be saved"}
+            await asyncio.sleep(0.1)
+            assert alice.received == [] and bob.received == []
+            for device in (alice, bob):
+                await device.client.disconnect()
+
+    asyncio.run(scenario())
+
+
+async def _device_count(worker, user_id, expected):
+    return await worker.chat.presence.device_count(user_id) == expected
+
+
+def test_message_crosses_workers(redis_server, insert_batch):
+    async def scenario():
+        async with Worker(redis_server, insert_batch) as worker_a, Worker(redis_server, insert_batch) as worker_b:
+            await wait_for(lambda: _subscribed(redis_server, 2))
+            alice = await Device(5).connect(worker_a.url)
+            bob_phone = await Device(7).connect(worker_b.url)
+            bob_laptop = await Device(7).connect(worker_a.url)
+
+            # worker A learns through Redis that bob is online elsewhere too
+            assert await worker_a.chat.presence.device_count("7") == 2
+
+            ack = await alice.send(7, "at the gate")
+            assert ack["success"] is True
+            await wait_for(lambda: bob_phone.received and bob_laptop.received)
+            assert bob_phone.received[0]["id"] == ack["id"]
+            assert bob_laptop.received[0]["id"] == ack["id"]
+
+            # and back the other way
+            reply = await bob_phone.send(5, "coming")
+            assert reply["success"] is True
+            await wait_for(lambda: any(m["message"] == "coming" for m in alice.received))
+
+            for device in (alice, bob_phone, bob_laptop):
+                await device.client.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_socket_identity_comes_from_the_token(redis_server, insert_batch):
+    async def scenario():
+        async with Worker(redis_server, insert_batch) as worker:
+            stranger = socketio.AsyncClient()
+            with pytest.raises(socketio.exceptions.ConnectionError):
+                await stranger.connect(worker.url, auth={"token": "not-a-jwt"}, transports=["websocket"])
+
+            alice = await Device(5).connect(worker.url)
+            # she can't speak for bob
+            ack = await alice.client.call("sendMessage", {"senderId": "7", "receiverId": "5", "message": "hi"})
+            assert ack["success"] is False
+            await alice.client.disconnect()
+
+    asyncio.run(scenario())
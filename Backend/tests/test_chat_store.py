@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.chat_store import MessageWriter
+
+
+class FakeStore:
+    """insert_batch stand-in: numbers rows like AUTO_INCREMENT, rejects 'bad' ones."""
+
+    def __init__(self):
+        self.batches = []
+        self.rows = []
+
+    def __call__(self, rows):
+        self.batches.append(list(rows))
+        if any(message == "bad" for _, _, message in rows):
+            raise ValueError("row rejected")
+        ids = list(range(len(self.rows) + 1, len(self.rows) + len(rows) + 1))
+        self.rows.extend(rows)
+        return ids
+
+
+def test_message_writer_batches_and_isolates_bad_rows():
+    async def scenario():
+        store = FakeStore()
+        writer = MessageWriter(insert_batch=store, batch_size=10, flush_interval=0.05)
+        futures = [await writer.submit(5, 7, text) for text in ("one", "bad", "three")]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        # one INSERT for the batch, then row by row after it failed
+        assert store.batches[0] == [(5, 7, "one"), (5, 7, "bad"), (5, 7, "three")]
+        assert len(store.batches) == 4
+        assert results[0] == 1 and results[2] == 2
+        assert isinstance(results[1], ValueError)
+        assert store.rows == [(5, 7, "one"), (5, 7, "three")]
+
+        # ids are coerced and checked before anything is queued
+        assert await writer.save("5", "7", "four") == 3
+        for sender, receiver in (("x", 7), (0, 7), (5, None)):
+            with pytest.raises(ValueError):
+                await writer.submit(sender, receiver, "hi")
+
+        await writer.stop()
+        with pytest.raises(RuntimeError):
+            await writer.submit(5, 7, "late")
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from app.database import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if self.closed:
+            raise ConnectionError("gone")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections():
+    return []
+
+
+@pytest.fixture
+def pool(connections):
+    def connect():
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    return ConnectionPool(connect=connect, size=2, timeout=0.05)
+
+
+def test_pool_reuses_returned_connections(pool, connections):
+    first = pool.acquire()
+    first.close()
+    second = pool.acquire()
+    assert second._raw is connections[0]
+    assert len(connections) == 1
+    # closing twice must not hand the connection back twice
+    second.close()
+    second.close()
+    assert pool.stats()["idle"] == 1
+
+
+def test_pool_times_out_when_exhausted(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["checkoutFailures"] == 1
+
+    # a waiter gets the first connection given back
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=1)))
+    waiter.start()
+    held[0].close()
+    waiter.join()
+    assert got[0]._raw is held[0]._raw
+
+
+def test_pool_rolls_back_open_transactions_on_release(pool, connections):
+    conn = pool.acquire()
+    conn._raw.in_transaction = True
+    conn.close()
+    assert connections[0].rollbacks == 1
+
+
+def test_pool_recovers_from_failed_connects():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("refused")
+        return FakeConnection()
+
+    pool = ConnectionPool(connect=connect, size=1, timeout=0.05)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    # the failed attempt gave its slot back
+    pool.acquire().close()
+    assert pool.stats()["open"] == 1
@@ -0,0 +1,89 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import feed
+from app.feed import FeedVersion, etag_matches, make_etag
+from app.routes import rides
+from app.routes.auth import get_current_user
+from conftest import FakeClock
+
+
+def test_etags_depend_on_version_and_params():
+    etag = make_etag("3", "nearby", 22.7, 75.8, 10)
+    assert etag.startswith('W/"3-') and etag.endswith('"')
+    assert make_etag("3", "nearby", 22.7, 75.8, 10) == etag
+    assert make_etag("4", "nearby", 22.7, 75.8, 10) != etag
+    assert make_etag("3", "nearby", 22.7, 75.8, 20) != etag
+
+
+def test_etag_matches_lists_and_wildcard():
+    etag = make_etag("3", "nearby")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'W/"1-abc", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"1-abc"', etag)
+    assert not etag_matches(None, etag) and not etag_matches("", etag)
+
+
+def test_feed_version_is_reread_after_its_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(feed, "time", clock)
+    shared = {"version": 3, "reads": 0}
+
+    def read():
+        shared["reads"] += 1
+        return shared["version"]
+
+    version = FeedVersion(ttl=1)
+    monkeypatch.setattr(version, "_read", read)
+    monkeypatch.setattr(version, "_increment", lambda conn=None: shared["version"] + 1)
+
+    assert version.get() == 3 and version.changed_at == clock.now
+    shared["version"] = 4  # bumped by another worker
+    clock.now += 0.5
+    assert version.get() == 3 and shared["reads"] == 1
+    clock.now += 0.5
+    assert version.get() == 4 and shared["reads"] == 2
+    assert version.changed_at == clock.now
+
+    # our own bumps are seen at once, without a read
+    clock.now += 0.1
+    assert version.bump() == 5 and version.get() == 5
+    assert shared["reads"] == 2
+
+    # a failed bump still changes this worker's tags
+    version.invalidate_local()
+    assert version.tag() == "5.1"
+
+
+def test_nearby_answers_304_from_the_primed_cache(monkeypatch):
+    version = FeedVersion(ttl=60)
+    monkeypatch.setattr(version, "_read", lambda: 7)
+    monkeypatch.setattr(rides, "feed_version", version)
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("served from the feed cache, not MySQL")
+
+    monkeypatch.setattr(rides, "get_read_connection", no_database)
+
+    app = FastAPI()
+    app.include_router(rides.router, prefix="/api/rides")
+    app.dependency_overrides[get_current_user] = lambda: {"id": 5}
+    client = TestClient(app)
+
+    query = {"latitude": 22.7, "longitude": 75.8, "radius": 10.0, "limit": 20}
+    etag = make_etag("7", "nearby", 22.7, 75.8, 10.0, 20, None)
+    body = b'{"success":true,"rides":[],"limit":20,"nextCursor":null}'
+    feed.feed_cache.set(etag, body)
+    try:
+        first = client.get("/api/rides/nearby", params=query)
+        assert first.status_code == 200 and first.content == body
+        assert first.headers["etag"] == etag
+
+        before = feed.feed_stats["notModified"]
+        again = client.get("/api/rides/nearby", params=query, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etag
+        assert feed.feed_stats["notModified"] == before + 1
+    finally:
+        feed.feed_cache.clear()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from app import matching
+from app.matching import MatchingEngine
+
+DEPART = 1_800_000_000.0
+# Indore: Rajwada and two pickups roughly 1 km and 5 km away
+RAJWADA = (22.7186, 75.8553)
+RIDES = [
+    # id, pickup lat, lng, drop lat, lng, departure, seats, amount
+    (1, 22.7276, 75.8553, 22.7532, 75.8937, DEPART, 3, 150.0),
+    (2, 22.7636, 75.8553, 22.7532, 75.8937, DEPART, 3, 150.0),
+    (3, 22.7186, 75.8560, 22.7532, 75.8937, DEPART + 6 * 3600, 3, 150.0),
+]
+
+
+def test_matching_engine_ranks_and_tracks_rides():
+    loads = []
+
+    def load_rows(after_id):
+        loads.append(after_id)
+        return [row for row in RIDES if row[0] > after_id]
+
+    engine = MatchingEngine(load_rows=load_rows)
+    engine.refresh()
+    assert loads == [0]
+
+    ranked = engine.match(*RAJWADA, 22.7532, 75.8937, DEPART, window_s=3600)
+    # nearest pickup first; ride 3 leaves outside the window
+    assert [ride_id for ride_id, *_ in ranked] == [1, 2]
+    assert round(ranked[0][2]) == 1 and round(ranked[1][2]) == 5
+
+    engine.seats_changed(1, 0)
+    engine.ride_created(4, *RAJWADA, 22.7532, 75.8937, DEPART + 600, 2, 100.0)
+    ranked = engine.match(*RAJWADA, 22.7532, 75.8937, DEPART, window_s=3600, seats=2)
+    assert [ride_id for ride_id, *_ in ranked] == [4, 2]
+    assert engine.match(*RAJWADA, None, None, DEPART, window_s=3600, seats=4) == []
+
+    engine.ride_removed(4)
+    assert [ride_id for ride_id, *_ in engine.match(*RAJWADA, None, None, DEPART, 3600)] == [2]
+
+
+def test_matching_engine_refreshes_one_thread_at_a_time(monkeypatch):
+    release = threading.Event()
+    loads = []
+
+    def slow_load(after_id):
+        loads.append(after_id)
+        if after_id:
+            release.wait(5)
+        return RIDES if after_id == 0 else []
+
+    engine = MatchingEngine(load_rows=slow_load)
+    engine.refresh()
+    monkeypatch.setattr(matching, "MATCH_REFRESH_SECONDS", 0.0)
+    time.sleep(0.01)
+
+    # the first top-up blocks in load_rows; the others must not wait for it
+    started = time.monotonic()
+    threads = [threading.Thread(target=engine.refresh) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads[1:]:
+        thread.join(0.5)
+    assert time.monotonic() - started < 1
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == [0, 3]
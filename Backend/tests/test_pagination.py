@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.pagination import decode_cursor, encode_cursor, stream_json_list
+
+
+def test_keyset_cursor_round_trip_and_validation():
+    created = datetime(2026, 3, 1, 9, 30)
+    cursor = encode_cursor(created, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2, (str, int)) == ["2026-03-01 09:30:00", 42]
+    assert decode_cursor(encode_cursor(1.25, 7), 2, ((int, float), int)) == [1.25, 7]
+    assert decode_cursor(None, 2) is None
+    assert decode_cursor("", 2) is None
+
+    bad = [
+        "not base64!",
+        encode_cursor(1),                  # wrong length
+        encode_cursor("a", {}),            # wrong types
+        encode_cursor(True, 7),            # JSON booleans are not numbers here
+        encode_cursor(1.5, "7"),
+    ]
+    for value in bad:
+        with pytest.raises(HTTPException) as err:
+            decode_cursor(value, 2, ((int, float), int))
+        assert err.value.status_code == 400
+
+
+def test_stream_json_list_is_one_document():
+    body = b"".join(stream_json_list("rides", iter([{"id": 1}, {"id": 2}]), {"limit": 2}))
+    assert json.loads(body) == {"success": True, "limit": 2, "rides": [{"id": 1}, {"id": 2}]}
+    assert json.loads(b"".join(stream_json_list("rides", iter([])))) == {"success": True, "rides": []}
@@ -0,0 +1,55 @@
+import asyncio
+
+from app import places
+from app.places import PlaceIndex, normalize_place
+
+RIDES = [
+    # id, from, to, departure
+    (1, "Indore Airport", "Rājwāḍa", 300.0),
+    (2, "Vijay Nagar", "Indore Airport", 100.0),
+    (3, "Palasia", "Vijay Nagar", 200.0),
+    (4, "Airport Road, Indore", "Palasia", 400.0),
+]
+
+
+def _load_rows(after_id):
+    return [row for row in RIDES if row[0] > after_id]
+
+
+def test_place_index_search_and_autocomplete():
+    index = PlaceIndex(load_rows=_load_rows)
+    index.reload()
+    assert normalize_place(" Rājwāḍa,  Indore ") == "rajwada indore"
+
+    # every word of the query prefixes a word of the place, in any order
+    names = [p["name"] for p in index.autocomplete("air ind")]
+    assert sorted(names) == ["Airport Road, Indore", "Indore Airport"]
+    assert index.autocomplete("rajw")[0] == {"name": "Rājwāḍa", "rides": 1, "from": 0, "to": 1}
+
+    # soonest departure first, either role, paged on (departure, id)
+    first = index.search("airport", limit=2)
+    assert first == [(100.0, 2), (300.0, 1)]
+    assert index.search("airport", limit=2, after=first[-1]) == [(400.0, 4)]
+    assert index.search("airport", role="to") == [(100.0, 2)]
+
+    index.ride_removed(2)
+    index.ride_created(5, "Vijay Nagar", "Airport", 50.0)
+    assert index.search("airport", role="to") == [(50.0, 5)]
+    index.ride_removed(3)
+    assert index.autocomplete("pal")[0]["rides"] == 1
+
+
+def test_place_index_refresher_builds_in_background(monkeypatch):
+    index = PlaceIndex(load_rows=_load_rows)
+    monkeypatch.setattr(places, "place_index", index)
+    monkeypatch.setattr(places, "PLACES_REFRESH_SECONDS", 0.01)
+    assert not index.loaded
+
+    async def scenario():
+        task = asyncio.get_running_loop().create_task(places.place_index_refresher())
+        while not index.loaded:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert index.stats()["rides"] == 4
@@ -0,0 +1,60 @@
+import asyncio
+
+import fakeredis
+
+from app.presence import InMemoryPresence, RedisPresence
+
+
+def test_in_memory_presence_counts_devices():
+    async def scenario():
+        presence = InMemoryPresence()
+        await presence.add("7", "phone")
+        await presence.add("7", "laptop")
+        assert await presence.device_count("7") == 2
+
+        await presence.remove("7", "phone")
+        assert await presence.is_online("7")
+        assert await presence.device_count("7") == 1
+
+        await presence.remove("7", "laptop")
+        assert not await presence.is_online("7")
+        # a socket that never registered
+        await presence.remove("7", "tablet")
+        await presence.remove("8", "phone")
+        assert await presence.device_count("7") == 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_presence_is_shared_by_workers(redis_server):
+    async def scenario():
+        worker_a = RedisPresence(fakeredis.FakeAsyncRedis(server=redis_server))
+        worker_b = RedisPresence(fakeredis.FakeAsyncRedis(server=redis_server))
+        await worker_a.add("7", "phone")
+        await worker_b.add("7", "laptop")
+        assert await worker_a.device_count("7") == 2
+        assert await worker_b.is_online("7")
+
+        await worker_a.remove("7", "phone")
+        assert await worker_b.device_count("7") == 1
+
+        # a worker shutting down takes only its own sockets with it
+        await worker_a.add("7", "phone")
+        await worker_b.stop()
+        assert await worker_a.device_count("7") == 1
+        await worker_a.stop()
+        assert not await worker_b.is_online("7")
+
+    asyncio.run(scenario())
+
+
+def test_redis_presence_ages_out_sockets_of_a_dead_worker(redis_server):
+    async def scenario():
+        crashed = RedisPresence(fakeredis.FakeAsyncRedis(server=redis_server), ttl=1)
+        await crashed.add("7", "phone")
+        assert await crashed.is_online("7")
+        # nobody refreshes the entry any more
+        await asyncio.sleep(1.1)
+        assert not await crashed.is_online("7")
+
+    asyncio.run(scenario())
@@ -0,0 +1,133 @@
+import time
+
+import fakeredis
+import pytest
+
+from app.core import cache
+from app.database import PoolTimeout, ReadRouter
+from conftest import FakeClock
+
+
+class StubPool:
+    """A pool standing in for one server: acquire() hands out a connection
+    whose SHOW REPLICA STATUS reports `lag`."""
+
+    def __init__(self, name, lag=0.0):
+        self.name = name
+        self.lag = lag
+        self.down = False
+
+    def acquire(self, timeout=None):
+        if self.down:
+            raise PoolTimeout(f"{self.name} exhausted")
+        return StubConnection(self)
+
+    def close_all(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class StubConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=()):
+        assert sql == "SHOW REPLICA STATUS"
+
+    def fetchone(self):
+        return {"Seconds_Behind_Source": self.pool.lag}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pools():
+    return StubPool("primary"), StubPool("replica-1"), StubPool("replica-2")
+
+
+def _router(pools, **kwargs):
+    primary, *replicas = pools
+    router = ReadRouter(primary, replicas, max_lag=2, window=5, **kwargs)
+    router.check_lag()
+    return router
+
+
+def test_reads_fall_back_to_the_primary(pools):
+    primary, replica_1, replica_2 = pools
+    assert ReadRouter(primary, []).pool_for(5) is primary
+    # until the first lag check nothing is known about the replicas
+    assert ReadRouter(primary, [replica_1]).pool_for(5) is primary
+
+    router = _router(pools)
+    assert {router.pool_for() for _ in range(4)} == {replica_1, replica_2}
+
+    replica_1.lag, replica_2.lag = 30, None
+    router.check_lag()
+    assert router.pool_for(5) is primary
+
+    # a replica that can't hand out a connection leaves the rotation
+    replica_1.lag = 0
+    router.check_lag()
+    replica_1.down = True
+    assert router.acquire().pool is primary
+    assert router.pool_for() is primary
+
+
+def test_writers_are_pinned_to_the_primary_until_the_window_passes(pools, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    primary = pools[0]
+    router = _router(pools)
+
+    router.wrote(5)
+    assert router.pool_for(5) is primary
+    assert router.pool_for(6) is not primary
+    clock.now += 4.9
+    assert router.pool_for(5) is primary
+    clock.now += 0.2
+    assert router.pool_for(5) is not primary
+
+    # reads that must see a recent change (a feed version bump) too
+    assert router.pool_for(since=time.monotonic()) is primary
+    assert router.pool_for(since=time.monotonic() - 6) is not primary
+
+
+def test_write_stamps_are_shared_between_workers(pools):
+    server = fakeredis.FakeServer()
+    primary = pools[0]
+    worker_a = _router(pools, shared=fakeredis.FakeRedis(server=server))
+    worker_b = _router(pools, shared=fakeredis.FakeRedis(server=server))
+
+    worker_a.wrote(5)
+    assert worker_b.pool_for(5) is primary
+    assert worker_b.pool_for(6) is not primary
+    ttl_ms = fakeredis.FakeRedis(server=server).pttl("db:wrote:5")
+    assert 4000 < ttl_ms <= 5000
+
+    # the stamp expires in Redis as well
+    worker_c = ReadRouter(primary, pools[1:], window=0.05, shared=fakeredis.FakeRedis(server=server))
+    worker_c.check_lag()
+    worker_c.wrote(7)
+    worker_c._writers.clear()
+    assert worker_c.pool_for(7) is primary
+    time.sleep(0.1)
+    assert worker_c.pool_for(7) is not primary
+
+
+def test_unreachable_redis_keeps_reads_on_the_primary(pools):
+    class DownRedis:
+        def set(self, *args, **kwargs):
+            raise ConnectionError("redis down")
+
+        exists = set
+
+    router = _router(pools, shared=DownRedis())
+    router.wrote(5)  # logged, not raised
+    assert router.pool_for(5) is pools[0]
+    assert router.pool_for(6) is pools[0]
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.routes import rides
+from app.routes.rides import RideBulkCreate, RideRecurrence, _expand_recurrence
+
+RIDE = {
+    "from": "Vijay Nagar",
+    "to": "Rajwada",
+    "availableSeats": 3,
+    "amount": 150,
+    "carDetails": {"name": "Honda City", "number": "MP09AB1234", "color": "White"},
+}
+
+
+def _recurrence(**fields):
+    return RideRecurrence(**RIDE, **{"time": "08:30", **fields})
+
+
+def _status(call, *args, **kwargs):
+    with pytest.raises(HTTPException) as err:
+        call(*args, **kwargs)
+    return err.value.status_code
+
+
+def test_recurrence_keeps_chosen_weekdays_and_both_end_dates():
+    # 2026-03-02 is a Monday, 2026-03-13 a Friday
+    rec = _recurrence(daysOfWeek=[5, 1, 3, 1], startDate="2026-03-02", endDate="2026-03-13")
+    assert rec.daysOfWeek == [1, 3, 5]
+    dates = [d for _, d, _ in _expand_recurrence(rec)]
+    assert dates == ["2026-03-02", "2026-03-04", "2026-03-06", "2026-03-09", "2026-03-11", "2026-03-13"]
+    assert all(ride is rec and t == "08:30" for ride, _, t in _expand_recurrence(rec))
+
+    one_day = _recurrence(daysOfWeek=[1], startDate="2026-03-02", endDate="2026-03-02")
+    assert [d for _, d, _ in _expand_recurrence(one_day)] == ["2026-03-02"]
+    weekend = _recurrence(daysOfWeek=[6, 7], startDate="2026-03-02", endDate="2026-03-06")
+    assert _expand_recurrence(weekend) == []
+
+
+def test_recurrence_rejects_bad_ranges_and_days(monkeypatch):
+    monkeypatch.setattr(rides, "RIDES_RECURRENCE_MAX_DAYS", 30)
+    backwards = _recurrence(daysOfWeek=[1], startDate="2026-03-10", endDate="2026-03-02")
+    assert _status(_expand_recurrence, backwards) == 400
+    assert _status(_expand_recurrence, _recurrence(daysOfWeek=[1], startDate="2026-03-02", endDate="2026-04-01")) == 400
+    _expand_recurrence(_recurrence(daysOfWeek=[1], startDate="2026-03-02", endDate="2026-03-31"))
+    assert _status(_expand_recurrence, _recurrence(daysOfWeek=[1], startDate="02/03/2026", endDate="2026-03-31")) == 400
+
+    for days in ([], [0], [8]):
+        with pytest.raises(ValidationError):
+            _recurrence(daysOfWeek=days, startDate="2026-03-02", endDate="2026-03-31")
+
+
+def test_bulk_create_rejects_empty_and_oversized_batches(monkeypatch):
+    monkeypatch.setattr(rides, "RIDES_BULK_MAX", 10)
+    user = {"id": 5}
+
+    # rejected before a connection is used
+    assert _status(rides.create_rides_bulk, RideBulkCreate(), user=user, conn=None) == 400
+
+    # 14 daily rides, over the cap of 10
+    daily = {**RIDE, "time": "08:30", "daysOfWeek": list(range(1, 8)),
+             "startDate": "2026-03-02", "endDate": "2026-03-15"}
+    too_many = RideBulkCreate(recurrence=daily)
+    with pytest.raises(HTTPException) as err:
+        rides.create_rides_bulk(too_many, user=user, conn=None)
+    assert err.value.status_code == 400 and "got 14" in err.value.detail
+
+    bad_time = RideBulkCreate(rides=[{**RIDE, "date": "2026-03-02", "time": "late"}])
+    with pytest.raises(HTTPException) as err:
+        rides.create_rides_bulk(bad_time, user=user, conn=None)
+    assert err.value.detail.startswith("rides[0]:")
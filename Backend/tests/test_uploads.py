@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app import uploads
+
+BOUNDARY = "ridematchboundary"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+
+
+class FakeRequest:
+    """request.headers and request.stream(), serving `body` in `chunk`-byte pieces."""
+
+    def __init__(self, body, chunk=64, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk = chunk
+        self.sent = 0
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk):
+            self.sent += 1
+            yield self.body[start:start + self.chunk]
+
+
+def _form(*parts):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 1024)
+    monkeypatch.setattr(uploads, "UPLOAD_FORM_OVERHEAD", 256)
+    return tmp_path
+
+
+async def _read(request, field="image"):
+    return b"".join([chunk async for chunk in uploads.multipart_file(request, field)])
+
+
+async def _chunks(data, size=16):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _status(coro):
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(coro)
+    return err.value.status_code
+
+
+def test_multipart_file_streams_only_the_wanted_part():
+    body = _form(("name", None, b"driver"), ("image", "me.png", PNG), ("other", "x.png", b"ignored"))
+    assert asyncio.run(_read(FakeRequest(body))) == PNG
+
+    assert _status(_read(FakeRequest(_form(("name", None, b"driver"))))) == 422
+    assert _status(_read(FakeRequest(body, content_type="application/json"))) == 415
+
+
+def test_oversized_chunked_body_is_cut_off_mid_stream():
+    # no Content-Length: the limit is enforced on the bytes actually read
+    request = FakeRequest(_form(("image", "big.png", PNG + b"\x00" * 4096)))
+    assert _status(_read(request)) == 413
+    total = -(-len(request.body) // request.chunk)
+    assert request.sent < total
+
+
+def test_save_image_rejects_non_images(upload_dir):
+    assert _status(uploads.save_image(_chunks(b"%PDF-1.7 not a picture at all"))) == 415
+    assert _status(uploads.save_image(_chunks(PNG + b"\x00" * 1024))) == 413
+    assert _status(uploads.save_image(_chunks(b""))) == 400
+    # temporary files are removed on every failure
+    assert os.listdir(upload_dir) == []
+
+
+def test_same_picture_is_stored_once(upload_dir):
+    digest, name = asyncio.run(uploads.save_image(_chunks(PNG)))
+    assert name == digest + ".png" and len(digest) == 32
+    again = asyncio.run(uploads.save_image(_chunks(PNG, size=7)))
+    assert again == (digest, name)
+    assert os.listdir(upload_dir) == [name]
+    with open(upload_dir / name, "rb") as f:
+        assert f.read() == PNG
+
+    other = asyncio.run(uploads.save_image(_chunks(PNG + b"\x01")))
+    assert other[1] != name
+    assert sorted(os.listdir(upload_dir)) == sorted([name, other[1]])
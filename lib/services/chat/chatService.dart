@@ -1,3 +1,4 @@
+import 'package:shared_preferences/shared_preferences.dart';
 import 'package:socket_io_client/socket_io_client.dart' as IO;
 
 class ChatService {
@@ -8,11 +9,15 @@ class ChatService {
     initSocket();
   }
 
-  void initSocket() {
+  Future<void> initSocket() async {
     socket = IO.io('http://127.0.0.1:5000', <String, dynamic>{
       'transports': ['websocket'],
       'autoConnect': false,
     });
+
+    // The server identifies the socket by this token, not by 'register'
+    SharedPreferences prefs = await SharedPreferences.getInstance();
+    socket.auth = {'token': prefs.getString('token')};
     socket.connect();
 
     socket.onConnect((_) {
@@ -23,9 +28,29 @@ class ChatService {
     socket.on('receiveMessage', (data) {
       print("📩 Message received: ${data['message']} from ${data['senderId']}");
       // You can add logic to display in UI or save in local database
+      _ackLive(data);
+    });
+
+    // Messages that arrived while offline, oldest first. The server sends
+    // the next batch (and moves our delivery cursor) only after this ack.
+    socket.on('missedMessages', (data) {
+      final args = data as List;
+      final batch = args.first as List;
+      for (final msg in batch) {
+        print("📬 Missed message: ${msg['message']} from ${msg['senderId']}");
+      }
+      (args.last as Function)(true);
     });
   }
 
+  // Tell the server this device has the message, so it is not sent again
+  // as missed. Only for messages to us: echoes of our own have other ids.
+  void _ackLive(dynamic data) {
+    if (data['id'] != null && data['receiverId'] == userId) {
+      socket.emit('ackMessages', {'upToId': data['id']});
+    }
+  }
+
   void sendMessage(String receiverId, String message) {
     socket.emit('sendMessage', {
       'senderId': userId,
@@ -2,6 +2,7 @@ import 'dart:convert';
 import 'package:flutter/material.dart';
 import 'package:socket_io_client/socket_io_client.dart' as IO;
 import 'package:http/http.dart' as http;
+import 'package:shared_preferences/shared_preferences.dart';
 
 class ChatScreen extends StatefulWidget {
   final String senderId;
@@ -30,7 +31,7 @@ class _ChatScreenState extends State<ChatScreen> {
     fetchMessages();
   }
 
-  void connectSocket() {
+  Future<void> connectSocket() async {
     socket = IO.io(
       'http://127.0.0.1:5000',
       IO.OptionBuilder()
@@ -39,6 +40,9 @@ class _ChatScreenState extends State<ChatScreen> {
           .build(),
     );
 
+    // The server identifies the socket by this token, not by 'register'
+    SharedPreferences prefs = await SharedPreferences.getInstance();
+    socket.auth = {'token': prefs.getString('token')};
     socket.connect();
 
     socket.onConnect((_) {
@@ -48,6 +52,10 @@ class _ChatScreenState extends State<ChatScreen> {
 
     // ✅ Listen for incoming messages
     socket.on('receiveMessage', (data) {
+      // ack first: the message is delivered even if this screen is gone
+      if (data['id'] != null && data['receiverId'] == widget.senderId) {
+        socket.emit('ackMessages', {'upToId': data['id']});
+      }
       if (!mounted) return;
       setState(() {
         messages.add({
@@ -58,6 +66,27 @@ class _ChatScreenState extends State<ChatScreen> {
       });
       _scrollToBottom();
     });
+
+    // Messages that arrived while offline, oldest first. The server sends
+    // the next batch (and moves our delivery cursor) only after this ack.
+    socket.on('missedMessages', (data) {
+      final args = data as List;
+      final batch = args.first as List;
+      if (mounted) {
+        setState(() {
+          for (final msg in batch) {
+            if (msg['senderId'] != widget.receiverId) continue;
+            messages.add({
+              'senderId': msg['senderId'],
+              'message': msg['message'],
+              'timestamp': msg['createdAt'] ?? DateTime.now().toString(),
+            });
+          }
+        });
+        _scrollToBottom();
+      }
+      (args.last as Function)(true);
+    });
   }
 
   Future<void> fetchMessages() async {
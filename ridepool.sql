@@ -28,9 +28,12 @@ CREATE TABLE `chat_messages` (
   `receiver_id` int NOT NULL,
   `message` text COLLATE utf8mb4_unicode_ci NOT NULL,
   `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `user_lo` int GENERATED ALWAYS AS (least(`sender_id`,`receiver_id`)) STORED NOT NULL,
+  `user_hi` int GENERATED ALWAYS AS (greatest(`sender_id`,`receiver_id`)) STORED NOT NULL,
   PRIMARY KEY (`id`),
   KEY `sender_id` (`sender_id`),
-  KEY `receiver_id` (`receiver_id`),
+  KEY `idx_chat_receiver_id` (`receiver_id`,`id`),
+  KEY `idx_chat_conversation` (`user_lo`,`user_hi`,`id`),
   CONSTRAINT `chat_messages_ibfk_1` FOREIGN KEY (`sender_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
   CONSTRAINT `chat_messages_ibfk_2` FOREIGN KEY (`receiver_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -45,6 +48,105 @@ LOCK TABLES `chat_messages` WRITE;
 /*!40000 ALTER TABLE `chat_messages` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `bookings`
+--
+
+DROP TABLE IF EXISTS `bookings`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `bookings` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `ride_id` int NOT NULL,
+  `rider_id` int NOT NULL,
+  `seats` int NOT NULL DEFAULT '1',
+  `status` enum('held','confirmed','cancelled','expired') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'confirmed',
+  `idempotency_key` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `hold_expires_at` datetime DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_bookings_idempotency` (`rider_id`,`idempotency_key`),
+  KEY `idx_bookings_ride` (`ride_id`,`status`),
+  KEY `idx_bookings_hold_expiry` (`status`,`hold_expires_at`),
+  CONSTRAINT `bookings_ibfk_1` FOREIGN KEY (`ride_id`) REFERENCES `rides` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `bookings_ibfk_2` FOREIGN KEY (`rider_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `bookings_history`
+--
+
+DROP TABLE IF EXISTS `bookings_history`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `bookings_history` (
+  `id` int NOT NULL,
+  `ride_id` int NOT NULL,
+  `rider_id` int NOT NULL,
+  `seats` int NOT NULL DEFAULT '1',
+  `status` enum('held','confirmed','cancelled','expired') COLLATE utf8mb4_unicode_ci NOT NULL,
+  `idempotency_key` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `hold_expires_at` datetime DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT NULL,
+  `archived_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_bookings_history_ride` (`ride_id`),
+  KEY `idx_bookings_history_rider` (`rider_id`,`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `chat_conversations`
+--
+
+DROP TABLE IF EXISTS `chat_conversations`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `chat_conversations` (
+  `user_id` int NOT NULL,
+  `peer_id` int NOT NULL,
+  `last_message_id` int NOT NULL,
+  `unread_count` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`user_id`,`peer_id`),
+  KEY `idx_conversations_inbox` (`user_id`,`last_message_id`),
+  CONSTRAINT `chat_conversations_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `chat_conversations_ibfk_2` FOREIGN KEY (`peer_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `chat_delivery_cursors`
+--
+
+DROP TABLE IF EXISTS `chat_delivery_cursors`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `chat_delivery_cursors` (
+  `user_id` int NOT NULL,
+  `last_delivered_id` int NOT NULL DEFAULT '0',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`),
+  CONSTRAINT `chat_delivery_cursors_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `feed_versions`
+--
+
+DROP TABLE IF EXISTS `feed_versions`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `feed_versions` (
+  `name` varchar(50) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `version` bigint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `rides`
 --
@@ -61,14 +163,20 @@ CREATE TABLE `rides` (
   `duration` varchar(100) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `amount` varchar(50) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `status` enum('scheduled','ongoing','completed','cancelled') COLLATE utf8mb4_unicode_ci DEFAULT 'scheduled',
-  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `car_name` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `car_number` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `car_color` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `date` date NOT NULL,
   `time` time NOT NULL,
+  `pickup_point` point NOT NULL /*!80003 SRID 4326 */,
+  `drop_point` point DEFAULT NULL /*!80003 SRID 4326 */,
+  `has_location` tinyint(1) NOT NULL DEFAULT '1',
   PRIMARY KEY (`id`),
   KEY `driver_id` (`driver_id`),
+  KEY `idx_rides_driver_created` (`driver_id`,`created_at`),
+  KEY `idx_rides_status_departure` (`status`,`date`,`time`),
+  SPATIAL KEY `idx_rides_pickup_point` (`pickup_point`),
   CONSTRAINT `rides_ibfk_1` FOREIGN KEY (`driver_id`) REFERENCES `users` (`id`) ON DELETE SET NULL
 ) ENGINE=InnoDB AUTO_INCREMENT=13 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -79,10 +187,42 @@ CREATE TABLE `rides` (
 
 LOCK TABLES `rides` WRITE;
 /*!40000 ALTER TABLE `rides` DISABLE KEYS */;
-INSERT INTO `rides` VALUES (1,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:15:33','fortuner','fef4453','haha','2025-11-24','18:39:00'),(2,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:15:42','fortuner','fef4453','haha','2025-11-24','18:39:00'),(3,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:17:19','fortuner','fef4453','haha','2025-11-24','18:39:00'),(4,8,'rtr','trrt',44,NULL,'4324','scheduled','2025-11-23 12:18:31','rreg','3445','rfgg','2025-11-24','17:48:00'),(5,8,'sf','fe',3,NULL,'150','scheduled','2025-11-23 12:43:39','Honda City','MP09AB1234','White','2025-11-23','19:13:00'),(6,8,'sf','fe',3,NULL,'150','scheduled','2025-11-23 12:43:47','Honda City','MP09AB1234','White','2025-11-23','19:13:00'),(7,8,'SVVV','Malharganj',3,NULL,'150','scheduled','2025-11-23 12:45:42','Honda City','MP09AB1234','White','2025-11-23','19:15:00'),(8,8,'dd','wd',33,NULL,'24234','scheduled','2025-11-23 12:59:12','34tf','rfggr','refgr','2025-11-23','19:29:00'),(9,8,'tr','tt',3,NULL,'150','scheduled','2025-11-23 13:19:33','Honda City','MP09AB1234','White','2025-11-23','19:49:00'),(10,8,'de','fe',2,NULL,'1999','scheduled','2025-11-23 13:36:32','polo gt','4567','black','2025-11-24','20:06:00'),(11,2,'omaxe','school',1,NULL,'120','scheduled','2025-11-23 15:28:28','Fortuner','3456','Black','2025-11-25','20:58:00'),(12,8,'tuturu','yululu',3,NULL,'150','scheduled','2025-11-23 15:51:10','Honda City','MP09AB1234','White','2025-11-24','21:21:00');
+INSERT INTO `rides` VALUES (1,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:15:33','fortuner','fef4453','haha','2025-11-24','18:39:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(2,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:15:42','fortuner','fef4453','haha','2025-11-24','18:39:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(3,8,'kela','mela',44,NULL,'345','scheduled','2025-11-23 12:17:19','fortuner','fef4453','haha','2025-11-24','18:39:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(4,8,'rtr','trrt',44,NULL,'4324','scheduled','2025-11-23 12:18:31','rreg','3445','rfgg','2025-11-24','17:48:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(5,8,'sf','fe',3,NULL,'150','scheduled','2025-11-23 12:43:39','Honda City','MP09AB1234','White','2025-11-23','19:13:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(6,8,'sf','fe',3,NULL,'150','scheduled','2025-11-23 12:43:47','Honda City','MP09AB1234','White','2025-11-23','19:13:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(7,8,'SVVV','Malharganj',3,NULL,'150','scheduled','2025-11-23 12:45:42','Honda City','MP09AB1234','White','2025-11-23','19:15:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(8,8,'dd','wd',33,NULL,'24234','scheduled','2025-11-23 12:59:12','34tf','rfggr','refgr','2025-11-23','19:29:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(9,8,'tr','tt',3,NULL,'150','scheduled','2025-11-23 13:19:33','Honda City','MP09AB1234','White','2025-11-23','19:49:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(10,8,'de','fe',2,NULL,'1999','scheduled','2025-11-23 13:36:32','polo gt','4567','black','2025-11-24','20:06:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(11,2,'omaxe','school',1,NULL,'120','scheduled','2025-11-23 15:28:28','Fortuner','3456','Black','2025-11-25','20:58:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0),(12,8,'tuturu','yululu',3,NULL,'150','scheduled','2025-11-23 15:51:10','Honda City','MP09AB1234','White','2025-11-24','21:21:00',ST_GeomFromText('POINT(0 0)',4326),NULL,0);
 /*!40000 ALTER TABLE `rides` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `rides_history`
+--
+
+DROP TABLE IF EXISTS `rides_history`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `rides_history` (
+  `id` int NOT NULL,
+  `driver_id` int DEFAULT NULL,
+  `from_addr` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `to_addr` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `seats` int DEFAULT NULL,
+  `duration` varchar(100) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `amount` varchar(50) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `status` enum('scheduled','ongoing','completed','cancelled') COLLATE utf8mb4_unicode_ci NOT NULL,
+  `created_at` timestamp NOT NULL,
+  `car_name` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `car_number` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `car_color` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `date` date NOT NULL,
+  `time` time NOT NULL,
+  `pickup_point` point NOT NULL /*!80003 SRID 4326 */,
+  `drop_point` point DEFAULT NULL /*!80003 SRID 4326 */,
+  `has_location` tinyint(1) NOT NULL DEFAULT '1',
+  `archived_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_rides_history_driver_created` (`driver_id`,`created_at`),
+  KEY `idx_rides_history_date` (`date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `users`
 --